@@ -1,18 +1,41 @@
 from flask import Flask, request, jsonify, make_response, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import hashlib
 import json
+import math
+import random
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
 import jwt
 import datetime
 from functools import wraps
 from flask_swagger_ui import get_swaggerui_blueprint
 from dotenv import load_dotenv
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 import os
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 
+try:
+    import orjson
+except ImportError:  # optional fast path; Flask's stdlib encoder is used instead
+    orjson = None
+try:
+    import msgpack
+except ImportError:  # optional; without it only JSON is served
+    msgpack = None
+try:
+    import library_pb2  # generated from library.proto: protoc --python_out=. library.proto
+    from google.protobuf import json_format
+except ImportError:
+    library_pb2 = None
+
 # OpenTelemetry imports - OTLP version
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
@@ -31,6 +54,21 @@ CORS(app)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "defaultsecret")
 app.config['MONGO_URI'] = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 app.config['MONGO_DB_NAME'] = os.getenv("MONGO_DB_NAME", "library_db")
+app.config['JSON_ENCODER'] = os.getenv("JSON_ENCODER", "orjson" if orjson else "stdlib")
+app.config['BOOK_CACHE_TTL'] = int(os.getenv("BOOK_CACHE_TTL", 30))
+app.config['BOOK_CACHE_MAX_ENTRIES'] = int(os.getenv("BOOK_CACHE_MAX_ENTRIES", 1024))
+app.config['BOOK_CACHE_MAX_BYTES'] = int(os.getenv("BOOK_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+app.config['BOOK_CACHE_STALE_TTL'] = int(os.getenv("BOOK_CACHE_STALE_TTL", 30))
+app.config['BOOK_CACHE_EARLY_REFRESH_BETA'] = float(os.getenv("BOOK_CACHE_EARLY_REFRESH_BETA", 1.0))
+app.config['BOOK_NEGATIVE_CACHE_TTL'] = int(os.getenv("BOOK_NEGATIVE_CACHE_TTL", 30))
+app.config['BOOK_NEGATIVE_CACHE_MAX_ENTRIES'] = int(os.getenv("BOOK_NEGATIVE_CACHE_MAX_ENTRIES", 10000))
+app.config['SHARED_CACHE_PATH'] = os.getenv("SHARED_CACHE_PATH", "")  # e.g. /dev/shm/books.sqlite3; empty = off
+app.config['SHARED_CACHE_MAX_ENTRIES'] = int(os.getenv("SHARED_CACHE_MAX_ENTRIES", 10000))
+app.config['SHARED_CACHE_SIGNAL_RETENTION'] = int(os.getenv("SHARED_CACHE_SIGNAL_RETENTION", 300))
+app.config['SHARED_CACHE_POLL_INTERVAL_MS'] = int(os.getenv("SHARED_CACHE_POLL_INTERVAL_MS", 100))
+app.config['HTTP_MAX_AGE'] = int(os.getenv("HTTP_MAX_AGE", 120))
+app.config['HTTP_STALE_WHILE_REVALIDATE'] = int(os.getenv("HTTP_STALE_WHILE_REVALIDATE", 60))
+app.config['TOKEN_CACHE_SIZE'] = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
 
 limiter = Limiter(key_func=get_remote_address)
 limiter.init_app(app)
@@ -115,26 +153,606 @@ client = MongoClient(app.config['MONGO_URI'])
 db = client[app.config['MONGO_DB_NAME']]
 books_col = db['books']
 
+# ------------------ Read-through query cache ------------------
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL and an approximate memory cap (bytes).
+
+    Entries past their TTL stay servable for stale_ttl more seconds while one
+    background refresh recomputes them; fresh entries are also refreshed early
+    with a probability that grows towards expiry (XFetch), scaled by how long
+    the last load took.
+    """
+
+    def __init__(self, max_entries, max_bytes, ttl, stale_ttl=0, beta=1.0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.beta = beta
+        self._entries = OrderedDict()  # key -> (value, size, expires_at, load_seconds)
+        self._refreshing = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    def get(self, key):
+        """Return (value, refresh); refresh asks the caller to recompute in the background"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or now >= entry[2] + self.stale_ttl:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None, False
+            value, _, expires_at, load_seconds = entry
+            self._entries.move_to_end(key)
+            if now >= expires_at:
+                self.stale_hits += 1
+                return value, True
+            self.hits += 1
+            early = now - load_seconds * self.beta * math.log(1.0 - random.random()) >= expires_at
+            return value, early
+
+    def begin_refresh(self, key):
+        """Claim the background refresh for key; False if one is already running"""
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            self.refreshes += 1
+            return True
+
+    def end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+    def set(self, key, value, load_seconds=0.0, size=None):
+        """size is the encoded size in bytes; pass it when the caller already has the
+        encoded value, otherwise value is encoded once here to measure it"""
+        if size is None:
+            size = len(encode_json(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, time.monotonic() + self.ttl, load_seconds)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, match=None):
+        """Drop every entry whose key satisfies match (all entries if match is None)"""
+        with self._lock:
+            keys = [k for k in self._entries if match is None or match(k)]
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def _remove(self, key):
+        size = self._entries.pop(key)[1]
+        self._bytes -= size
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
+
+book_cache = QueryCache(
+    max_entries=app.config['BOOK_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['BOOK_CACHE_MAX_BYTES'],
+    ttl=app.config['BOOK_CACHE_TTL'],
+    stale_ttl=app.config['BOOK_CACHE_STALE_TTL'],
+    beta=app.config['BOOK_CACHE_EARLY_REFRESH_BETA']
+)
+
+# Negative cache: ids recently confirmed missing, so repeated lookups of dead links
+# answer 404 without a MongoDB round-trip. Entries expire quickly and are dropped by
+# invalidate_book_cache when a book with that id is written.
+missing_books = QueryCache(
+    max_entries=app.config['BOOK_NEGATIVE_CACHE_MAX_ENTRIES'],
+    max_bytes=app.config['BOOK_CACHE_MAX_BYTES'],
+    ttl=app.config['BOOK_NEGATIVE_CACHE_TTL'],
+    stale_ttl=0,
+    beta=0
+)
+
+class SharedCache:
+    """Second cache tier shared by all worker processes on a host, backed by a SQLite
+    file (put it on /dev/shm to keep it in memory).
+
+    Next to the encoded entries it keeps an invalidation log: a worker that writes a
+    book appends a signal, and every worker replays new signals against its own
+    in-process tier before serving a request. A loaded value is only stored if no
+    signal was published since the load began, so a slow load cannot bring back
+    data another worker has just invalidated.
+
+    The log is read at most once per poll_interval seconds per worker; requests in
+    between only compare a monotonic deadline, so another worker's write can take up
+    to poll_interval to reach this process's in-process tier.
+    """
+
+    def __init__(self, path, ttl, max_entries, signal_retention, poll_interval=0.0):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.signal_retention = signal_retention
+        self.poll_interval = poll_interval
+        self._next_poll = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.signals_applied = 0
+        self._published = set()  # seqs written by this process; already applied locally
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries ("
+                     "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, book_id TEXT NOT NULL, "
+                     "docs TEXT NOT NULL, created_at REAL NOT NULL)")
+        self.last_seq = self._max_seq(conn)  # this process starts empty, nothing to replay
+
+    def _conn(self):
+        # One connection per thread, reopened after fork (pre-fork servers import first)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    @staticmethod
+    def _max_seq(conn):
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(list(key))
+
+    def _transaction(self, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def get(self, key):
+        """Encoded (JSON bytes) value for key, or None"""
+        row = self._conn().execute("SELECT value FROM entries WHERE key = ? AND expires_at > ?",
+                                   (self._key(key), time.time())).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, key, encoded, seq):
+        """Store an encoded value unless an invalidation signal was published after seq"""
+        now = time.time()
+
+        def store(conn):
+            if self._max_seq(conn) != seq:
+                return
+            conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                         (self._key(key), encoded, now + self.ttl))
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            conn.execute("DELETE FROM entries WHERE key IN (SELECT key FROM entries "
+                         "ORDER BY expires_at LIMIT MAX((SELECT COUNT(*) FROM entries) - ?, 0))",
+                         (self.max_entries,))
+
+        self._transaction(store)
+
+    def publish(self, book_id, docs, affected):
+        """Drop the shared entries a write affects and signal the other workers"""
+        now = time.time()
+
+        def signal(conn):
+            keys = [(k,) for (k,) in conn.execute("SELECT key FROM entries") if affected(tuple(json.loads(k)))]
+            conn.executemany("DELETE FROM entries WHERE key = ?", keys)
+            seq = conn.execute("INSERT INTO signals (book_id, docs, created_at) VALUES (?, ?, ?)",
+                               (str(book_id), encode_json(docs).decode('utf-8'), now)).lastrowid
+            with self._lock:
+                if self.last_seq == seq - 1:
+                    # nothing unread before it: count our own row as read now rather than at
+                    # the next (throttled) poll, so set() is not refused until then
+                    self.last_seq = seq
+                else:
+                    self._published.add(seq)
+            conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?",
+                         (now - self.signal_retention, seq))
+
+        self._transaction(signal)
+
+    def sync(self, apply, reset):
+        """Replay signals published since the last sync: apply(book_id, docs) for each,
+        or reset() once if some were trimmed before this process could see them.
+        No-op until poll_interval has passed since the previous read."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, book_id, docs FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, book_id, docs in rows:
+                    if seq not in self._published:
+                        apply(book_id, json.loads(docs))
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.signals_applied += len(rows)
+            self.last_seq = rows[-1][0]
+
+    def stats(self):
+        entries = self._conn().execute("SELECT COUNT(*) FROM entries WHERE expires_at > ?",
+                                       (time.time(),)).fetchone()[0]
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "path": self.path,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "signals_applied": self.signals_applied,
+                "last_seq": self.last_seq,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+shared_cache = None
+if app.config['SHARED_CACHE_PATH']:
+    shared_cache = SharedCache(
+        path=app.config['SHARED_CACHE_PATH'],
+        ttl=app.config['BOOK_CACHE_TTL'],
+        max_entries=app.config['SHARED_CACHE_MAX_ENTRIES'],
+        signal_retention=app.config['SHARED_CACHE_SIGNAL_RETENTION'],
+        poll_interval=app.config['SHARED_CACHE_POLL_INTERVAL_MS'] / 1000
+    )
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight execution"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+book_flights = SingleFlight()
+
+def cached_read(key, loader):
+    """Return the cached value for key, or load it from MongoDB and cache it"""
+    value, refresh = book_cache.get(key)
+    span = trace.get_current_span()
+    span.set_attribute("cache.hit", value is not None)
+    if value is None:
+        # Concurrent misses for the same key (e.g. on expiry) share one MongoDB call
+        return book_flights.do(key, lambda: _load_and_store(key, loader))
+    if refresh and book_cache.begin_refresh(key):
+        span.set_attribute("cache.refresh", True)
+        threading.Thread(target=_background_refresh, args=(key, loader), daemon=True).start()
+    return value
+
+def _load_and_store(key, loader):
+    revision = _collection_revisions.get("books", 0)
+    seq = shared_cache.last_seq if shared_cache else None
+
+    def unchanged():
+        # A write that landed during the load (here or in another worker) may have
+        # made the value stale already
+        return (_collection_revisions.get("books", 0) == revision
+                and (shared_cache is None or shared_cache.last_seq == seq))
+
+    if shared_cache:
+        encoded = shared_cache.get(key)
+        if encoded is not None:
+            trace.get_current_span().set_attribute("cache.tier", "shared")
+            value = json.loads(encoded)
+            if unchanged():
+                book_cache.set(key, value, size=len(encoded))
+            return value
+    started = time.monotonic()
+    value = loader()
+    if unchanged():
+        if value is not None:
+            # Encoded once: the size feeds the in-process byte cap, the bytes the shared tier
+            encoded = encode_json(value)
+            book_cache.set(key, value, time.monotonic() - started, size=len(encoded))
+            if shared_cache:
+                shared_cache.set(key, encoded, seq)
+        elif key[0] == "book":
+            missing_books.set(key[1], True)
+    return value
+
+def _background_refresh(key, loader):
+    try:
+        book_flights.do(key, lambda: _load_and_store(key, loader))
+    except Exception as e:
+        app.logger.warning("Background cache refresh failed for %s: %s", key, e)
+    finally:
+        book_cache.end_refresh(key)
+
+def _regex_matches(pattern, value):
+    """Python-side equivalent of {'$regex': pattern, '$options': 'i'}"""
+    try:
+        return re.search(pattern, value or '', re.IGNORECASE) is not None
+    except re.error:
+        return True  # can't evaluate the pattern here, so assume it matches
+
+def list_filter_matches(key, doc):
+    """Whether doc satisfies the filter a cached list was built from"""
+    _, available, title, author = key
+    if available is not None and doc.get('available') != available:
+        return False
+    if title and not _regex_matches(title, doc.get('title')):
+        return False
+    if author and not _regex_matches(author, doc.get('author')):
+        return False
+    return True
+
+def _affected_by(book_id, docs):
+    def affected(key):
+        if key[0] == "book":
+            return key[1] == str(book_id)
+        return any(list_filter_matches(key, d) for d in docs)
+    return affected
+
+def _invalidate_local(book_id, docs):
+    missing_books.invalidate(lambda key: key == str(book_id))
+    return book_cache.invalidate(_affected_by(book_id, docs))
+
+def invalidate_book_cache(book_id, *docs):
+    """Drop the changed book plus only the cached lists whose filter matches
+    the document before or after the write; unrelated searches stay cached"""
+    docs = [d for d in docs if d is not None]
+    dropped = _invalidate_local(book_id, docs)
+    if shared_cache:
+        shared_cache.publish(book_id, docs, _affected_by(book_id, docs))
+    trace.get_current_span().set_attribute("cache.invalidated", dropped)
+
+def _apply_remote_write(book_id, docs):
+    """A write replayed from another worker: drop the affected entries and move this
+    process's validators on, so conditional GETs stop answering 304 for old data"""
+    bump_revision("books", book_id)
+    _invalidate_local(book_id, docs)
+
+def _reset_local_caches():
+    book_cache.invalidate()
+    missing_books.invalidate()
+    reset_revisions()
+
+@app.before_request
+def sync_shared_cache():
+    """Apply writes made by other workers to this process's cache before serving"""
+    if shared_cache:
+        shared_cache.sync(_apply_remote_write, _reset_local_caches)
+
 # ------------------ Helper functions ------------------
 
-def generate_etag(data_dict):
-    with tracer.start_as_current_span("generate_etag"):
-        data_str = json.dumps(data_dict, sort_keys=True, default=str)
-        etag = hashlib.md5(data_str.encode('utf-8')).hexdigest()
-        # Add custom span attributes
-        span = trace.get_current_span()
-        span.set_attribute("etag.length", len(etag))
+# Per-collection and per-document revision counters, bumped by every write path.
+# ETags are derived from the revision plus the query key, so computing a
+# validator is O(1) and no longer requires fetching and hashing the result.
+ETAG_EPOCH = secrets.token_hex(4)  # changes on restart so old ETags never match by accident
+_revision_lock = threading.Lock()
+_collection_revisions = {}
+_document_revisions = {}
+_collection_modified = {}
+STARTED_AT = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+
+def bump_revision(collection, doc_id=None):
+    """Bump the collection revision (and the document revision if given) after a write"""
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        _collection_modified[collection] = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        if doc_id is not None:
+            key = (collection, str(doc_id))
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def reset_revisions():
+    """Some writes were missed (signals trimmed before this process saw them): change
+    the epoch so no ETag issued so far can match, and treat everything as modified now"""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        for collection in list(_collection_modified) + ["books"]:
+            _collection_modified[collection] = now
+
+def collection_last_modified(collection):
+    """Time of the last write seen by this process (startup time if none yet)"""
+    return _collection_modified.get(collection, STARTED_AT)
+
+def query_key():
+    """Normalize the query string (sorted params) so equivalent requests share an ETag"""
+    return "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+def generate_etag(collection, doc_id=None, key=""):
+    with tracer.start_as_current_span("generate_etag") as span:
+        if doc_id is None:
+            revision = _collection_revisions.get(collection, 0)
+        else:
+            revision = _document_revisions.get((collection, str(doc_id)), 0)
+        raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+        etag = representation_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+        span.set_attribute("etag.revision", revision)
         return etag
 
-def success_response(data=None, message=None, status_code=200, etag=None):
-    response = make_response(jsonify({
+# Clients/proxies may reuse a response for a bounded window past max-age while revalidating
+CACHE_CONTROL = (f"private, max-age={app.config['HTTP_MAX_AGE']}, "
+                 f"stale-while-revalidate={app.config['HTTP_STALE_WHILE_REVALIDATE']}")
+
+# ------------------ JSON encoding ------------------
+# Both encoders understand ObjectId/datetime directly, so Mongo documents are
+# encoded as-is instead of going through a str(_id) conversion loop first.
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib JSON provider extended with ObjectId support"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+app.json = MongoJSONProvider(app)
+
+def _orjson_default(o):
+    # Datetimes are passed through so both encoders share the provider's conversions
+    # (ObjectId -> str, datetime -> HTTP date); keys are sorted like the provider does
+    return MongoJSONProvider.default(o)
+
+def encode_json(payload):
+    """Encode payload to bytes with the configured encoder (JSON_ENCODER=orjson|stdlib)"""
+    if app.config['JSON_ENCODER'] == 'orjson' and orjson is not None:
+        return orjson.dumps(payload, default=_orjson_default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS)
+    return app.json.dumps(payload, separators=(",", ":")).encode('utf-8')
+
+def json_response(payload, status_code=200):
+    return app.response_class(encode_json(payload), status=status_code, mimetype='application/json')
+
+# ------------------ Content negotiation ------------------
+# Handlers and cache keys are shared by every representation; only the final
+# encoding step follows the Accept header. JSON stays the default, MessagePack and
+# protobuf are offered when their libraries are installed. The bytes differ per
+# representation, so ETags carry a representation suffix (representation_etag).
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+PROTOBUF_MIMETYPE = 'application/x-protobuf'
+
+def negotiate_mimetype():
+    offers = ['application/json']
+    if msgpack is not None:
+        offers.extend(MSGPACK_MIMETYPES)
+    if library_pb2 is not None:
+        offers.append(PROTOBUF_MIMETYPE)
+    return request.accept_mimetypes.best_match(offers, default='application/json')
+
+def representation_etag(etag):
+    """Suffix an ETag with the negotiated representation (e.g. "<hash>-msgpack") so a
+    304 never validates a representation the client has not received"""
+    return f"{etag}-{negotiate_mimetype().split('/', 1)[1]}"
+
+def _msgpack_default(o):
+    if isinstance(o, ObjectId):
+        return str(o)
+    if isinstance(o, datetime.datetime):
+        return o.isoformat()
+    raise TypeError(f"Object of type {type(o).__name__} is not MessagePack serializable")
+
+def book_message(book):
+    return library_pb2.Book(id=str(book.get('_id', '')), title=book.get('title') or '',
+                            author=book.get('author') or '', available=bool(book.get('available')))
+
+def to_protobuf(payload):
+    """Map the envelope onto library.Envelope: books and book lists get typed messages,
+    anything else goes into the generic `other` value"""
+    envelope = library_pb2.Envelope(status=payload["status"], message=payload["message"] or "")
+    data = payload["data"]
+    if isinstance(data, dict) and "books" in data:
+        envelope.books.SetInParent()
+        envelope.books.books.extend(book_message(b) for b in data["books"])
+    elif isinstance(data, dict) and "title" in data:
+        envelope.book.CopyFrom(book_message(data))
+    else:
+        json_format.ParseDict(json.loads(encode_json(data)), envelope.other)
+    return envelope.SerializeToString()
+
+def negotiated_response(payload, status_code=200):
+    mimetype = negotiate_mimetype()
+    if mimetype in MSGPACK_MIMETYPES:
+        response = app.response_class(msgpack.packb(payload, default=_msgpack_default),
+                                      status=status_code, mimetype=mimetype)
+    elif mimetype == PROTOBUF_MIMETYPE:
+        response = app.response_class(to_protobuf(payload), status=status_code, mimetype=mimetype)
+    else:
+        response = json_response(payload, status_code)
+    response.vary.add('Accept')
+    return response
+
+def is_not_modified(etag, last_modified=None):
+    """Evaluate If-None-Match / If-Modified-Since without touching MongoDB"""
+    client_etag = request.headers.get('If-None-Match')
+    if client_etag is not None:
+        return client_etag == etag
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def not_modified_response(etag, last_modified=None):
+    response = make_response('', 304)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
+
+def success_response(data=None, message=None, status_code=200, etag=None, last_modified=None):
+    response = negotiated_response({
         "status": "success",
         "data": data,
         "message": message
-    }), status_code)
+    }, status_code)
     if etag:
         response.headers["ETag"] = etag
-        response.headers["Cache-Control"] = "private, max-age=120"
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    if last_modified is not None:
+        response.last_modified = last_modified
     return response
 
 def error_response(message, status_code=400):
@@ -144,17 +762,58 @@ def error_response(message, status_code=400):
     span.set_attribute("error.message", message)
     span.set_attribute("http.status_code", status_code)
     
-    return make_response(jsonify({
+    return json_response({
         "status": "error",
         "data": None,
         "message": message
-    }), status_code)
-
-def serialize_doc(doc):
-    doc['_id'] = str(doc['_id'])
-    return doc
+    }, status_code)
 
 # ------------------ AUTH ------------------
+class TokenCache:
+    """Bounded LRU of already verified token claims, keyed by sha256(secret, token).
+    An entry lives until the token's own exp, so a repeated token skips signature
+    verification and base64/JSON parsing; failed verifications are never cached."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # injectable so tests can move time without patching the time module
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # tokens without exp are not cached
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'])
 
 def token_required(f):
     @wraps(f)
@@ -171,7 +830,7 @@ def token_required(f):
                 return error_response("Token is missing", 401)
             
             try:
-                data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+                data = token_cache.decode(token, app.config['SECRET_KEY'])
                 current_user = data['user']
                 span.set_attribute("auth.status", "valid")
                 span.set_attribute("auth.user", current_user)
@@ -212,6 +871,13 @@ def login():
 @token_required
 @limiter.limit("20 per minute") 
 def get_books(current_user):
+    # Conditional GET is answered from revision metadata before any query runs
+    etag = generate_etag("books", key=query_key())
+    last_modified = collection_last_modified("books")
+    if is_not_modified(etag, last_modified):
+        trace.get_current_span().set_attribute("cache.hit", True)
+        return not_modified_response(etag, last_modified)
+    
     with tracer.start_as_current_span("build_query") as span:
         query = {}
         available = request.args.get('available')
@@ -226,16 +892,17 @@ def get_books(current_user):
             query['author'] = {'$regex': author, '$options': 'i'}
         
         span.set_attribute("query.filters", str(query))
+        cache_key = ("list", query.get('available'), title or None, author or None)
     
-    with tracer.start_as_current_span("fetch_books_from_db") as span:
-        books = list(books_col.find(query).limit(20))
-        span.set_attribute("books.count", len(books))
+    def load_books():
+        with tracer.start_as_current_span("fetch_books_from_db") as span:
+            books = list(books_col.find(query).limit(20))
+            span.set_attribute("books.count", len(books))
+            return books
     
-    with tracer.start_as_current_span("serialize_books"):
-        books = [serialize_doc(b) for b in books]
+    books = cached_read(cache_key, load_books)
     
-    etag = generate_etag(books)
-    return success_response({"books": books}, "Books fetched successfully", etag=etag)
+    return success_response({"books": books}, "Books fetched successfully", etag=etag, last_modified=last_modified)
 
 @app.route('/api/v1/books', methods=['POST'])
 @token_required
@@ -260,7 +927,9 @@ def create_book(current_user):
         book['_id'] = str(result.inserted_id)
         span.set_attribute("book.id", book['_id'])
     
-    etag = generate_etag(book)
+    bump_revision("books", book['_id'])
+    invalidate_book_cache(book['_id'], book)
+    etag = generate_etag("books", book['_id'])
     return success_response(book, "Book created", 201, etag)
 
 @app.route('/api/v1/books/<book_id>', methods=['GET'])
@@ -270,15 +939,26 @@ def get_book(current_user, book_id):
     with tracer.start_as_current_span("fetch_book_by_id") as span:
         span.set_attribute("book.id", book_id)
         
-        book = books_col.find_one({"_id": ObjectId(book_id)})
+        # Malformed ids and recently confirmed misses never reach MongoDB
+        if not ObjectId.is_valid(book_id):
+            span.set_attribute("book.valid_id", False)
+            return error_response("Invalid book ID", 400)
+        if missing_books.get(book_id)[0]:
+            span.set_attribute("cache.negative_hit", True)
+            span.set_attribute("book.found", False)
+            return error_response("Book not found", 404)
+        
+        def load_book():
+            return books_col.find_one({"_id": ObjectId(book_id)})
+        
+        book = cached_read(("book", book_id), load_book)
         if not book:
             span.set_attribute("book.found", False)
             return error_response("Book not found", 404)
         
         span.set_attribute("book.found", True)
-        book = serialize_doc(book)
     
-    etag = generate_etag(book)
+    etag = generate_etag("books", book_id)
     client_etag = request.headers.get('If-None-Match')
     
     if client_etag == etag:
@@ -288,6 +968,41 @@ def get_book(current_user, book_id):
     
     return success_response(book, etag=etag)
 
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+BOOK_PATCH_FIELDS = {"title": str, "author": str, "available": bool}
+BOOK_REQUIRED_FIELDS = ("title", "author")
+
+def merge_patch_operators(patch, field_types, required=()):
+    """Translate a flat JSON Merge Patch (RFC 7396) into $set/$unset: null removes
+    the field, any other value replaces it. Raises ValueError for invalid patches"""
+    if not isinstance(patch, dict) or not patch:
+        raise ValueError("Merge patch must be a non-empty JSON object")
+    unknown = [k for k in patch if k not in field_types]
+    if unknown:
+        raise ValueError(f"Unknown or read-only field(s): {', '.join(unknown)}")
+    set_fields, unset_fields = {}, {}
+    for key, value in patch.items():
+        expected = field_types[key]
+        if value is None:
+            if key in required:
+                raise ValueError(f"Field '{key}' cannot be removed")
+            unset_fields[key] = ""
+        elif not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ValueError(f"Field '{key}' must be of type {expected.__name__}")
+        else:
+            set_fields[key] = value
+    return set_fields, unset_fields
+
+def prefers_minimal():
+    return 'return=minimal' in request.headers.get('Prefer', '')
+
+def minimal_response(etag):
+    """Prefer: return=minimal -> 204 with only the new validator"""
+    response = make_response('', 204)
+    response.headers["ETag"] = etag
+    response.headers["Preference-Applied"] = "return=minimal"
+    return response
+
 @app.route('/api/v1/books/<book_id>', methods=['PUT'])
 @token_required
 @limiter.limit("10 per minute")
@@ -303,18 +1018,65 @@ def update_book(current_user, book_id):
         span.set_attribute("update.fields", str(update_fields))
     
     with tracer.start_as_current_span("update_book_in_db") as span:
-        result = books_col.update_one({"_id": ObjectId(book_id)}, {"$set": update_fields})
+        old_book = books_col.find_one_and_update(
+            {"_id": ObjectId(book_id)},
+            {"$set": update_fields},
+            return_document=ReturnDocument.BEFORE
+        )
         
-        if result.matched_count == 0:
+        if old_book is None:
             span.set_attribute("book.found", False)
             return error_response("Book not found", 404)
         
         span.set_attribute("book.found", True)
-        span.set_attribute("book.modified", result.modified_count > 0)
+        span.set_attribute("book.modified", any(old_book.get(k) != v for k, v in update_fields.items()))
     
-    book = books_col.find_one({"_id": ObjectId(book_id)})
-    book = serialize_doc(book)
-    return success_response(book, "Book updated", etag=generate_etag(book))
+    bump_revision("books", book_id)
+    book = {**old_book, **update_fields}  # post-image derived from the pre-image, no re-read
+    invalidate_book_cache(book_id, old_book, book)
+    return success_response(book, "Book updated", etag=generate_etag("books", book_id))
+
+@app.route('/api/v1/books/<book_id>', methods=['PATCH'])
+@token_required
+@limiter.limit("10 per minute")
+def patch_book(current_user, book_id):
+    """JSON Merge Patch: a single find_one_and_update with $set/$unset"""
+    if request.mimetype != MERGE_PATCH_MIMETYPE:
+        return error_response(f"Content-Type must be {MERGE_PATCH_MIMETYPE}", 415)
+    if not ObjectId.is_valid(book_id):
+        return error_response("Invalid book ID", 400)
+    try:
+        set_fields, unset_fields = merge_patch_operators(
+            request.get_json(silent=True), BOOK_PATCH_FIELDS, BOOK_REQUIRED_FIELDS)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    update = {}
+    if set_fields:
+        update["$set"] = set_fields
+    if unset_fields:
+        update["$unset"] = unset_fields
+
+    with tracer.start_as_current_span("patch_book_in_db") as span:
+        span.set_attribute("book.id", book_id)
+        span.set_attribute("update.fields", str(update))
+        old_book = books_col.find_one_and_update(
+            {"_id": ObjectId(book_id)},
+            update,
+            return_document=ReturnDocument.BEFORE
+        )
+        span.set_attribute("book.found", old_book is not None)
+        if old_book is None:
+            return error_response("Book not found", 404)
+
+    bump_revision("books", book_id)
+    book = {k: v for k, v in old_book.items() if k not in unset_fields}
+    book.update(set_fields)
+    invalidate_book_cache(book_id, old_book, book)
+    etag = generate_etag("books", book_id)
+    if prefers_minimal():
+        return minimal_response(etag)
+    return success_response(book, "Book updated", etag=etag)
 
 @app.route('/api/v1/books/<book_id>', methods=['DELETE'])
 @token_required
@@ -323,15 +1085,17 @@ def delete_book(current_user, book_id):
     with tracer.start_as_current_span("delete_book_from_db") as span:
         span.set_attribute("book.id", book_id)
         
-        result = books_col.delete_one({"_id": ObjectId(book_id)})
+        old_book = books_col.find_one_and_delete({"_id": ObjectId(book_id)})
         
-        if result.deleted_count == 0:
+        if old_book is None:
             span.set_attribute("book.found", False)
             return error_response("Book not found", 404)
         
         span.set_attribute("book.found", True)
         span.set_attribute("book.deleted", True)
     
+    bump_revision("books", book_id)
+    invalidate_book_cache(book_id, old_book)
     return success_response(None, "Book deleted")
 
 # ------------------ Health Check ------------------
@@ -348,7 +1112,11 @@ def health_check():
             return success_response({
                 "status": "healthy",
                 "mongodb": "connected",
-                "tracing": "enabled"
+                "tracing": "enabled",
+                "cache": book_cache.stats(),
+                "negative_cache": missing_books.stats(),
+                "shared_cache": shared_cache.stats() if shared_cache else None,
+                "token_cache": token_cache.stats()
             })
         except Exception as e:
             span.set_attribute("mongodb.healthy", False)
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: library.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rlibrary.proto\x12\x07library\x1a\x1cgoogle/protobuf/struct.proto\"I\n\x04\x42ook\x12\x0f\n\x02id\x18\x01 \x01(\tR\x03_id\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x11\n\tavailable\x18\x04 \x01(\x08\"(\n\x08\x42ookList\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\"\x9f\x01\n\x08\x45nvelope\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1d\n\x04\x62ook\x18\x03 \x01(\x0b\x32\r.library.BookH\x00\x12\"\n\x05\x62ooks\x18\x04 \x01(\x0b\x32\x11.library.BookListH\x00\x12\'\n\x05other\x18\x0f \x01(\x0b\x32\x16.google.protobuf.ValueH\x00\x42\x06\n\x04\x64\x61tab\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'library_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _BOOK._serialized_start=56
+  _BOOK._serialized_end=129
+  _BOOKLIST._serialized_start=131
+  _BOOKLIST._serialized_end=171
+  _ENVELOPE._serialized_start=174
+  _ENVELOPE._serialized_end=333
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,104 @@
+import datetime
+import importlib.util
+import os
+from unittest import mock
+
+import jwt
+import mongomock
+import pytest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book.py')
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture(scope='module')
+def book_app():
+    """Load book.py against an in-memory MongoDB with the shared cache tier off"""
+    with mock.patch.dict(os.environ, {'SHARED_CACHE_PATH': ''}), \
+            mock.patch('pymongo.MongoClient', mongomock.MongoClient):
+        spec = importlib.util.spec_from_file_location('week10_book', APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    module.app.config['SECRET_KEY'] = 'test_secret'
+    module.limiter.enabled = False
+    return module
+
+
+@pytest.fixture
+def client(book_app):
+    with book_app.app.test_client() as client:
+        yield client
+    book_app.books_col.delete_many({})
+    book_app.book_cache.invalidate()
+
+
+@pytest.fixture
+def auth_headers():
+    token = jwt.encode({'user': 'admin', 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)},
+                       'test_secret', algorithm="HS256")
+    return {'Authorization': f'Bearer {token}'}
+
+
+def create_book(client, headers, title='Clean Code', author='Robert C. Martin'):
+    response = client.post('/api/v1/books', json={'title': title, 'author': author}, headers=headers)
+    return response.get_json()['data']['_id']
+
+
+# ==================== CONTENT NEGOTIATION ====================
+class TestContentNegotiation:
+    """Accept picks JSON, MessagePack or protobuf; each representation has its own ETag"""
+
+    @pytest.mark.skipif(importlib.util.find_spec('msgpack') is None, reason="msgpack not installed")
+    def test_msgpack_representation_has_its_own_etag(self, client, auth_headers):
+        import msgpack
+        book_id = create_book(client, auth_headers)
+        as_json = client.get(f'/api/v1/books/{book_id}', headers=auth_headers)
+
+        as_msgpack = client.get(f'/api/v1/books/{book_id}',
+                                headers={**auth_headers, 'Accept': 'application/msgpack',
+                                         'If-None-Match': as_json.headers['ETag']})
+
+        assert as_msgpack.status_code == 200
+        assert as_msgpack.mimetype == 'application/msgpack'
+        assert msgpack.unpackb(as_msgpack.data)['data']['title'] == 'Clean Code'
+        assert as_msgpack.headers['ETag'] != as_json.headers['ETag']
+
+    def test_protobuf_book(self, book_app, client, auth_headers):
+        if book_app.library_pb2 is None:
+            pytest.skip("protobuf not installed")
+        book_id = create_book(client, auth_headers)
+
+        response = client.get(f'/api/v1/books/{book_id}',
+                              headers={**auth_headers, 'Accept': 'application/x-protobuf'})
+
+        envelope = book_app.library_pb2.Envelope.FromString(response.data)
+        assert response.mimetype == 'application/x-protobuf'
+        assert (envelope.book.id, envelope.book.title) == (book_id, 'Clean Code')
+
+
+# ==================== MERGE PATCH ====================
+class TestMergePatch:
+    """PATCH /books/<id> with application/merge-patch+json"""
+
+    def test_return_minimal_sends_the_validator_and_drops_the_cached_book(self, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+        client.get(f'/api/v1/books/{book_id}', headers=auth_headers)  # cached now
+
+        response = client.patch(f'/api/v1/books/{book_id}', data='{"title": "Refactoring"}',
+                                headers={**auth_headers, 'Content-Type': 'application/merge-patch+json',
+                                         'Prefer': 'return=minimal'})
+
+        assert response.status_code == 204
+        assert response.headers['Preference-Applied'] == 'return=minimal'
+        after = client.get(f'/api/v1/books/{book_id}', headers=auth_headers)
+        assert after.headers['ETag'] == response.headers['ETag']
+        assert after.get_json()['data']['title'] == 'Refactoring'
+
+    def test_required_field_cannot_be_removed(self, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+
+        response = client.patch(f'/api/v1/books/{book_id}', data='{"author": null}',
+                                headers={**auth_headers, 'Content-Type': 'application/merge-patch+json'})
+
+        assert response.status_code == 400
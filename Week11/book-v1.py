@@ -1,20 +1,38 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory, url_for
+from flask import Flask, request, jsonify, make_response, send_from_directory, url_for, \
+    stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+import base64
+import gzip
 import hashlib
 import json
+import mimetypes
+import secrets
+import sqlite3
+import time
+import zlib
 import jwt
 import datetime
 from functools import wraps
 from flask_swagger_ui import get_swaggerui_blueprint
 from dotenv import load_dotenv
 from bson import ObjectId
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
 import os
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+
+try:
+    import orjson
+except ImportError:  # optional fast path; Flask's stdlib encoder is used instead
+    orjson = None
+try:
+    import brotli
+except ImportError:  # optional; responses fall back to gzip only
+    brotli = None
 import requests
-from threading import Thread
-from collections import defaultdict
+from threading import Thread, Lock, local
+from collections import defaultdict, OrderedDict
 
 load_dotenv()
 
@@ -24,6 +42,22 @@ CORS(app)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "defaultsecret")
 app.config['MONGO_URI'] = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 app.config['MONGO_DB_NAME'] = os.getenv("MONGO_DB_NAME", "library_db")
+app.config['JSON_ENCODER'] = os.getenv("JSON_ENCODER", "orjson" if orjson else "stdlib")
+app.config['FRAGMENT_CACHE_SIZE'] = int(os.getenv("FRAGMENT_CACHE_SIZE", 5000))
+app.config['SYNC_SETTLE_SECONDS'] = int(os.getenv("SYNC_SETTLE_SECONDS", 2))
+app.config['SYNC_PAGE_SIZE'] = int(os.getenv("SYNC_PAGE_SIZE", 200))
+app.config['MULTI_GET_MAX_IDS'] = int(os.getenv("MULTI_GET_MAX_IDS", 100))
+app.config['NEGATIVE_CACHE_TTL'] = int(os.getenv("NEGATIVE_CACHE_TTL", 30))
+app.config['NEGATIVE_CACHE_SIZE'] = int(os.getenv("NEGATIVE_CACHE_SIZE", 10000))
+app.config['STREAM_MIN_ITEMS'] = int(os.getenv("STREAM_MIN_ITEMS", 50))
+app.config['STREAM_BATCH_SIZE'] = int(os.getenv("STREAM_BATCH_SIZE", 20))
+app.config['COMPRESS_MIN_SIZE'] = int(os.getenv("COMPRESS_MIN_SIZE", 500))
+app.config['COMPRESS_LEVEL'] = int(os.getenv("COMPRESS_LEVEL", 6))
+app.config['COMPRESS_CACHE_SIZE'] = int(os.getenv("COMPRESS_CACHE_SIZE", 1000))
+app.config['TOKEN_CACHE_SIZE'] = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+app.config['CACHE_SIGNAL_PATH'] = os.getenv("CACHE_SIGNAL_PATH", "")  # e.g. /dev/shm/library-signals.sqlite3; empty = off
+app.config['CACHE_SIGNAL_RETENTION'] = int(os.getenv("CACHE_SIGNAL_RETENTION", 300))
+app.config['CACHE_SIGNAL_POLL_MS'] = int(os.getenv("CACHE_SIGNAL_POLL_MS", 100))
 
 limiter = Limiter(key_func=get_remote_address)
 limiter.init_app(app)
@@ -40,31 +74,231 @@ event_subscribers = defaultdict(list)
 
 # ------------------ Helper functions ------------------
 
-def generate_etag(data_dict):
-    data_str = json.dumps(data_dict, sort_keys=True, default=str)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+# Per-collection and per-document revision counters, bumped by every write path.
+# ETags are derived from the revision plus the query key, so a validator can be
+# computed (and a conditional GET answered) before MongoDB is queried.
+ETAG_EPOCH = secrets.token_hex(4)  # changes on restart so old ETags never match by accident
+_revision_lock = Lock()
+_collection_revisions = {}
+_document_revisions = {}
+_collection_modified = {}  # collection -> naive UTC time of the newest write seen by this process
+
+def _bump_local(collection, doc_id=None):
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        _collection_modified[collection] = datetime.datetime.utcnow()
+        if doc_id is not None:
+            key = (collection, str(doc_id))
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def bump_revision(collection, doc_id=None):
+    """Bump the collection revision (and the document revision if given) after a write
+    and signal the other workers (see signal_log)"""
+    _bump_local(collection, doc_id)
+    if signal_log:
+        signal_log.publish(collection, doc_id)
+
+def ensure_indexes():
+    """Indexes backing the Last-Modified lookups and the changes feed (create_index is idempotent)"""
+    try:
+        books_col.create_index([("updated_at", 1), ("_id", 1)])
+        events_col.create_index([("event_type", 1), ("timestamp", -1)])
+    except Exception as e:
+        print(f"Failed to create indexes: {e}")
+
+Thread(target=ensure_indexes, daemon=True).start()
+
+def http_timestamp(value):
+    """Naive UTC datetime from MongoDB -> aware, second-resolution Last-Modified value"""
+    if value is None:
+        return None
+    return value.replace(tzinfo=datetime.timezone.utc, microsecond=0)
+
+def books_last_modified():
+    """Collection-level Last-Modified, kept in-process: bump_revision records every
+    write, so MongoDB is only asked until this process has a value. The seed is the
+    newest updated_at or the newest delete (a delete leaves no updated_at behind),
+    both single indexed lookups."""
+    if "books" not in _collection_modified:
+        stamps = []
+        newest = books_col.find_one({}, {"updated_at": 1}, sort=[("updated_at", -1)])
+        if newest and newest.get("updated_at"):
+            stamps.append(newest["updated_at"])
+        deleted = events_col.find_one({"event_type": "book.deleted"}, {"timestamp": 1},
+                                      sort=[("timestamp", -1)])
+        if deleted:
+            stamps.append(deleted["timestamp"])
+        with _revision_lock:  # a write that raced the lookup wins
+            _collection_modified.setdefault("books", max(stamps) if stamps else None)
+    return http_timestamp(_collection_modified["books"])
+
+def query_key():
+    """Normalize host + query string so equivalent requests share an ETag"""
+    args = "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+    return f"{request.host_url}?{args}"
+
+def generate_etag(collection, doc_id=None, key=""):
+    if doc_id is None:
+        revision = _collection_revisions.get(collection, 0)
+    else:
+        revision = _document_revisions.get((collection, str(doc_id)), 0)
+    raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+# ------------------ JSON encoding ------------------
+# Both encoders understand ObjectId/datetime directly, so Mongo documents are
+# encoded as-is instead of going through a str(_id) conversion loop first.
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """Flask's stdlib JSON provider extended with ObjectId support"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, ObjectId):
+            return str(o)
+        return DefaultJSONProvider.default(o)
+
+app.json = MongoJSONProvider(app)
+
+def _orjson_default(o):
+    # Datetimes are passed through so both encoders share the provider's conversions
+    # (ObjectId -> str, datetime -> HTTP date); keys are sorted like the provider does
+    return MongoJSONProvider.default(o)
+
+def encode_json(payload):
+    """Encode payload to bytes with the configured encoder (JSON_ENCODER=orjson|stdlib)"""
+    if app.config['JSON_ENCODER'] == 'orjson' and orjson is not None:
+        return orjson.dumps(payload, default=_orjson_default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS)
+    return app.json.dumps(payload, separators=(",", ":")).encode('utf-8')
+
+def encode_object(fields):
+    """Join already-encoded values into a JSON object without encoding them again"""
+    return b'{' + b','.join(encode_json(name) + b':' + value for name, value in fields.items()) + b'}'
+
+def iter_object(fields):
+    """Streaming counterpart of encode_object: values may be bytes, iterables of
+    byte chunks, or callables evaluated only when reached (e.g. a count that is
+    known once the preceding array has been streamed)."""
+    yield b'{'
+    for i, (name, value) in enumerate(fields.items()):
+        yield (b',' if i else b'') + encode_json(name) + b':'
+        if callable(value):
+            value = value()
+        if isinstance(value, bytes):
+            yield value
+        else:
+            yield from value
+    yield b'}'
+
+def iter_array(cursor, encode, counter=None):
+    """Write a cursor as a JSON array, one chunk per STREAM_BATCH_SIZE documents.
+    Only one batch is held in memory; the number of items ends up in counter['count']."""
+    batch_size = app.config['STREAM_BATCH_SIZE']
+    count = 0
+    try:
+        batch = []
+        yield b'['
+        for doc in cursor.batch_size(batch_size):
+            batch.append(encode(doc))
+            if len(batch) == batch_size:
+                yield (b',' if count else b'') + b','.join(batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            yield (b',' if count else b'') + b','.join(batch)
+            count += len(batch)
+        yield b']'
+    finally:
+        cursor.close()
+    if counter is not None:
+        counter['count'] = count
+
+def should_stream(limit):
+    """Lists that can reach STREAM_MIN_ITEMS are streamed; smaller ones stay buffered
+    (Content-Length, precompressed variants)"""
+    return limit >= app.config['STREAM_MIN_ITEMS']
+
+def json_response(payload, status_code=200):
+    return app.response_class(encode_json(payload), status=status_code, mimetype='application/json')
+
+def book_etag(book):
+    """Document ETag taken straight from the persisted revision field"""
+    return f"{book['_id']}-{book.get('revision', 0)}"
+
+def strip_weak(tag):
+    """Drop the W/ prefix: compressed variants are served with weak ETags"""
+    tag = tag.strip()
+    return tag[2:] if tag.startswith('W/') else tag
+
+def _etag_revision(book_id, tag):
+    tag = strip_weak(tag)
+    doc_id, _, revision = tag.strip('"').rpartition('-')
+    return int(revision) if doc_id == book_id and revision.isdigit() else None
+
+def book_write_filter(book_id, **conditions):
+    """Filter for a single-round-trip conditional write: the book id, any state
+    conditions and, when If-Match is sent, the revision(s) the client last saw"""
+    book_filter = {"_id": ObjectId(book_id), **conditions}
+    if_match = request.headers.get('If-Match')
+    if if_match and if_match.strip() != '*':
+        revisions = [r for r in (_etag_revision(book_id, t) for t in if_match.split(',')) if r is not None]
+        if 0 in revisions:
+            revisions.append(None)  # books written before the revision field existed
+        book_filter['revision'] = {'$in': revisions}
+    return book_filter
+
+def is_not_modified(etag, last_modified=None):
+    """Evaluate If-None-Match / If-Modified-Since without querying MongoDB"""
+    client_etag = request.headers.get('If-None-Match')
+    if client_etag is not None:
+        return any(strip_weak(tag) == etag for tag in client_etag.split(','))
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified <= request.if_modified_since
+    return False
+
+def not_modified_response(etag, last_modified=None):
+    response = make_response('', 304)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, max-age=120"
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response
 
-def success_response(data=None, message=None, status_code=200, etag=None, links=None):
+def success_response(data=None, message=None, status_code=200, etag=None, links=None, last_modified=None,
+                     data_bytes=None, data_chunks=None, stream=False):
+    """data_bytes: pre-encoded data. data_chunks: data as an iterable of encoded
+    chunks, sent as a streamed body when stream=True and joined otherwise."""
+    if data_chunks is not None and not stream:
+        data_bytes = b''.join(data_chunks)
+    elif data_bytes is None and data_chunks is None:
+        data_bytes = encode_json(data)
     response_body = {
-        "status": "success",
-        "data": data,
-        "message": message
+        "status": b'"success"',
+        "data": data_chunks if stream else data_bytes,
+        "message": encode_json(message)
     }
     if links:  # HATEOAS support
-        response_body["_links"] = links
+        response_body["_links"] = encode_json(links)
     
-    response = make_response(jsonify(response_body), status_code)
+    if stream:
+        body = stream_with_context(iter_object(response_body))
+    else:
+        body = encode_object(response_body)
+    response = app.response_class(body, status=status_code, mimetype='application/json')
     if etag:
         response.headers["ETag"] = etag
         response.headers["Cache-Control"] = "private, max-age=120"
+    if last_modified is not None:
+        response.last_modified = last_modified
     return response
 
 def error_response(message, status_code=400):
-    return make_response(jsonify({
+    return json_response({
         "status": "error",
         "data": None,
         "message": message
-    }), status_code)
+    }, status_code)
 
 def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
@@ -72,15 +306,47 @@ def serialize_doc(doc):
 
 # ------------------ HATEOAS Links Builder ------------------
 
+# Per-book links as RFC 6570 templates, resolved with url_for once per URL root
+# (scheme + host + script root); each item then only needs a string substitution
+BOOK_LINK_RELS = (
+    ("self", "get_book", None),
+    ("update", "update_book", "PUT"),
+    ("patch", "patch_book", "PATCH"),
+    ("delete", "delete_book", "DELETE"),
+    ("borrow", "borrow_book", "POST"),
+    ("return", "return_book", "POST"),
+)
+BOOK_ID_VAR = "{book_id}"
+LINK_TEMPLATE_ROOTS = 32  # bound on distinct Host headers kept
+_link_templates = {}
+
+def book_link_templates():
+    """{rel: (href template, method)} for the current URL root"""
+    root = request.url_root
+    templates = _link_templates.get(root)
+    if templates is None:
+        slot = "__book_id__"  # url_for would percent-encode the braces
+        templates = {
+            rel: (url_for(endpoint, book_id=slot, _external=True).replace(slot, BOOK_ID_VAR), method)
+            for rel, endpoint, method in BOOK_LINK_RELS
+        }
+        if len(_link_templates) >= LINK_TEMPLATE_ROOTS:
+            _link_templates.clear()
+        _link_templates[root] = templates
+    return templates
+
+def link_object(href, method=None, **extra):
+    return {"href": href, **({"method": method} if method else {}), **extra}
+
+def build_templates_section():
+    """_templates for list responses sent without per-item links (?links=templates)"""
+    return {rel: link_object(href, method, templated=True)
+            for rel, (href, method) in book_link_templates().items()}
+
 def build_book_links(book_id, include_collection=True):
-    """Build HATEOAS links for a book resource"""
-    links = {
-        "self": {"href": url_for('get_book', book_id=book_id, _external=True)},
-        "update": {"href": url_for('update_book', book_id=book_id, _external=True), "method": "PUT"},
-        "delete": {"href": url_for('delete_book', book_id=book_id, _external=True), "method": "DELETE"},
-        "borrow": {"href": url_for('borrow_book', book_id=book_id, _external=True), "method": "POST"},
-        "return": {"href": url_for('return_book', book_id=book_id, _external=True), "method": "POST"}
-    }
+    """Build HATEOAS links for a book resource from the cached templates"""
+    links = {rel: link_object(href.replace(BOOK_ID_VAR, book_id), method)
+             for rel, (href, method) in book_link_templates().items()}
     if include_collection:
         links["collection"] = {"href": url_for('get_books', _external=True)}
     return links
@@ -97,6 +363,263 @@ def build_collection_links(page=1, per_page=20, total=0):
     links["first"] = {"href": url_for('get_books', page=1, per_page=per_page, _external=True)}
     return links
 
+# ------------------ Serialized fragment cache ------------------
+
+# Encoded JSON of each book (item links included) keyed by (URL root, _id, updated_at,
+# revision field), so list responses are assembled by joining bytes instead of
+# rebuilding links and re-encoding every unchanged document on every request.
+# Fragments without links (?links=templates) are host independent and use root None.
+_fragments = OrderedDict()
+_fragments_lock = Lock()
+
+def book_fragment(book, with_links=True):
+    book_id = str(book['_id'])
+    key = (request.url_root if with_links else None, book_id, book.get('updated_at'), book.get('revision', 0))
+    with _fragments_lock:
+        fragment = _fragments.get(key)
+        if fragment is not None:
+            _fragments.move_to_end(key)
+            return fragment
+    if with_links:
+        book['_links'] = build_book_links(book_id, include_collection=False)
+    fragment = encode_json(book)
+    with _fragments_lock:
+        _fragments[key] = fragment
+        while len(_fragments) > app.config['FRAGMENT_CACHE_SIZE']:
+            _fragments.popitem(last=False)
+    return fragment
+
+def bare_book_fragment(book):
+    return book_fragment(book, with_links=False)
+
+def item_links_requested():
+    """False for ?links=templates: list items are sent without _links and clients
+    expand data._templates themselves"""
+    return request.args.get('links') != 'templates'
+
+# ------------------ Negative cache ------------------
+
+# Ids recently confirmed missing, so scrapers and stale links get their 404 without
+# a MongoDB round-trip. Entries expire after NEGATIVE_CACHE_TTL seconds and are
+# dropped as soon as a book with that id is created.
+_missing_books = OrderedDict()  # book_id -> expiry (time.monotonic)
+
+def is_known_missing(book_id):
+    with _revision_lock:
+        expires_at = _missing_books.get(book_id)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del _missing_books[book_id]
+            return False
+        return True
+
+def remember_missing(book_id, revision):
+    """Record a miss unless a book write landed since the lookup started"""
+    with _revision_lock:
+        if _collection_revisions.get("books", 0) != revision:
+            return
+        _missing_books[book_id] = time.monotonic() + app.config['NEGATIVE_CACHE_TTL']
+        _missing_books.move_to_end(book_id)
+        while len(_missing_books) > app.config['NEGATIVE_CACHE_SIZE']:
+            _missing_books.popitem(last=False)
+
+def forget_missing(book_id):
+    with _revision_lock:
+        _missing_books.pop(str(book_id), None)
+
+# ------------------ Response compression ------------------
+
+# Negotiated br/gzip for bodies above COMPRESS_MIN_SIZE. Responses that carry an
+# ETag (cacheable API reads, static files) keep their compressed variant keyed by
+# (URL root, path, ETag, encoding), so each revision is compressed once, not per request.
+# The URL root is part of the key because bodies carry absolute _links. ETags are made
+# weak whenever a content-coding is negotiated: the gzip, br and identity bodies differ
+# byte for byte, so one strong validator cannot stand for all of them.
+# Streamed lists are compressed on the fly, one batch at a time.
+mimetypes.add_type('application/yaml', '.yaml')  # not in every system mime table; swagger spec
+mimetypes.add_type('application/yaml', '.yml')
+COMPRESSIBLE_TYPES = ('application/json', 'application/yaml', 'application/x-yaml',
+                      'application/javascript', 'text/')
+_compressed = OrderedDict()
+_compressed_lock = Lock()
+
+def compress_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=app.config['COMPRESS_LEVEL'])
+    return gzip.compress(body, compresslevel=app.config['COMPRESS_LEVEL'], mtime=0)
+
+def compress_stream(chunks, encoding):
+    """Compress a streamed body incrementally, flushing after every chunk (batch)"""
+    level = app.config['COMPRESS_LEVEL']
+    try:
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=level)
+            for chunk in chunks:
+                yield compressor.process(chunk) + compressor.flush()
+            yield compressor.finish()
+        else:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+            for chunk in chunks:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def negotiate_encoding():
+    offers = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offers)
+
+@app.after_request
+def compress_response(response):
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding()
+    etag = response.headers.get('ETag')
+    if etag and encoding is not None and not etag.startswith('W/'):
+        response.headers['ETag'] = 'W/' + etag  # 304s too, so they match the cached variant
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype == 'text/event-stream'
+            or not (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)):
+        return response
+    if encoding is None:
+        return response
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = compress_stream(response.response, encoding)
+        response.headers['Content-Encoding'] = encoding
+        response.headers.pop('Content-Length', None)
+        return response
+    response.direct_passthrough = False  # send_from_directory streams the file otherwise
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    key = (request.url_root, request.path, etag, encoding)
+    compressed = None
+    if etag:
+        with _compressed_lock:
+            compressed = _compressed.get(key)
+            if compressed is not None:
+                _compressed.move_to_end(key)
+    if compressed is None:
+        compressed = compress_body(body, encoding)
+        if etag:
+            with _compressed_lock:
+                _compressed[key] = compressed
+                while len(_compressed) > app.config['COMPRESS_CACHE_SIZE']:
+                    _compressed.popitem(last=False)
+
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+# ------------------ Cross-worker write signals ------------------
+
+# Revisions, Last-Modified, fragments, the negative cache and compressed bodies all
+# live in this process. With several workers (gunicorn -w N) set CACHE_SIGNAL_PATH:
+# every write appends (collection, id) to a SQLite log shared by the workers on the
+# host, and each worker replays new rows before serving a request, reading the log
+# at most once every CACHE_SIGNAL_POLL_MS (a remote write can take that long to show).
+
+class SignalLog:
+    """Log of (collection, id) writes shared by the worker processes on one host"""
+
+    def __init__(self, path, retention, poll_interval=0.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval  # seconds between two reads of the log
+        self._next_poll = 0.0
+        self._local = local()
+        self._lock = Lock()
+        self._published = set()  # seqs written by this process; already applied locally
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id TEXT, created_at REAL NOT NULL)")
+        # a fresh process has nothing cached yet, so older rows need no replay
+        self.last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    def _conn(self):
+        # One connection per thread, reopened after fork (pre-fork servers import first)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def publish(self, collection, doc_id):
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                           (collection, None if doc_id is None else str(doc_id), now)).lastrowid
+        with self._lock:
+            self._published.add(seq)
+        conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?", (now - self.retention, seq))
+
+    def sync(self, apply, reset):
+        """Replay signals published since the last read: apply(collection, doc_id) for each,
+        or reset() once if some were trimmed before this process could see them.
+        No-op until poll_interval has passed since the previous read."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, collection, doc_id FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, collection, doc_id in rows:
+                    if seq not in self._published:
+                        apply(collection, doc_id)
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.last_seq = rows[-1][0]
+
+signal_log = None
+if app.config['CACHE_SIGNAL_PATH']:
+    signal_log = SignalLog(app.config['CACHE_SIGNAL_PATH'], app.config['CACHE_SIGNAL_RETENTION'],
+                           app.config['CACHE_SIGNAL_POLL_MS'] / 1000)
+
+def apply_remote_write(collection, doc_id):
+    """Another worker wrote: bump revisions here (without publishing again) and drop
+    what this process cached for the document"""
+    _bump_local(collection, doc_id)
+    if collection != "books" or doc_id is None:
+        return
+    forget_missing(doc_id)
+    with _fragments_lock:
+        for key in [key for key in _fragments if key[1] == doc_id]:
+            del _fragments[key]
+    with _compressed_lock:  # keyed by ETags that can no longer match
+        _compressed.clear()
+
+def reset_local_caches():
+    """Some signals were missed: rotate ETAG_EPOCH so no earlier ETag matches, and let
+    Last-Modified be seeded from MongoDB again"""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+        _collection_modified.clear()
+        _missing_books.clear()
+    with _fragments_lock:
+        _fragments.clear()
+    with _compressed_lock:
+        _compressed.clear()
+
+@app.before_request
+def sync_signals():
+    """Apply writes made by other workers before serving the request"""
+    if signal_log:
+        signal_log.sync(apply_remote_write, reset_local_caches)
+
 # ------------------ Event-Driven Architecture ------------------
 
 def publish_event(event_type, data):
@@ -130,6 +653,51 @@ def notify_webhooks(event_type, event):
             print(f"Webhook notification failed: {e}")
 
 # ------------------ AUTH ------------------
+class TokenCache:
+    """Bounded LRU of already verified token claims, keyed by sha256(secret, token).
+    An entry lives until the token's own exp, so a repeated token skips signature
+    verification and base64/JSON parsing; failed verifications are never cached."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # injectable so tests can move time without patching the time module
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # tokens without exp are not cached
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'])
 
 def token_required(f):
     @wraps(f)
@@ -142,7 +710,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -166,6 +734,59 @@ def login():
 
 # ------------------ BOOKS CRUD with HATEOAS ------------------
 
+BOOK_FIELDS = ("title", "author", "isbn", "published_year", "available",
+               "created_at", "updated_at", "revision", "_links")
+
+def requested_fields():
+    """Sparse fieldset from ?fields=title,author (None = whole documents); _id is always included"""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip() and f.strip() != '_id'))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def sparse_book_encoder(fields):
+    """Encoder for projected documents: item links are only built when _links is requested"""
+    with_links = '_links' in fields
+
+    def encode(book):
+        if with_links:
+            book['_links'] = build_book_links(str(book['_id']), include_collection=False)
+        return encode_json(book)
+    return encode
+
+def multi_get_books(raw_ids):
+    """
+    Multi-get: one $in query for many ids instead of one GET per id.
+    Books come back in the requested order, unknown ids are listed under "missing",
+    and the ETag combines the revision of every requested book.
+    """
+    book_ids = list(dict.fromkeys(str(i).strip() for i in raw_ids if str(i).strip()))
+    if not book_ids:
+        return error_response("No book ids given", 400)
+    if len(book_ids) > app.config['MULTI_GET_MAX_IDS']:
+        return error_response(f"At most {app.config['MULTI_GET_MAX_IDS']} ids per request", 400)
+    invalid = [i for i in book_ids if not ObjectId.is_valid(i)]
+    if invalid:
+        return error_response(f"Invalid book ID: {', '.join(invalid)}", 400)
+    
+    found = {str(b['_id']): b for b in books_col.find({"_id": {"$in": [ObjectId(i) for i in book_ids]}})}
+    missing = [i for i in book_ids if i not in found]
+    
+    tags = ",".join(book_etag(found[i]) if i in found else f"{i}-missing" for i in book_ids)
+    etag = hashlib.md5(tags.encode('utf-8')).hexdigest()
+    if is_not_modified(etag):
+        return not_modified_response(etag)
+    
+    data_bytes = encode_object({
+        "books": b'[' + b','.join(book_fragment(found[i]) for i in book_ids if i in found) + b']',
+        "missing": encode_json(missing)
+    })
+    return success_response(message="Books fetched successfully", etag=etag, data_bytes=data_bytes)
+
 @app.route('/api/v1/books', methods=['GET'])
 @token_required
 @limiter.limit("20 per minute") 
@@ -173,7 +794,24 @@ def get_books(current_user):
     """
     Query Pattern: Support filtering, sorting, pagination
     HATEOAS: Include navigation links
+    Conditional GET: If-None-Match is answered from revision metadata, If-Modified-Since
+    from the indexed max updated_at - both before the list query runs
+    Multi-get: ?ids=a,b,c (see multi_get_books)
+    ?links=templates: no per-item links, RFC 6570 templates under data._templates
     """
+    ids = request.args.get('ids')
+    if ids is not None:
+        return multi_get_books(ids.split(','))
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return error_response(str(e), 400)
+    
+    etag = generate_etag("books", key=query_key())
+    last_modified = books_last_modified()
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
+    
     # Pagination
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 20))
@@ -196,27 +834,44 @@ def get_books(current_user):
     sort_by = request.args.get('sort_by', 'title')
     sort_order = -1 if request.args.get('sort_order') == 'desc' else 1
     
-    # Execute query
+    # Execute query. Full documents (with their HATEOAS links) come from the
+    # per-document fragment cache; ?fields= is pushed down as a Mongo projection
+    with_links = item_links_requested()
+    if fields is None:
+        projection, encode = None, book_fragment if with_links else bare_book_fragment
+    else:
+        projection = {"_id": 1, **{f: 1 for f in fields if f != '_links'}}
+        encode = sparse_book_encoder(fields)
     total = books_col.count_documents(query)
-    books = list(books_col.find(query).sort(sort_by, sort_order).skip(skip).limit(per_page))
-    books = [serialize_doc(b) for b in books]
+    cursor = books_col.find(query, projection).sort(sort_by, sort_order).skip(skip).limit(per_page)
     
-    # Add HATEOAS links to each book
-    for book in books:
-        book['_links'] = build_book_links(book['_id'], include_collection=False)
-    
-    etag = generate_etag(books)
     links = build_collection_links(page, per_page, total)
     
-    return success_response({
-        "books": books,
-        "pagination": {
+    data = {
+        "books": iter_array(cursor, encode),
+        "pagination": encode_json({
             "page": page,
             "per_page": per_page,
             "total": total,
             "total_pages": (total + per_page - 1) // per_page
-        }
-    }, "Books fetched successfully", etag=etag, links=links)
+        })
+    }
+    if not with_links:
+        data["_templates"] = encode_json(build_templates_section())
+    data_chunks = iter_object(data)
+    return success_response(message="Books fetched successfully", etag=etag, links=links,
+                            last_modified=last_modified, data_chunks=data_chunks,
+                            stream=should_stream(per_page))
+
+@app.route('/api/v1/books/lookup', methods=['POST'])
+@token_required
+@limiter.limit("20 per minute")
+def lookup_books(current_user):
+    """Multi-get for id lists too long for a query string: {"ids": [...]}"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('ids'), list):
+        return error_response("Missing ids list", 400)
+    return multi_get_books(data['ids'])
 
 @app.route('/api/v1/books', methods=['POST'])
 @token_required
@@ -234,15 +889,18 @@ def create_book(current_user):
         "published_year": data.get('published_year'),
         "available": True,
         "created_at": datetime.datetime.utcnow(),
-        "updated_at": datetime.datetime.utcnow()
+        "updated_at": datetime.datetime.utcnow(),
+        "revision": 1
     }
     result = books_col.insert_one(book)
     book['_id'] = str(result.inserted_id)
+    bump_revision("books", book['_id'])
+    forget_missing(book['_id'])
     
     # Publish event
     publish_event("book.created", serialize_doc(book))
     
-    etag = generate_etag(book)
+    etag = book_etag(book)
     links = build_book_links(book['_id'])
     
     return success_response(book, "Book created", 201, etag, links)
@@ -252,30 +910,68 @@ def create_book(current_user):
 @limiter.limit("10 per minute")
 def get_book(current_user, book_id):
     """CRUD Read + HATEOAS"""
-    try:
-        book = books_col.find_one({"_id": ObjectId(book_id)})
-    except:
+    # Malformed ids and recently confirmed misses never reach MongoDB
+    if not ObjectId.is_valid(book_id):
         return error_response("Invalid book ID", 400)
+    if is_known_missing(book_id):
+        return error_response("Book not found", 404)
     
+    revision = _collection_revisions.get("books", 0)
+    book = books_col.find_one({"_id": ObjectId(book_id)})
     if not book:
+        remember_missing(book_id, revision)
         return error_response("Book not found", 404)
     
-    book = serialize_doc(book)
-    etag = generate_etag(book)
+    etag = book_etag(book)
+    last_modified = http_timestamp(book.get('updated_at'))
     
-    # ETag validation
-    client_etag = request.headers.get('If-None-Match')
-    if client_etag == etag:
-        return '', 304
+    # Conditional GET (ETag first, then Last-Modified)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified)
     
     links = build_book_links(book_id)
-    return success_response(book, etag=etag, links=links)
+    return success_response(book, etag=etag, links=links, last_modified=last_modified)
+
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+BOOK_PATCH_FIELDS = {"title": str, "author": str, "isbn": str, "published_year": int, "available": bool}
+BOOK_REQUIRED_FIELDS = ("title", "author")
+
+def merge_patch_operators(patch, field_types, required=()):
+    """Translate a flat JSON Merge Patch (RFC 7396) into $set/$unset: null removes
+    the field, any other value replaces it. Raises ValueError for invalid patches"""
+    if not isinstance(patch, dict) or not patch:
+        raise ValueError("Merge patch must be a non-empty JSON object")
+    unknown = [k for k in patch if k not in field_types]
+    if unknown:
+        raise ValueError(f"Unknown or read-only field(s): {', '.join(unknown)}")
+    set_fields, unset_fields = {}, {}
+    for key, value in patch.items():
+        expected = field_types[key]
+        if value is None:
+            if key in required:
+                raise ValueError(f"Field '{key}' cannot be removed")
+            unset_fields[key] = ""
+        elif not isinstance(value, expected) or (isinstance(value, bool) and expected is not bool):
+            raise ValueError(f"Field '{key}' must be of type {expected.__name__}")
+        else:
+            set_fields[key] = value
+    return set_fields, unset_fields
+
+def prefers_minimal():
+    return 'return=minimal' in request.headers.get('Prefer', '')
+
+def minimal_response(etag):
+    """Prefer: return=minimal -> 204 with only the new validator"""
+    response = make_response('', 204)
+    response.headers["ETag"] = etag
+    response.headers["Preference-Applied"] = "return=minimal"
+    return response
 
 @app.route('/api/v1/books/<book_id>', methods=['PUT'])
 @token_required
 @limiter.limit("10 per minute")
 def update_book(current_user, book_id):
-    """CRUD Update + Event-Driven"""
+    """CRUD Update + Event-Driven + optimistic concurrency (If-Match)"""
     data = request.get_json()
     update_fields = {}
     for key in ['title', 'author', 'isbn', 'published_year', 'available']:
@@ -284,35 +980,84 @@ def update_book(current_user, book_id):
     
     update_fields['updated_at'] = datetime.datetime.utcnow()
     
+    # One conditional round-trip: applies the update and returns the new document
     try:
-        result = books_col.update_one({"_id": ObjectId(book_id)}, {"$set": update_fields})
+        book = books_col.find_one_and_update(
+            book_write_filter(book_id),
+            {"$set": update_fields, "$inc": {"revision": 1}},
+            return_document=ReturnDocument.AFTER
+        )
     except:
         return error_response("Invalid book ID", 400)
     
-    if result.matched_count == 0:
+    if book is None:
+        if books_col.count_documents({"_id": ObjectId(book_id)}, limit=1):
+            return error_response("Book was modified by another request", 412)
         return error_response("Book not found", 404)
+    bump_revision("books", book_id)
     
-    book = books_col.find_one({"_id": ObjectId(book_id)})
     book = serialize_doc(book)
     
     # Publish event
     publish_event("book.updated", book)
     
     links = build_book_links(book_id)
-    return success_response(book, "Book updated", etag=generate_etag(book), links=links)
+    return success_response(book, "Book updated", etag=book_etag(book), links=links)
+
+@app.route('/api/v1/books/<book_id>', methods=['PATCH'])
+@token_required
+@limiter.limit("10 per minute")
+def patch_book(current_user, book_id):
+    """JSON Merge Patch: one conditional find_one_and_update with $set/$unset (If-Match honoured)"""
+    if request.mimetype != MERGE_PATCH_MIMETYPE:
+        return error_response(f"Content-Type must be {MERGE_PATCH_MIMETYPE}", 415)
+    if not ObjectId.is_valid(book_id):
+        return error_response("Invalid book ID", 400)
+    try:
+        set_fields, unset_fields = merge_patch_operators(
+            request.get_json(silent=True), BOOK_PATCH_FIELDS, BOOK_REQUIRED_FIELDS)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    set_fields['updated_at'] = datetime.datetime.utcnow()
+    update = {"$set": set_fields, "$inc": {"revision": 1}}
+    if unset_fields:
+        update["$unset"] = unset_fields
+    book = books_col.find_one_and_update(
+        book_write_filter(book_id),
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+    if book is None:
+        if books_col.count_documents({"_id": ObjectId(book_id)}, limit=1):
+            return error_response("Book was modified by another request", 412)
+        return error_response("Book not found", 404)
+    bump_revision("books", book_id)
+
+    book = serialize_doc(book)
+    publish_event("book.updated", book)
+
+    etag = book_etag(book)
+    if prefers_minimal():
+        return minimal_response(etag)
+    links = build_book_links(book_id)
+    return success_response(book, "Book updated", etag=etag, links=links)
 
 @app.route('/api/v1/books/<book_id>', methods=['DELETE'])
 @token_required
 @limiter.limit("10 per minute")
 def delete_book(current_user, book_id):
-    """CRUD Delete + Event-Driven"""
+    """CRUD Delete + Event-Driven + optimistic concurrency (If-Match)"""
     try:
-        result = books_col.delete_one({"_id": ObjectId(book_id)})
+        result = books_col.delete_one(book_write_filter(book_id))
     except:
         return error_response("Invalid book ID", 400)
     
     if result.deleted_count == 0:
+        if books_col.count_documents({"_id": ObjectId(book_id)}, limit=1):
+            return error_response("Book was modified by another request", 412)
         return error_response("Book not found", 404)
+    bump_revision("books", book_id)
     
     # Publish event
     publish_event("book.deleted", {"book_id": book_id, "deleted_by": current_user})
@@ -325,23 +1070,27 @@ def delete_book(current_user, book_id):
 @token_required
 @limiter.limit("10 per minute")
 def borrow_book(current_user, book_id):
-    """Business action with event publishing"""
+    """Business action with event publishing + optimistic concurrency (If-Match)"""
+    # Availability is checked inside the update itself, so a successful borrow is one round-trip
     try:
-        book = books_col.find_one({"_id": ObjectId(book_id)})
+        book = books_col.find_one_and_update(
+            book_write_filter(book_id, available=True),
+            {"$set": {"available": False, "borrowed_by": current_user, "borrowed_at": datetime.datetime.utcnow(),
+                      "updated_at": datetime.datetime.utcnow()},
+             "$inc": {"revision": 1}},
+            return_document=ReturnDocument.AFTER
+        )
     except:
         return error_response("Invalid book ID", 400)
     
-    if not book:
-        return error_response("Book not found", 404)
-    
-    if not book.get('available', False):
-        return error_response("Book is not available", 400)
-    
-    # Update book status
-    books_col.update_one(
-        {"_id": ObjectId(book_id)},
-        {"$set": {"available": False, "borrowed_by": current_user, "borrowed_at": datetime.datetime.utcnow()}}
-    )
+    if book is None:
+        current = books_col.find_one({"_id": ObjectId(book_id)})
+        if not current:
+            return error_response("Book not found", 404)
+        if not current.get('available', False):
+            return error_response("Book is not available", 400)
+        return error_response("Book was modified by another request", 412)
+    bump_revision("books", book_id)
     
     # Publish event
     publish_event("book.borrowed", {
@@ -350,33 +1099,34 @@ def borrow_book(current_user, book_id):
         "timestamp": datetime.datetime.utcnow().isoformat()
     })
     
-    book = books_col.find_one({"_id": ObjectId(book_id)})
-    book = serialize_doc(book)
     links = build_book_links(book_id)
     
-    return success_response(book, "Book borrowed successfully", links=links)
+    return success_response(book, "Book borrowed successfully", etag=book_etag(book), links=links)
 
 @app.route('/api/v1/books/<book_id>/return', methods=['POST'])
 @token_required
 @limiter.limit("10 per minute")
 def return_book(current_user, book_id):
-    """Business action with event publishing"""
+    """Business action with event publishing + optimistic concurrency (If-Match)"""
     try:
-        book = books_col.find_one({"_id": ObjectId(book_id)})
+        book = books_col.find_one_and_update(
+            book_write_filter(book_id, available=False),
+            {"$set": {"available": True, "updated_at": datetime.datetime.utcnow()},
+             "$unset": {"borrowed_by": "", "borrowed_at": ""},
+             "$inc": {"revision": 1}},
+            return_document=ReturnDocument.AFTER
+        )
     except:
         return error_response("Invalid book ID", 400)
     
-    if not book:
-        return error_response("Book not found", 404)
-    
-    if book.get('available', True):
-        return error_response("Book was not borrowed", 400)
-    
-    # Update book status
-    books_col.update_one(
-        {"_id": ObjectId(book_id)},
-        {"$set": {"available": True}, "$unset": {"borrowed_by": "", "borrowed_at": ""}}
-    )
+    if book is None:
+        current = books_col.find_one({"_id": ObjectId(book_id)})
+        if not current:
+            return error_response("Book not found", 404)
+        if current.get('available', True):
+            return error_response("Book was not borrowed", 400)
+        return error_response("Book was modified by another request", 412)
+    bump_revision("books", book_id)
     
     # Publish event
     publish_event("book.returned", {
@@ -385,11 +1135,9 @@ def return_book(current_user, book_id):
         "timestamp": datetime.datetime.utcnow().isoformat()
     })
     
-    book = books_col.find_one({"_id": ObjectId(book_id)})
-    book = serialize_doc(book)
     links = build_book_links(book_id)
     
-    return success_response(book, "Book returned successfully", links=links)
+    return success_response(book, "Book returned successfully", etag=book_etag(book), links=links)
 
 # ------------------ Advanced Query Endpoints ------------------
 
@@ -416,13 +1164,98 @@ def search_books(current_user):
         query.setdefault('published_year', {})
         query['published_year']['$lte'] = int(max_year)
     
-    books = list(books_col.find(query).limit(50))
-    books = [serialize_doc(b) for b in books]
-    
-    for book in books:
-        book['_links'] = build_book_links(book['_id'], include_collection=False)
-    
-    return success_response({"books": books, "count": len(books)}, "Search completed")
+    limit = 50
+    counter = {}
+    with_links = item_links_requested()
+    data = {
+        "books": iter_array(books_col.find(query).limit(limit),
+                            book_fragment if with_links else bare_book_fragment, counter),
+        "count": lambda: encode_json(counter['count'])
+    }
+    if not with_links:
+        data["_templates"] = encode_json(build_templates_section())
+    data_chunks = iter_object(data)
+    return success_response(message="Search completed", data_chunks=data_chunks,
+                            stream=should_stream(limit))
+
+# ------------------ Delta sync ------------------
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def encode_sync_token(position):
+    """position: {"u": [updated_at ms, book _id], "d": [timestamp ms, event _id]}"""
+    return base64.urlsafe_b64encode(encode_json(position)).decode('ascii').rstrip('=')
+
+def decode_sync_token(token):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return {
+            stream: (EPOCH + datetime.timedelta(milliseconds=int(ms)), ObjectId(doc_id))
+            for stream, (ms, doc_id) in position.items() if stream in ('u', 'd')
+        }
+    except Exception:
+        return None
+
+def sync_position(timestamp, doc_id):
+    return [(timestamp - EPOCH) // datetime.timedelta(milliseconds=1), str(doc_id)]
+
+def keyset_after(position, field):
+    """Keyset condition: strictly after (field, _id) = position"""
+    if position is None:
+        return {}
+    timestamp, doc_id = position
+    return {"$or": [{field: {"$gt": timestamp}}, {field: timestamp, "_id": {"$gt": doc_id}}]}
+
+@app.route('/api/v1/books/changes', methods=['GET'])
+@token_required
+def get_book_changes(current_user):
+    """
+    Delta sync: books created/updated since an opaque sync token, plus tombstones
+    for deleted books. Both streams are read by keyset on indexed (updated_at, _id)
+    and (timestamp, _id), so the work scales with churn, not catalog size.
+    Changes newer than SYNC_SETTLE_SECONDS are held back until writes in flight
+    have landed, so a token never skips over a slow write.
+    """
+    since = request.args.get('since')
+    position = {}
+    if since:
+        position = decode_sync_token(since)
+        if position is None:
+            return error_response("Invalid sync token", 400)
+    limit = app.config['SYNC_PAGE_SIZE']
+    until = datetime.datetime.utcnow() - datetime.timedelta(seconds=app.config['SYNC_SETTLE_SECONDS'])
+
+    updated_query = {"$and": [keyset_after(position.get('u'), "updated_at"), {"updated_at": {"$lte": until}}]}
+    updated = list(books_col.find(updated_query).sort([("updated_at", 1), ("_id", 1)]).limit(limit))
+
+    # A first sync (no token) has nothing to delete yet: tombstones start from now
+    deleted = []
+    if since:
+        deleted_query = {"$and": [{"event_type": "book.deleted"}, keyset_after(position.get('d'), "timestamp"),
+                                  {"timestamp": {"$lte": until}}]}
+        deleted = list(events_col.find(deleted_query).sort([("timestamp", 1), ("_id", 1)]).limit(limit))
+
+    next_position = {
+        "u": sync_position(*position['u']) if 'u' in position else None,
+        "d": sync_position(*position['d']) if 'd' in position else None
+    }
+    if updated:
+        next_position['u'] = sync_position(updated[-1]['updated_at'], updated[-1]['_id'])
+    if deleted:
+        next_position['d'] = sync_position(deleted[-1]['timestamp'], deleted[-1]['_id'])
+    elif not since:
+        next_position['d'] = sync_position(until, ObjectId("f" * 24))
+    next_position = {k: v for k, v in next_position.items() if v is not None}
+
+    tombstones = [{"_id": e['data'].get('book_id'), "deleted_at": e['timestamp']} for e in deleted]
+    data_bytes = encode_object({
+        "updated": b'[' + b','.join(book_fragment(b) for b in updated) + b']',
+        "deleted": encode_json(tombstones),
+        "next_since": encode_json(encode_sync_token(next_position)),
+        "has_more": encode_json(len(updated) == limit or len(deleted) == limit)
+    })
+    links = {"next": {"href": url_for('get_book_changes', since=encode_sync_token(next_position), _external=True)}}
+    return success_response(message="Changes fetched", links=links, data_bytes=data_bytes)
 
 @app.route('/api/v1/books/stats', methods=['GET'])
 @token_required
@@ -478,7 +1311,6 @@ def register_webhook(current_user):
 def list_webhooks(current_user):
     """List all webhooks for current user"""
     webhooks = list(webhooks_col.find({"user": current_user}))
-    webhooks = [serialize_doc(w) for w in webhooks]
     return success_response({"webhooks": webhooks})
 
 @app.route('/api/v1/webhooks/<webhook_id>', methods=['DELETE'])
@@ -527,10 +1359,12 @@ def get_events(current_user):
     if event_type:
         query['event_type'] = event_type
     
-    events = list(events_col.find(query).sort('timestamp', -1).limit(limit))
-    events = [serialize_doc(e) for e in events]
-    
-    return success_response({"events": events, "count": len(events)})
+    counter = {}
+    data_chunks = iter_object({
+        "events": iter_array(events_col.find(query).sort('timestamp', -1).limit(limit), encode_json, counter),
+        "count": lambda: encode_json(counter['count'])
+    })
+    return success_response(data_chunks=data_chunks, stream=should_stream(limit))
 
 # ------------------ API Documentation ------------------
 
@@ -549,6 +1383,12 @@ def api_root():
     }
     return success_response(None, "API v1", links=links)
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check with token cache metrics (entries, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger ------------------
 
 SWAGGER_URL = '/docs'
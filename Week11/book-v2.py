@@ -1,6 +1,8 @@
 from flask import Flask, request, jsonify, make_response, send_from_directory
 from flask_cors import CORS
 import hashlib
+import time
+from collections import OrderedDict
 import json
 import jwt
 import datetime
@@ -10,10 +12,11 @@ from dotenv import load_dotenv
 from bson import ObjectId
 from pymongo import MongoClient
 import os
+import sqlite3
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 import requests
-from threading import Thread
+from threading import Thread, Lock
 
 load_dotenv()
 
@@ -27,6 +30,9 @@ app.config['MONGO_DB_NAME'] = os.getenv("MONGO_DB_NAME", "library_db")
 # Cấu hình Webhook URL (có thể lưu trong .env hoặc database)
 app.config['WEBHOOK_URL'] = os.getenv("WEBHOOK_URL", None)
 
+# Log tín hiệu ghi dùng chung với book-v1 (xem publish_write_signal). Để trống = tắt.
+app.config['CACHE_SIGNAL_PATH'] = os.getenv("CACHE_SIGNAL_PATH", "")
+
 limiter = Limiter(
     key_func=get_remote_address
 )
@@ -37,6 +43,7 @@ limiter.init_app(app)
 client = MongoClient(app.config['MONGO_URI'])
 db = client[app.config['MONGO_DB_NAME']]
 books_col = db['books']
+events_col = db['events']
 
 
 # ------------------ Helper functions ------------------
@@ -67,6 +74,36 @@ def serialize_doc(doc):
     doc['_id'] = str(doc['_id'])
     return doc
 
+# ------------------ Đồng bộ với book-v1 ------------------
+# book-v1 dùng chung collection books: fragment cache của nó key theo (_id, updated_at,
+# revision), changes feed đọc updated_at và sự kiện "book.deleted" trong events. Vì vậy
+# mọi thao tác ghi ở đây cũng cập nhật updated_at/revision, ghi sự kiện xoá, và báo cho
+# các worker v1 qua log tín hiệu SQLite (CACHE_SIGNAL_PATH) để chúng tăng revision/ETag.
+
+def record_book_deleted(book_id, current_user):
+    """Tombstone cho changes feed của v1, cùng định dạng với publish_event của v1"""
+    events_col.insert_one({
+        "event_type": "book.deleted",
+        "data": {"book_id": book_id, "deleted_by": current_user},
+        "timestamp": datetime.datetime.utcnow(),
+        "event_id": str(ObjectId())
+    })
+
+def publish_write_signal(book_id):
+    """Thêm một dòng (books, id) vào log tín hiệu của v1 (schema giống SignalLog bên v1)"""
+    path = app.config['CACHE_SIGNAL_PATH']
+    if not path:
+        return
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id TEXT, created_at REAL NOT NULL)")
+        conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                     ("books", book_id, time.time()))
+    finally:
+        conn.close()
+
 
 # ------------------ WEBHOOK FUNCTIONS ------------------
 
@@ -115,6 +152,53 @@ def send_webhook_notification(event_type, data):
 
 
 # ------------------ AUTH ------------------
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """LRU có giới hạn chứa claims của token đã verify, key là sha256(secret, token).
+    Entry sống đến đúng exp của token nên token lặp lại bỏ qua bước verify chữ ký và
+    parse base64/JSON; token verify lỗi không bao giờ được cache."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # cho phép test thay đồng hồ mà không patch cả module time
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # token không có exp thì không cache
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 def token_required(f):
     @wraps(f)
@@ -127,7 +211,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -180,16 +264,20 @@ def create_book(current_user):
     if not data or not data.get('title') or not data.get('author'):
         return error_response("Missing title or author", 400)
     
+    now = datetime.datetime.utcnow()
     book = {
         "title": data['title'],
         "author": data['author'],
         "available": True,
-        "created_at": datetime.datetime.utcnow(),
+        "created_at": now,
+        "updated_at": now,
+        "revision": 1,
         "created_by": current_user
     }
     
     result = books_col.insert_one(book)
     book['_id'] = str(result.inserted_id)
+    publish_write_signal(book['_id'])
     
     # 🔔 GỬI WEBHOOK NOTIFICATION KHI CÓ SÁCH MỚI ĐƯỢC TẠO
     webhook_data = {
@@ -230,9 +318,12 @@ def update_book(current_user, book_id):
     for key in ['title', 'author', 'available']:
         if key in data:
             update_fields[key] = data[key]
-    result = books_col.update_one({"_id": ObjectId(book_id)}, {"$set": update_fields})
+    update_fields['updated_at'] = datetime.datetime.utcnow()
+    result = books_col.update_one({"_id": ObjectId(book_id)},
+                                  {"$set": update_fields, "$inc": {"revision": 1}})
     if result.matched_count == 0:
         return error_response("Book not found", 404)
+    publish_write_signal(book_id)
     book = books_col.find_one({"_id": ObjectId(book_id)})
     book = serialize_doc(book)
     return success_response(book, "Book updated", etag=generate_etag(book))
@@ -244,8 +335,16 @@ def delete_book(current_user, book_id):
     result = books_col.delete_one({"_id": ObjectId(book_id)})
     if result.deleted_count == 0:
         return error_response("Book not found", 404)
+    record_book_deleted(book_id, current_user)
+    publish_write_signal(book_id)
     return success_response(None, "Book deleted")
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check kèm số liệu token cache (số entry, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger ------------------
 
 SWAGGER_URL = '/docs'
@@ -0,0 +1,226 @@
+import datetime
+import importlib.util
+import os
+from unittest import mock
+
+import jwt
+import mongomock
+import pytest
+from bson import ObjectId
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book-v1.py')
+
+
+def load_app(name='book_v1'):
+    """Load book-v1.py (not importable by name) against an in-memory MongoDB"""
+    with mock.patch('pymongo.MongoClient', mongomock.MongoClient):
+        spec = importlib.util.spec_from_file_location(name, APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    module.app.config['SECRET_KEY'] = 'test_secret'
+    module.limiter.enabled = False
+    return module
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture(scope='module')
+def book_app():
+    return load_app()
+
+
+@pytest.fixture
+def client(book_app):
+    with book_app.app.test_client() as client:
+        yield client
+    book_app.books_col.delete_many({})
+    book_app.events_col.delete_many({})
+
+
+@pytest.fixture
+def auth_headers():
+    token = jwt.encode({'user': 'admin', 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)},
+                       'test_secret', algorithm="HS256")
+    return {'Authorization': f'Bearer {token}'}
+
+
+# ==================== JSON ENCODING ====================
+class TestJSONEncoding:
+    """orjson and the stdlib provider must produce the same wire format"""
+
+    @pytest.mark.skipif(importlib.util.find_spec('orjson') is None, reason="orjson not installed")
+    def test_encoders_emit_identical_bytes_for_datetimes(self, book_app, monkeypatch):
+        doc = {
+            "_id": ObjectId(),
+            "title": "Clean Code",
+            "updated_at": datetime.datetime(2026, 10, 17, 6, 54, 27, 215000),
+            "created_at": datetime.datetime(2026, 10, 1, 8, 0, 0),
+        }
+        encoded = {}
+        for encoder in ('orjson', 'stdlib'):
+            monkeypatch.setitem(book_app.app.config, 'JSON_ENCODER', encoder)
+            encoded[encoder] = book_app.encode_json(doc)
+
+        assert encoded['orjson'] == encoded['stdlib']
+        assert b'"updated_at":"Sat, 17 Oct 2026 06:54:27 GMT"' in encoded['orjson']
+
+
+
+def create_book(client, headers, title='Clean Code', author='Robert C. Martin'):
+    response = client.post('/api/v1/books', json={'title': title, 'author': author}, headers=headers)
+    return response.get_json()['data']['_id']
+
+
+# ==================== NEGATIVE CACHE ====================
+class TestNegativeCache:
+    """Confirmed misses are answered without another MongoDB lookup"""
+
+    def test_repeated_miss_skips_mongodb(self, book_app, client, auth_headers, monkeypatch):
+        lookups = []
+        find_one = book_app.books_col.find_one
+        monkeypatch.setattr(book_app.books_col, 'find_one', lambda *a, **k: lookups.append(a) or find_one(*a, **k))
+        missing_id = str(ObjectId())
+
+        assert client.get(f'/api/v1/books/{missing_id}', headers=auth_headers).status_code == 404
+        assert client.get(f'/api/v1/books/{missing_id}', headers=auth_headers).status_code == 404
+        assert len(lookups) == 1
+
+    def test_malformed_id_is_rejected_before_lookup(self, client, auth_headers):
+        assert client.get('/api/v1/books/not-an-id', headers=auth_headers).status_code == 400
+
+
+# ==================== MULTI-GET ====================
+class TestMultiGet:
+    """?ids= and POST /lookup fetch many books in one query"""
+
+    def test_books_keep_requested_order_and_report_missing(self, client, auth_headers):
+        first, second = create_book(client, auth_headers, 'A'), create_book(client, auth_headers, 'B')
+        missing_id = str(ObjectId())
+
+        response = client.get(f'/api/v1/books?ids={second},{missing_id},{first}', headers=auth_headers)
+
+        data = response.get_json()['data']
+        assert [book['_id'] for book in data['books']] == [second, first]
+        assert data['missing'] == [missing_id]
+
+    def test_lookup_rejects_malformed_ids(self, client, auth_headers):
+        response = client.post('/api/v1/books/lookup', json={'ids': ['nope']}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+# ==================== SPARSE FIELDSETS ====================
+class TestSparseFieldsets:
+    """?fields= is validated and pushed down as a projection"""
+
+    def test_only_requested_fields_are_returned(self, client, auth_headers):
+        create_book(client, auth_headers)
+
+        books = client.get('/api/v1/books?fields=title', headers=auth_headers).get_json()['data']['books']
+
+        assert set(books[0]) == {'_id', 'title'}
+
+    def test_unknown_field_is_rejected(self, client, auth_headers):
+        response = client.get('/api/v1/books?fields=title,password', headers=auth_headers)
+
+        assert response.status_code == 400
+        assert 'password' in response.get_json()['message']
+
+
+# ==================== LINK TEMPLATES ====================
+class TestLinkTemplates:
+    """Item links are expanded from per-host templates"""
+
+    def test_item_links_match_templates(self, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+
+        linked = client.get('/api/v1/books', headers=auth_headers).get_json()['data']
+        templated = client.get('/api/v1/books?links=templates', headers=auth_headers).get_json()['data']
+
+        self_template = templated['_templates']['self']
+        assert self_template['templated'] is True
+        assert '_links' not in templated['books'][0]
+        assert linked['books'][0]['_links']['self']['href'] == self_template['href'].replace('{book_id}', book_id)
+
+
+# ==================== MERGE PATCH ====================
+class TestMergePatch:
+    """PATCH /books/<id> with application/merge-patch+json"""
+
+    def test_return_minimal_sends_only_the_new_validator(self, book_app, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+
+        response = client.patch(f'/api/v1/books/{book_id}', data='{"title": "Refactoring"}',
+                                headers={**auth_headers, 'Content-Type': 'application/merge-patch+json',
+                                         'Prefer': 'return=minimal'})
+
+        assert response.status_code == 204
+        assert response.data == b''
+        assert response.headers['Preference-Applied'] == 'return=minimal'
+        assert response.headers['ETag'].strip('"') == f'{book_id}-2'
+        assert book_app.books_col.find_one()['title'] == 'Refactoring'
+
+    def test_null_removes_optional_field_but_not_required_one(self, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+        headers = {**auth_headers, 'Content-Type': 'application/merge-patch+json'}
+
+        removed = client.patch(f'/api/v1/books/{book_id}', data='{"isbn": null}', headers=headers)
+        rejected = client.patch(f'/api/v1/books/{book_id}', data='{"title": null}', headers=headers)
+
+        assert removed.status_code == 200
+        assert 'isbn' not in removed.get_json()['data']
+        assert rejected.status_code == 400
+
+    def test_plain_json_is_unsupported(self, client, auth_headers):
+        book_id = create_book(client, auth_headers)
+        response = client.patch(f'/api/v1/books/{book_id}', json={'title': 'X'}, headers=auth_headers)
+        assert response.status_code == 415
+
+# ==================== CROSS-WORKER SIGNALS ====================
+class TestSignalLog:
+    """Two app instances stand in for two workers sharing one MongoDB and signal log"""
+
+    @pytest.fixture
+    def workers(self, tmp_path, monkeypatch):
+        monkeypatch.setenv('CACHE_SIGNAL_PATH', str(tmp_path / 'signals.sqlite3'))
+        monkeypatch.setenv('CACHE_SIGNAL_POLL_MS', '0')
+        a, b = load_app('book_v1_a'), load_app('book_v1_b')
+        b.books_col, b.events_col = a.books_col, a.events_col
+        return a, b
+
+    def test_remote_update_invalidates_etag_and_fragments(self, workers, auth_headers):
+        a, b = workers
+        ca, cb = a.app.test_client(), b.app.test_client()
+        book_id = ca.post('/api/v1/books', json={'title': 'Old', 'author': 'A'},
+                          headers=auth_headers).get_json()['data']['_id']
+        first = cb.get(f'/api/v1/books/{book_id}', headers=auth_headers)
+        cb.get('/api/v1/books', headers=auth_headers)  # fills b's fragment cache
+
+        ca.put(f'/api/v1/books/{book_id}', json={'title': 'New', 'author': 'A'}, headers=auth_headers)
+
+        revalidated = cb.get(f'/api/v1/books/{book_id}',
+                             headers={**auth_headers, 'If-None-Match': first.headers['ETag']})
+        assert revalidated.status_code == 200
+        assert revalidated.get_json()['data']['title'] == 'New'
+        listed = cb.get('/api/v1/books', headers=auth_headers).get_json()['data']['books']
+        assert [book['title'] for book in listed] == ['New']
+
+    def test_own_writes_are_not_replayed(self, workers, auth_headers):
+        a, _ = workers
+        client = a.app.test_client()
+        book_id = client.post('/api/v1/books', json={'title': 'T', 'author': 'A'},
+                              headers=auth_headers).get_json()['data']['_id']
+        etag = client.get(f'/api/v1/books/{book_id}', headers=auth_headers).headers['ETag']
+
+        revalidated = client.get(f'/api/v1/books/{book_id}', headers={**auth_headers, 'If-None-Match': etag})
+        assert revalidated.status_code == 304
+
+    def test_missed_signals_rotate_the_etag_epoch(self, workers):
+        a, b = workers
+        b.signal_log.last_seq = -5  # rows before this one were trimmed
+        a.bump_revision("books", ObjectId())
+        epoch = b.ETAG_EPOCH
+
+        with b.app.test_request_context('/'):
+            b.sync_signals()
+
+        assert b.ETAG_EPOCH != epoch
@@ -0,0 +1,85 @@
+import datetime
+import importlib.util
+import os
+from unittest import mock
+
+import jwt
+import mongomock
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app(filename, name):
+    """Load a book-v*.py module (not importable by name) against an in-memory MongoDB"""
+    with mock.patch('pymongo.MongoClient', mongomock.MongoClient):
+        spec = importlib.util.spec_from_file_location(name, os.path.join(HERE, filename))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.app.config['TESTING'] = True
+    module.app.config['SECRET_KEY'] = 'test_secret'
+    module.limiter.enabled = False
+    return module
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture
+def apps(tmp_path, monkeypatch):
+    """v1 and v2 sharing one books/events collection and one signal log"""
+    monkeypatch.setenv('CACHE_SIGNAL_PATH', str(tmp_path / 'signals.sqlite3'))
+    monkeypatch.setenv('CACHE_SIGNAL_POLL_MS', '0')
+    v1 = load_app('book-v1.py', 'book_v1_interop')
+    v2 = load_app('book-v2.py', 'book_v2_interop')
+    v2.books_col, v2.events_col = v1.books_col, v1.events_col
+    v1.app.config['SYNC_SETTLE_SECONDS'] = 0
+    return v1, v2
+
+
+@pytest.fixture
+def auth_headers():
+    token = jwt.encode({'user': 'admin', 'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=30)},
+                       'test_secret', algorithm="HS256")
+    return {'Authorization': f'Bearer {token}'}
+
+
+# ==================== WRITES SEEN BY V1 ====================
+class TestV2WritesVisibleToV1:
+    """Books written through v2 must keep v1's validators and changes feed correct"""
+
+    def test_create_sets_sync_fields(self, apps, auth_headers):
+        v1, v2 = apps
+        created = v2.app.test_client().post('/api/v1/books', json={'title': 'T', 'author': 'A'},
+                                            headers=auth_headers)
+        assert created.status_code == 201
+
+        book = v1.books_col.find_one()
+        assert book['revision'] == 1
+        assert book['updated_at'] == book['created_at']
+
+    def test_update_invalidates_v1_etag(self, apps, auth_headers):
+        v1, v2 = apps
+        c1, c2 = v1.app.test_client(), v2.app.test_client()
+        book_id = c1.post('/api/v1/books', json={'title': 'Old', 'author': 'A'},
+                          headers=auth_headers).get_json()['data']['_id']
+        etag = c1.get(f'/api/v1/books/{book_id}', headers=auth_headers).headers['ETag']
+
+        c2.put(f'/api/v1/books/{book_id}', json={'title': 'New'}, headers=auth_headers)
+
+        assert v1.books_col.find_one()['revision'] == 2
+        revalidated = c1.get(f'/api/v1/books/{book_id}', headers={**auth_headers, 'If-None-Match': etag})
+        assert revalidated.status_code == 200
+        assert revalidated.get_json()['data']['title'] == 'New'
+
+    def test_changes_feed_reports_v2_creates_and_deletes(self, apps, auth_headers):
+        v1, v2 = apps
+        c1, c2 = v1.app.test_client(), v2.app.test_client()
+        since = c1.get('/api/v1/books/changes', headers=auth_headers).get_json()['data']['next_since']
+
+        book_id = c2.post('/api/v1/books', json={'title': 'T', 'author': 'A'},
+                          headers=auth_headers).get_json()['data']['_id']
+        changes = c1.get(f'/api/v1/books/changes?since={since}', headers=auth_headers).get_json()['data']
+        assert [book['_id'] for book in changes['updated']] == [book_id]
+
+        assert c2.delete(f'/api/v1/books/{book_id}', headers=auth_headers).status_code == 200
+        changes = c1.get(f'/api/v1/books/changes?since={since}', headers=auth_headers).get_json()['data']
+        assert [tombstone['_id'] for tombstone in changes['deleted']] == [book_id]
@@ -0,0 +1,70 @@
+import datetime
+import importlib.util
+import os
+import time
+from unittest import mock
+
+import jwt
+import mongomock
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_FILES = {'book-v1.py': 'book_v1', 'book-v2.py': 'book_v2'}
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture(scope='module', params=sorted(APP_FILES))
+def cache_class(request):
+    """TokenCache of each app (not importable by name), loaded against an in-memory MongoDB"""
+    with mock.patch.dict(os.environ, {'SECRET_KEY': 'test_secret'}), \
+            mock.patch('pymongo.MongoClient', mongomock.MongoClient):
+        spec = importlib.util.spec_from_file_location(APP_FILES[request.param], os.path.join(HERE, request.param))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.TokenCache
+
+
+def make_token(user='admin', exp=None):
+    exp = exp or datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    return jwt.encode({'user': user, 'exp': exp}, 'test_secret', algorithm="HS256")
+
+
+# ==================== TOKEN CACHE ====================
+class TestTokenCache:
+    """Claims cache of verified tokens (one copy per app)"""
+
+    def test_entry_expires_with_token(self, cache_class):
+        """An entry is not served past the token's exp"""
+        now = [time.time()]
+        cache = cache_class(10, clock=lambda: now[0])
+        exp = int(now[0]) + 60
+        token = make_token(exp=exp)
+        cache.decode(token, 'test_secret')
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        now[0] = exp + 1
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_cached_token_is_not_valid_for_other_secret(self, cache_class):
+        """The secret is part of the key: a changed SECRET_KEY verifies again"""
+        cache = cache_class(10)
+        token = make_token()
+        cache.decode(token, 'test_secret')
+        with pytest.raises(jwt.InvalidSignatureError):
+            cache.decode(token, 'other_secret')
+
+    def test_failed_verification_is_not_cached(self, cache_class):
+        """Failed verifications are never cached"""
+        cache = cache_class(10)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            cache.decode(make_token(exp=datetime.datetime.utcnow() - datetime.timedelta(minutes=1)), 'test_secret')
+        assert cache.stats()['entries'] == 0
+
+    def test_cache_is_bounded(self, cache_class):
+        """The LRU drops the oldest entry beyond max_entries"""
+        cache = cache_class(2)
+        for user in ('a', 'b', 'c'):
+            cache.decode(make_token(user), 'test_secret')
+        assert cache.stats()['entries'] == 2
@@ -2,6 +2,9 @@ from flask import Flask, request, jsonify, make_response
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 import json
 import jwt
 import datetime
@@ -54,6 +57,53 @@ def error_response(message, status_code=400):
     return response
 
 # ------------------ AUTH ------------------
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """LRU có giới hạn chứa claims của token đã verify, key là sha256(secret, token).
+    Entry sống đến đúng exp của token nên token lặp lại bỏ qua bước verify chữ ký và
+    parse base64/JSON; token verify lỗi không bao giờ được cache."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # cho phép test thay đồng hồ mà không patch cả module time
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # token không có exp thì không cache
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 # Decorator xác thực JWT
 def token_required(f):
@@ -67,7 +117,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -191,6 +241,12 @@ def delete_book(current_user, book_id):
     db.session.commit()
     return success_response(None, "Book deleted")
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check kèm số liệu token cache (số entry, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger UI ------------------
 
 # Đường dẫn file swagger.yaml trong thư mục static
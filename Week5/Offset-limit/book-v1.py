@@ -1,8 +1,14 @@
 from flask import Flask, request, jsonify, make_response
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import load_only
 from flask_cors import CORS
 import hashlib
-import json
+import os
+import sqlite3
+import secrets
+import threading
+import time
+from collections import OrderedDict
 import jwt
 import datetime
 from functools import wraps
@@ -69,10 +75,40 @@ class BookBorrowed(db.Model):
         }
 # ------------------ Helper functions ------------------
 
-def generate_etag(data_dict):
-    """Tạo ETag dựa trên hash MD5 của dữ liệu JSON."""
-    data_str = json.dumps(data_dict, sort_keys=True)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+# Bộ đếm revision cho từng collection và từng document, tăng ở mọi thao tác ghi
+# (create/update/delete/borrow/return). ETag = revision + query key nên tính được
+# ngay (O(1)), không cần lấy và serialize cả danh sách rồi mới hash.
+ETAG_EPOCH = secrets.token_hex(4)  # đổi mỗi lần khởi động để ETag cũ không khớp nhầm
+_revision_lock = threading.Lock()
+_collection_revisions = {}
+_document_revisions = {}
+
+def _bump_local(collection, doc_id=None):
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        if doc_id is not None:
+            key = (collection, doc_id)
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def bump_revision(collection, doc_id=None):
+    """Tăng revision của collection (và của document nếu có) sau khi commit, rồi báo
+    cho các worker khác qua signal log (nếu bật)."""
+    _bump_local(collection, doc_id)
+    if signal_log:
+        signal_log.publish(collection, doc_id)
+
+def query_key():
+    """Chuẩn hoá query string (sắp xếp tham số) để dùng làm một phần của ETag."""
+    return "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+def generate_etag(collection, doc_id=None, key=""):
+    """Tạo ETag từ revision counter thay vì hash MD5 toàn bộ dữ liệu JSON."""
+    if doc_id is None:
+        revision = _collection_revisions.get(collection, 0)
+    else:
+        revision = _document_revisions.get((collection, doc_id), 0)
+    raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
 
 def success_response(data=None, message=None, status_code=200, etag=None):
     response = make_response(jsonify({
@@ -90,7 +126,144 @@ def error_response(message, status_code=400):
     response.headers["Content-Type"] = "application/json"
     return response
 
+# ------------------ Tín hiệu ghi giữa các worker ------------------
+# Revision counter (ETag) là state riêng của từng process. Khi chạy nhiều
+# worker (gunicorn -w N), đặt CACHE_SIGNAL_PATH (vd. /dev/shm/library-signals.sqlite3):
+# mỗi lần ghi thêm một dòng vào log SQLite dùng chung, và trước mỗi request worker phát
+# lại các dòng mới (tăng revision). Để trống = tắt (một process).
+CACHE_SIGNAL_PATH = os.getenv('CACHE_SIGNAL_PATH', '')
+CACHE_SIGNAL_RETENTION = 300  # giây; worker tụt lại quá mức này thì đổi ETAG_EPOCH
+# Mỗi worker đọc log tối đa một lần mỗi CACHE_SIGNAL_POLL_MS, các request còn lại chỉ so
+# một mốc thời gian; đổi lại, ghi ở worker khác có thể trễ tối đa chừng đó mới thấy.
+CACHE_SIGNAL_POLL_MS = int(os.getenv('CACHE_SIGNAL_POLL_MS', 100))
+
+class SignalLog:
+    """Log các thao tác ghi (collection, id) dùng chung giữa các worker trên cùng host."""
+
+    def __init__(self, path, retention, poll_interval=0.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval  # giây giữa hai lần đọc log
+        self._next_poll = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._published = set()  # seq do chính process này ghi, không phát lại
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id INTEGER, created_at REAL NOT NULL)")
+        # process mới khởi động chưa có state gì để làm mới, bỏ qua các dòng cũ
+        self.last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    def _conn(self):
+        # Mỗi thread một connection, mở lại sau fork (server pre-fork import app trước)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def publish(self, collection, doc_id):
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                           (collection, doc_id, now)).lastrowid
+        with self._lock:
+            self._published.add(seq)
+        conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?", (now - self.retention, seq))
+
+    def sync(self, apply, reset):
+        """Phát lại các tín hiệu mới: apply(collection, doc_id) cho từng dòng, hoặc reset()
+        một lần nếu có dòng đã bị dọn trước khi process này kịp đọc. Bỏ qua nếu chưa hết
+        poll_interval kể từ lần đọc trước."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, collection, doc_id FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, collection, doc_id in rows:
+                    if seq not in self._published:
+                        apply(collection, doc_id)
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.last_seq = rows[-1][0]
+
+signal_log = SignalLog(CACHE_SIGNAL_PATH, CACHE_SIGNAL_RETENTION, CACHE_SIGNAL_POLL_MS / 1000) if CACHE_SIGNAL_PATH else None
+
+def apply_remote_write(collection, doc_id):
+    """Thao tác ghi của worker khác: tăng revision ở process này (không publish lại)."""
+    _bump_local(collection, doc_id)
+
+def reset_revisions():
+    """Đã lỡ một số tín hiệu: đổi ETAG_EPOCH để không ETag nào phát ra trước đó còn khớp."""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+
+@app.before_request
+def sync_signals():
+    """Áp dụng các thao tác ghi của worker khác trước khi phục vụ request."""
+    if signal_log:
+        signal_log.sync(apply_remote_write, reset_revisions)
+
 # ------------------ AUTH ------------------
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """LRU có giới hạn chứa claims của token đã verify, key là sha256(secret, token).
+    Entry sống đến đúng exp của token nên token lặp lại bỏ qua bước verify chữ ký và
+    parse base64/JSON; token verify lỗi không bao giờ được cache."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # cho phép test thay đồng hồ mà không patch cả module time
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # token không có exp thì không cache
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
 
 # Decorator xác thực JWT
 def token_required(f):
@@ -104,7 +277,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -128,9 +301,33 @@ def login():
 
 # ------------------ Book API ------------------
 
+BOOK_FIELDS = ("id", "title", "author", "available")
+
+def requested_fields():
+    """Sparse fieldset từ ?fields=title,author (None = lấy đủ cột); id luôn được trả về."""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip() and f.strip() != 'id'))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def book_fields(book, fields):
+    """Chỉ đọc các cột đã chọn, không chạm vào cột bị load_only bỏ qua (tránh lazy load)."""
+    if fields is None:
+        return book.to_dict()
+    return {"id": book.id, **{f: getattr(book, f) for f in fields}}
+
 @app.route('/api/v1/books', methods=['GET'])
 @token_required
 def get_books(current_user):
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
     available = request.args.get('available')
     title = request.args.get('title')
     author = request.args.get('author')
@@ -138,6 +335,9 @@ def get_books(current_user):
     offset = int(request.args.get('offset', 0))
 
     query = Book.query
+    if fields is not None:
+        # Projection đẩy xuống DB: chỉ SELECT các cột được yêu cầu
+        query = query.options(load_only(Book.id, *[getattr(Book, f) for f in fields]))
 
     if available is not None:
         query = query.filter_by(available=(available.lower() == 'true'))
@@ -149,8 +349,8 @@ def get_books(current_user):
     total = query.count()
     books = query.offset(offset).limit(limit).all()
 
-    book_list = [b.to_dict() for b in books]
-    etag = generate_etag(book_list)
+    book_list = [book_fields(b, fields) for b in books]
+    etag = generate_etag("books", key=query_key())
 
     pagination_info = {
         "total": total,
@@ -171,7 +371,7 @@ def get_book(current_user, book_id):
         return error_response("Book not found", 404)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -187,8 +387,9 @@ def create_book(current_user):
     new_book = Book(title=data['title'], author=data['author'])
     db.session.add(new_book)
     db.session.commit()
+    bump_revision("books", new_book.id)
     book_data = new_book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", new_book.id)
     return success_response(book_data, "Book created", 201, etag)
 
 @app.route('/api/v1/books/<int:book_id>', methods=['PUT'])
@@ -230,9 +431,10 @@ def update_book(current_user, book_id):
             action = "Book returned"
 
     db.session.commit()
+    bump_revision("books", book_id)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     return success_response(book_data, action, etag=etag)
 
 
@@ -244,6 +446,7 @@ def delete_book(current_user, book_id):
         return error_response("Book not found", 404)
     db.session.delete(book)
     db.session.commit()
+    bump_revision("books", book_id)
     return success_response(None, "Book deleted")
 
 # ------------------ Member API ------------------
@@ -280,7 +483,7 @@ def get_member(current_user, member_id):
         return error_response("Member not found", 404)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -302,9 +505,10 @@ def create_member(current_user):
     new_member = Member(name=data['name'], email=data['email'])
     db.session.add(new_member)
     db.session.commit()
+    bump_revision("members", new_member.id)
 
     member_data = new_member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", new_member.id)
     return success_response(member_data, "Member created successfully", 201, etag)
 
 
@@ -329,9 +533,10 @@ def update_member(current_user, member_id):
         member.email = data["email"]
 
     db.session.commit()
+    bump_revision("members", member_id)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     return success_response(member_data, "Member updated successfully", etag=etag)
 
 
@@ -344,6 +549,7 @@ def delete_member(current_user, member_id):
 
     db.session.delete(member)
     db.session.commit()
+    bump_revision("members", member_id)
     return success_response(None, "Member deleted successfully")
 
 
@@ -398,6 +604,7 @@ def create_book_borrowed(current_user):
 
     db.session.add(new_borrow)
     db.session.commit()
+    bump_revision("books", book.id)
     return success_response(new_borrow.to_dict(), "Book borrowed successfully", 201)
 
 
@@ -414,6 +621,7 @@ def return_book(current_user, borrow_id):
     record.return_date = datetime.datetime.utcnow()
     record.book.available = True
     db.session.commit()
+    bump_revision("books", record.book_id)
 
     return success_response(record.to_dict(), "Book returned successfully")
 
@@ -431,6 +639,12 @@ def delete_borrow_record(current_user, borrow_id):
 
 
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check kèm số liệu token cache (số entry, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger UI ------------------
 
 # Đường dẫn file swagger.yaml trong thư mục static
@@ -0,0 +1,69 @@
+import datetime
+import importlib.util
+import os
+import time
+from unittest import mock
+
+import jwt
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_FILES = {'Cursor-Based/book-v3.py': 'cursor_book_v3', 'Offset-limit/book-v1.py': 'offset_book_v1',
+             'Page-Based/book-v2.py': 'page_book_v2'}
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture(scope='module', params=sorted(APP_FILES))
+def cache_class(request):
+    """TokenCache của từng app (tên file không import được, nạp qua importlib)"""
+    with mock.patch.dict(os.environ, {'SECRET_KEY': 'test_secret'}):
+        spec = importlib.util.spec_from_file_location(APP_FILES[request.param], os.path.join(HERE, request.param))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    return module.TokenCache
+
+
+def make_token(user='admin', exp=None):
+    exp = exp or datetime.datetime.utcnow() + datetime.timedelta(minutes=5)
+    return jwt.encode({'user': user, 'exp': exp}, 'test_secret', algorithm="HS256")
+
+
+# ==================== TOKEN CACHE ====================
+class TestTokenCache:
+    """Test cache claims của token đã verify (mỗi app một bản copy)"""
+
+    def test_entry_expires_with_token(self, cache_class):
+        """Test entry không được dùng sau exp của token"""
+        now = [time.time()]
+        cache = cache_class(10, clock=lambda: now[0])
+        exp = int(now[0]) + 60
+        token = make_token(exp=exp)
+        cache.decode(token, 'test_secret')
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        now[0] = exp + 1
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_cached_token_is_not_valid_for_other_secret(self, cache_class):
+        """Test key của cache gồm cả secret: đổi SECRET_KEY thì phải verify lại"""
+        cache = cache_class(10)
+        token = make_token()
+        cache.decode(token, 'test_secret')
+        with pytest.raises(jwt.InvalidSignatureError):
+            cache.decode(token, 'other_secret')
+
+    def test_failed_verification_is_not_cached(self, cache_class):
+        """Test token verify lỗi không được cache"""
+        cache = cache_class(10)
+        with pytest.raises(jwt.ExpiredSignatureError):
+            cache.decode(make_token(exp=datetime.datetime.utcnow() - datetime.timedelta(minutes=1)), 'test_secret')
+        assert cache.stats()['entries'] == 0
+
+    def test_cache_is_bounded(self, cache_class):
+        """Test LRU bỏ entry cũ nhất khi vượt max_entries"""
+        cache = cache_class(2)
+        for user in ('a', 'b', 'c'):
+            cache.decode(make_token(user), 'test_secret')
+        assert cache.stats()['entries'] == 2
@@ -1,14 +1,30 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory
+from flask import Flask, request, jsonify, make_response, send_from_directory, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
 from flask_cors import CORS
 import hashlib
-import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
 import jwt
 import datetime
 from functools import wraps
 from flask_swagger_ui import get_swaggerui_blueprint
+try:
+    import msgpack
+except ImportError:  # tùy chọn: không có thì chỉ phục vụ JSON
+    msgpack = None
+try:
+    import library_pb2  # sinh từ library.proto: protoc --python_out=. library.proto
+    from google.protobuf import json_format
+except ImportError:
+    library_pb2 = None
 from dotenv import load_dotenv
 import os 
+import sqlite3
 load_dotenv()
 
 app = Flask(__name__)
@@ -74,17 +90,231 @@ class BookBorrowed(db.Model):
         }
 # ------------------ Helper functions ------------------
 
-def generate_etag(data_dict):
-    """Tạo ETag dựa trên hash MD5 của dữ liệu JSON."""
-    data_str = json.dumps(data_dict, sort_keys=True)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+# Bộ đếm revision cho từng collection và từng document, tăng ở mọi thao tác ghi
+# (create/update/delete/borrow/return). ETag = revision + query key nên tính được
+# ngay (O(1)), không cần lấy và serialize cả danh sách rồi mới hash.
+ETAG_EPOCH = secrets.token_hex(4)  # đổi mỗi lần khởi động để ETag cũ không khớp nhầm
+_revision_lock = threading.Lock()
+_collection_revisions = {}
+_document_revisions = {}
+
+def _bump_local(collection, doc_id=None):
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        if doc_id is not None:
+            key = (collection, doc_id)
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def bump_revision(collection, doc_id=None):
+    """Tăng revision của collection (và của document nếu có) sau khi commit, rồi báo
+    cho các worker khác qua signal log (nếu bật). Trong batch atomic thì hoãn tới khi
+    transaction ngoài commit, để không worker nào đổi ETag trước khi dữ liệu hiện ra."""
+    deferred = g.get('deferred_revisions') if has_app_context() else None
+    if deferred is not None:
+        deferred.append((collection, doc_id))
+        return
+    _bump_local(collection, doc_id)
+    if signal_log:
+        signal_log.publish(collection, doc_id)
+
+def query_key():
+    """Chuẩn hoá query string (sắp xếp tham số) để dùng làm một phần của ETag."""
+    return "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+def generate_etag(collection, doc_id=None, key=""):
+    """Tạo ETag từ revision counter thay vì hash MD5 toàn bộ dữ liệu JSON."""
+    if doc_id is None:
+        revision = _collection_revisions.get(collection, 0)
+    else:
+        revision = _document_revisions.get((collection, doc_id), 0)
+    raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+    return representation_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+# Negative cache: ID sách vừa được xác nhận là không tồn tại được nhớ trong thời gian
+# ngắn, để các request lặp lại (scraper, link cũ) trả 404 mà không tốn một lần truy
+# vấn DB. Entry bị xoá ngay khi ID đó được tạo.
+NEGATIVE_CACHE_TTL = 30  # giây
+NEGATIVE_CACHE_SIZE = 10000
+_missing_books = OrderedDict()  # book_id -> thời điểm hết hạn (time.monotonic)
+
+def is_known_missing(book_id):
+    """True nếu book_id nằm trong negative cache và chưa hết hạn."""
+    with _revision_lock:
+        expires_at = _missing_books.get(book_id)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del _missing_books[book_id]
+            return False
+        return True
+
+def remember_missing(book_id, revision):
+    """Ghi nhớ ID không tồn tại, trừ khi đã có thao tác ghi sách kể từ lúc truy vấn
+    (revision thay đổi) - khi đó kết quả "không tìm thấy" có thể đã cũ."""
+    with _revision_lock:
+        if _collection_revisions.get("books", 0) != revision:
+            return
+        _missing_books[book_id] = time.monotonic() + NEGATIVE_CACHE_TTL
+        _missing_books.move_to_end(book_id)
+        while len(_missing_books) > NEGATIVE_CACHE_SIZE:
+            _missing_books.popitem(last=False)
+
+def forget_missing(book_id):
+    with _revision_lock:
+        _missing_books.pop(book_id, None)
+
+# ------------------ Tín hiệu ghi giữa các worker ------------------
+# Revision counter (ETag) và negative cache là state riêng của từng process. Khi chạy nhiều
+# worker (gunicorn -w N), đặt CACHE_SIGNAL_PATH (vd. /dev/shm/library-signals.sqlite3):
+# mỗi lần ghi thêm một dòng vào log SQLite dùng chung, và trước mỗi request worker phát
+# lại các dòng mới (tăng revision, bỏ ID khỏi negative cache). Để trống = tắt (một process).
+CACHE_SIGNAL_PATH = os.getenv('CACHE_SIGNAL_PATH', '')
+CACHE_SIGNAL_RETENTION = 300  # giây; worker tụt lại quá mức này thì đổi ETAG_EPOCH
+# Mỗi worker đọc log tối đa một lần mỗi CACHE_SIGNAL_POLL_MS, các request còn lại chỉ so
+# một mốc thời gian; đổi lại, ghi ở worker khác có thể trễ tối đa chừng đó mới thấy.
+CACHE_SIGNAL_POLL_MS = int(os.getenv('CACHE_SIGNAL_POLL_MS', 100))
+
+class SignalLog:
+    """Log các thao tác ghi (collection, id) dùng chung giữa các worker trên cùng host."""
+
+    def __init__(self, path, retention, poll_interval=0.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval  # giây giữa hai lần đọc log
+        self._next_poll = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._published = set()  # seq do chính process này ghi, không phát lại
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id INTEGER, created_at REAL NOT NULL)")
+        # process mới khởi động chưa có state gì để làm mới, bỏ qua các dòng cũ
+        self.last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    def _conn(self):
+        # Mỗi thread một connection, mở lại sau fork (server pre-fork import app trước)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def publish(self, collection, doc_id):
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                           (collection, doc_id, now)).lastrowid
+        with self._lock:
+            self._published.add(seq)
+        conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?", (now - self.retention, seq))
+
+    def sync(self, apply, reset):
+        """Phát lại các tín hiệu mới: apply(collection, doc_id) cho từng dòng, hoặc reset()
+        một lần nếu có dòng đã bị dọn trước khi process này kịp đọc. Bỏ qua nếu chưa hết
+        poll_interval kể từ lần đọc trước."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, collection, doc_id FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, collection, doc_id in rows:
+                    if seq not in self._published:
+                        apply(collection, doc_id)
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.last_seq = rows[-1][0]
+
+signal_log = SignalLog(CACHE_SIGNAL_PATH, CACHE_SIGNAL_RETENTION, CACHE_SIGNAL_POLL_MS / 1000) if CACHE_SIGNAL_PATH else None
+
+def apply_remote_write(collection, doc_id):
+    """Thao tác ghi của worker khác: tăng revision ở process này (không publish lại)."""
+    _bump_local(collection, doc_id)
+    if collection == "books" and doc_id is not None:
+        forget_missing(doc_id)
+
+def reset_revisions():
+    """Đã lỡ một số tín hiệu: đổi ETAG_EPOCH để không ETag nào phát ra trước đó còn khớp."""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+        _missing_books.clear()
+
+@app.before_request
+def sync_signals():
+    """Áp dụng các thao tác ghi của worker khác trước khi phục vụ request."""
+    if signal_log:
+        signal_log.sync(apply_remote_write, reset_revisions)
+
+# ------------------ Content negotiation ------------------
+# Cùng handler, chỉ khác bước encode cuối cùng theo header Accept: JSON là mặc định,
+# MessagePack/protobuf chỉ được chọn khi thư viện tương ứng có sẵn. Bytes mỗi biểu diễn
+# khác nhau nên ETag mang thêm hậu tố representation (xem representation_etag).
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+PROTOBUF_MIMETYPE = 'application/x-protobuf'
+
+def negotiate_mimetype():
+    offers = ['application/json']
+    if msgpack is not None:
+        offers.extend(MSGPACK_MIMETYPES)
+    if library_pb2 is not None:
+        offers.append(PROTOBUF_MIMETYPE)
+    return request.accept_mimetypes.best_match(offers, default='application/json')
+
+def representation_etag(etag):
+    """Gắn representation đã negotiate vào ETag (vd. "<hash>-msgpack"), để 304 không
+    bao giờ xác nhận một biểu diễn mà client chưa từng nhận."""
+    return f"{etag}-{negotiate_mimetype().split('/', 1)[1]}"
+
+def to_protobuf(payload):
+    """Map envelope sang library.Envelope theo hình dạng của data (sách, member hoặc
+    danh sách); các payload khác đi vào trường `other` (google.protobuf.Value)."""
+    envelope = library_pb2.Envelope(status=payload["status"], message=payload["message"] or "")
+    data = payload["data"]
+    if isinstance(data, dict) and "books" in data:
+        target = envelope.books
+    elif isinstance(data, dict) and "members" in data:
+        target = envelope.members
+    elif isinstance(data, dict) and "title" in data:
+        target = envelope.book
+    elif isinstance(data, dict) and "email" in data:
+        target = envelope.member
+    else:
+        json_format.ParseDict(data, envelope.other)
+        return envelope.SerializeToString()
+    target.SetInParent()
+    json_format.ParseDict(data, target, ignore_unknown_fields=True)
+    return envelope.SerializeToString()
+
+def negotiated_response(payload, status_code=200):
+    mimetype = negotiate_mimetype()
+    if mimetype in MSGPACK_MIMETYPES:
+        response = make_response(msgpack.packb(payload), status_code)
+        response.mimetype = mimetype
+    elif mimetype == PROTOBUF_MIMETYPE:
+        response = make_response(to_protobuf(payload), status_code)
+        response.mimetype = mimetype
+    else:
+        response = make_response(jsonify(payload), status_code)
+    response.vary.add('Accept')
+    return response
 
 def success_response(data=None, message=None, status_code=200, etag=None):
-    response = make_response(jsonify({
+    response = negotiated_response({
         "status": "success",
         "data": data,
         "message": message
-    }), status_code)
+    }, status_code)
     if etag:
         response.headers["ETag"] = etag
         response.headers["Cache-Control"] = "private, max-age=120"
@@ -96,16 +326,70 @@ def error_response(message, status_code=400):
     return response
 
 # ------------------ AUTH ------------------
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """LRU có giới hạn chứa claims của token đã verify, key là sha256(secret, token).
+    Entry sống đến đúng exp của token nên token lặp lại bỏ qua bước verify chữ ký và
+    parse base64/JSON; token verify lỗi không bao giờ được cache."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # cho phép test thay đồng hồ mà không patch cả module time
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # token không có exp thì không cache
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
+# Sub-request của /api/v1/batch mang sẵn user đã xác thực trong environ (client không
+# thể tự đặt key này, header chỉ xuất hiện dưới dạng HTTP_*)
+BATCH_USER_KEY = 'library.batch_user'
 
 # Decorator xác thực JWT
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        current_user = request.environ.get(BATCH_USER_KEY)
+        if current_user is not None:  # sub-request của /batch, token đã được xác thực
+            return f(current_user, *args, **kwargs)
         token = request.cookies.get('access_token')  # Lấy token từ cookie
         if not token:
             return error_response("Token missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -144,9 +428,64 @@ def login():
 
 # ------------------ Book API ------------------
 
+BOOK_FIELDS = ("id", "title", "author", "available")
+
+def requested_fields():
+    """Sparse fieldset từ ?fields=title,author (None = lấy đủ cột); id luôn được trả về."""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip() and f.strip() != 'id'))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def book_fields(book, fields):
+    """Chỉ đọc các cột đã chọn, không chạm vào cột bị load_only bỏ qua (tránh lazy load)."""
+    if fields is None:
+        return book.to_dict()
+    return {"id": book.id, **{f: getattr(book, f) for f in fields}}
+
+MULTI_GET_MAX_IDS = 100
+
+def multi_get_books(raw_ids):
+    """Lấy nhiều sách bằng một truy vấn IN thay vì gọi GET /books/<id> cho từng ID.
+    Kết quả giữ đúng thứ tự yêu cầu, ID không tồn tại nằm trong "missing". ETag gộp
+    revision của từng sách được yêu cầu nên 304 được trả trước khi truy vấn DB."""
+    try:
+        book_ids = list(dict.fromkeys(int(i) for i in raw_ids if str(i).strip()))
+    except (TypeError, ValueError):
+        return error_response("Invalid book ID", 400)
+    if not book_ids:
+        return error_response("No book ids given", 400)
+    if len(book_ids) > MULTI_GET_MAX_IDS:
+        return error_response(f"At most {MULTI_GET_MAX_IDS} ids per request", 400)
+
+    revisions = ",".join(f"{i}:{_document_revisions.get(('books', i), 0)}" for i in book_ids)
+    etag = representation_etag(hashlib.md5(f"{ETAG_EPOCH}:books:ids:{revisions}".encode('utf-8')).hexdigest())
+    client_etag = request.headers.get('If-None-Match')
+    if client_etag == etag:
+        return '', 304
+
+    found = {b.id: b for b in Book.query.filter(Book.id.in_(book_ids)).all()}
+    data = {
+        "books": [found[i].to_dict() for i in book_ids if i in found],
+        "missing": [i for i in book_ids if i not in found]
+    }
+    return success_response(data, "Books fetched successfully", etag=etag)
+
 @app.route('/api/v1/books', methods=['GET'])
 @token_required
 def get_books(current_user):
+    ids = request.args.get('ids')
+    if ids is not None:
+        return multi_get_books(ids.split(','))
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
     available = request.args.get('available')
     title = request.args.get('title')
     author = request.args.get('author')
@@ -154,6 +493,9 @@ def get_books(current_user):
     cursor = request.args.get('cursor', type=int)
 
     query = Book.query
+    if fields is not None:
+        # Projection đẩy xuống DB: chỉ SELECT các cột được yêu cầu
+        query = query.options(load_only(Book.id, *[getattr(Book, f) for f in fields]))
 
     if available is not None:
         query = query.filter_by(available=(available.lower() == 'true'))
@@ -170,26 +512,39 @@ def get_books(current_user):
     books_to_return = books[:limit]
 
     next_cursor = books_to_return[-1].id if has_next else None
-    book_list = [b.to_dict() for b in books_to_return]
+    book_list = [book_fields(b, fields) for b in books_to_return]
 
     pagination = {
         "limit": limit,
         "next_cursor": next_cursor
     }
 
-    etag = generate_etag(book_list)
+    etag = generate_etag("books", key=query_key())
     return success_response({"books": book_list, "pagination": pagination}, "Books fetched successfully", etag=etag)
 
 
+@app.route('/api/v1/books/lookup', methods=['POST'])
+@token_required
+def lookup_books(current_user):
+    """Multi-get cho danh sách ID quá dài để đặt trên query string: {"ids": [...]}"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('ids'), list):
+        return error_response("Missing ids list", 400)
+    return multi_get_books(data['ids'])
+
 @app.route('/api/v1/books/<int:book_id>', methods=['GET'])
 @token_required
 def get_book(current_user, book_id):
+    if is_known_missing(book_id):
+        return error_response("Book not found", 404)
+    revision = _collection_revisions.get("books", 0)
     book = db.session.get(Book, book_id)
     if not book:
+        remember_missing(book_id, revision)
         return error_response("Book not found", 404)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -205,8 +560,10 @@ def create_book(current_user):
     new_book = Book(title=data['title'], author=data['author'])
     db.session.add(new_book)
     db.session.commit()
+    bump_revision("books", new_book.id)
+    forget_missing(new_book.id)
     book_data = new_book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", new_book.id)
     return success_response(book_data, "Book created", 201, etag)
 
 @app.route('/api/v1/books/<int:book_id>', methods=['PUT'])
@@ -248,9 +605,10 @@ def update_book(current_user, book_id):
             action = "Book returned"
 
     db.session.commit()
+    bump_revision("books", book_id)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     return success_response(book_data, action, etag=etag)
 
 
@@ -262,6 +620,7 @@ def delete_book(current_user, book_id):
         return error_response("Book not found", 404)
     db.session.delete(book)
     db.session.commit()
+    bump_revision("books", book_id)
     return success_response(None, "Book deleted")
 
 # ------------------ Member API ------------------
@@ -303,7 +662,7 @@ def get_member(current_user, member_id):
         return error_response("Member not found", 404)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -325,9 +684,10 @@ def create_member(current_user):
     new_member = Member(name=data['name'], email=data['email'])
     db.session.add(new_member)
     db.session.commit()
+    bump_revision("members", new_member.id)
 
     member_data = new_member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", new_member.id)
     return success_response(member_data, "Member created successfully", 201, etag)
 
 
@@ -352,12 +712,63 @@ def update_member(current_user, member_id):
         member.email = data["email"]
 
     db.session.commit()
+    bump_revision("members", member_id)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     return success_response(member_data, "Member updated successfully", etag=etag)
 
 
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+
+def prefers_minimal():
+    return 'return=minimal' in request.headers.get('Prefer', '')
+
+@app.route('/api/v1/members/<int:member_id>', methods=['PATCH'])
+@token_required
+def patch_member(current_user, member_id):
+    """JSON Merge Patch: dịch thẳng thành một câu UPDATE, không đọc member trước khi ghi.
+    Email trùng do unique constraint phát hiện; DB hỗ trợ RETURNING thì không cần đọc lại."""
+    if request.mimetype != MERGE_PATCH_MIMETYPE:
+        return error_response(f"Content-Type must be {MERGE_PATCH_MIMETYPE}", 415)
+    patch = request.get_json(silent=True)
+    if not isinstance(patch, dict) or not patch:
+        return error_response("Merge patch must be a non-empty JSON object", 400)
+    unknown = [k for k in patch if k not in ("name", "email")]
+    if unknown:
+        return error_response(f"Unknown or read-only field(s): {', '.join(unknown)}", 400)
+    # name/email là NOT NULL nên null (xoá trường theo RFC 7396) không hợp lệ
+    if not all(isinstance(v, str) and v.strip() for v in patch.values()):
+        return error_response("name and email must be non-empty strings", 400)
+
+    stmt = update(Member).where(Member.id == member_id).values(**patch)
+    member_data = None
+    try:
+        if db.engine.dialect.update_returning:
+            member = db.session.scalars(stmt.returning(Member)).first()
+            found = member is not None
+            if found:
+                member_data = member.to_dict()  # trước commit, tránh refresh sau expire
+        else:
+            found = db.session.execute(stmt).rowcount > 0
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return error_response("Email already exists", 400)
+    if not found:
+        return error_response("Member not found", 404)
+    bump_revision("members", member_id)
+
+    etag = generate_etag("members", member_id)
+    if prefers_minimal():
+        response = make_response('', 204)
+        response.headers["ETag"] = etag
+        response.headers["Preference-Applied"] = "return=minimal"
+        return response
+    if member_data is None:  # MySQL không có UPDATE ... RETURNING: đọc lại một lần
+        member_data = db.session.get(Member, member_id).to_dict()
+    return success_response(member_data, "Member updated successfully", etag=etag)
+
 @app.route('/api/v1/members/<int:member_id>', methods=['DELETE'])
 @token_required
 def delete_member(current_user, member_id):
@@ -367,6 +778,7 @@ def delete_member(current_user, member_id):
 
     db.session.delete(member)
     db.session.commit()
+    bump_revision("members", member_id)
     return success_response(None, "Member deleted successfully")
 
 
@@ -424,6 +836,7 @@ def create_book_borrowed(current_user):
 
     db.session.add(new_borrow)
     db.session.commit()
+    bump_revision("books", book.id)
     return success_response(new_borrow.to_dict(), "Book borrowed successfully", 201)
 
 
@@ -440,6 +853,7 @@ def return_book(current_user, borrow_id):
     record.return_date = datetime.datetime.utcnow()
     record.book.available = True
     db.session.commit()
+    bump_revision("books", record.book_id)
 
     return success_response(record.to_dict(), "Book returned successfully")
 
@@ -457,6 +871,108 @@ def delete_borrow_record(current_user, borrow_id):
 
 
 
+# ------------------ Batch API ------------------
+# Gom nhiều thao tác vào một round-trip: mỗi sub-request được dispatch nội bộ qua URL
+# map của app (không đi qua mạng), token chỉ được xác thực một lần cho cả batch.
+# Với "atomic": true, các commit bên trong handler chỉ là SAVEPOINT của một transaction
+# chung; sub-request đầu tiên bị lỗi sẽ rollback toàn bộ và các request sau không chạy.
+BATCH_MAX_REQUESTS = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Header của request cha không được chuyển sang sub-request (body, điều kiện, negotiation)
+BATCH_SKIP_HEADERS = {'host', 'content-type', 'content-length', 'accept', 'accept-encoding', 'prefer',
+                      'if-match', 'if-none-match', 'if-modified-since', 'if-unmodified-since'}
+
+def dispatch_subrequest(current_user, item):
+    """Chạy một sub-request {method, path, body, headers} và trả về (status, headers, body)."""
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if method not in BATCH_METHODS or not isinstance(path, str) or not path.startswith('/api/'):
+        return 400, {}, {"status": "error", "data": None, "message": "Invalid method or path"}
+    if path.split('?', 1)[0].rstrip('/') == '/api/v1/batch':
+        return 400, {}, {"status": "error", "data": None, "message": "Nested batch is not allowed"}
+
+    # Giữ Host/X-Forwarded-*/... của request cha để url_for trong sub-request trỏ đúng host
+    headers = {name: value for name, value in request.headers
+               if name.lower() not in BATCH_SKIP_HEADERS}
+    headers.update(item.get('headers') or {})
+    headers['Accept'] = 'application/json'
+    with app.test_request_context(path, base_url=request.url_root, method=method,
+                                  json=item.get('body'), headers=headers,
+                                  environ_overrides={BATCH_USER_KEY: current_user}):
+        response = app.full_dispatch_request()
+    body = response.get_json(silent=True)
+    if body is None and response.status_code != 304:
+        body = response.get_data(as_text=True) or None
+    # Trong batch atomic revision chỉ tăng sau khi transaction ngoài commit, nên ETag lúc
+    # này vẫn là của revision cũ: bỏ đi, client GET lại sau batch để lấy ETag mới.
+    names = ('Location',) if g.get('deferred_revisions') is not None else ('ETag', 'Location')
+    sub_headers = {name: response.headers[name] for name in names if name in response.headers}
+    return response.status_code, sub_headers, body
+
+def is_failed(status, body):
+    # Một số handler trả lỗi với HTTP 200, nên xét cả "status": "error" trong envelope
+    return status >= 400 or (isinstance(body, dict) and body.get('status') == 'error')
+
+@app.route('/api/v1/batch', methods=['POST'])
+@token_required
+def batch(current_user):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('requests'), list) or not data['requests']:
+        return error_response("Missing requests list", 400)
+    items = data['requests']
+    if len(items) > BATCH_MAX_REQUESTS:
+        return error_response(f"At most {BATCH_MAX_REQUESTS} requests per batch", 400)
+    if not all(isinstance(item, dict) for item in items):
+        return error_response("Each request must be an object", 400)
+    atomic = bool(data.get('atomic'))
+
+    connection = transaction = None
+    if atomic:
+        # Session gắn vào connection có transaction ngoài: commit() của handler chỉ
+        # release SAVEPOINT, dữ liệu chỉ được ghi thật khi transaction ngoài commit.
+        db.session.remove()
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        db.session.registry.set(Session(bind=connection, join_transaction_mode="create_savepoint"))
+        g.deferred_revisions = []
+
+    results = []
+    failed = False
+    try:
+        for item in items:
+            if failed:
+                results.append({"status": 424, "headers": {}, "body": None})
+                continue
+            try:
+                status, headers, body = dispatch_subrequest(current_user, item)
+            except Exception as e:
+                db.session.rollback()
+                status, headers, body = 500, {}, {"status": "error", "data": None, "message": str(e)}
+            results.append({"status": status, "headers": headers, "body": body})
+            failed = atomic and is_failed(status, body)
+    finally:
+        if atomic:
+            db.session.remove()
+            if failed:
+                transaction.rollback()
+            else:
+                transaction.commit()
+            connection.close()
+            deferred, g.deferred_revisions = g.deferred_revisions, None
+            if not failed:
+                for collection, doc_id in deferred:
+                    bump_revision(collection, doc_id)
+
+    result = {"atomic": atomic, "committed": not failed, "responses": results}
+    message = "Batch rolled back" if failed else "Batch executed"
+    return success_response(result, message)
+
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check kèm số liệu token cache (số entry, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger UI ------------------
 
 # Đường dẫn file swagger.yaml trong thư mục static
@@ -1,16 +1,35 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory
+from flask import Flask, request, jsonify, make_response, send_from_directory, g, has_app_context
+from flask.helpers import get_debug_flag
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
 from flask_cors import CORS
 import hashlib
-import json
+import threading
+import time
+from collections import OrderedDict
 import jwt
 import datetime
 from functools import wraps
 from flask_swagger_ui import get_swaggerui_blueprint
+try:
+    import msgpack
+except ImportError:  # tùy chọn: không có thì chỉ phục vụ JSON
+    msgpack = None
+try:
+    import library_pb2  # sinh từ library.proto: protoc --python_out=. library.proto
+    from google.protobuf import json_format
+except ImportError:
+    library_pb2 = None
 import secrets
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
 
+import sqlite3
 app = Flask(__name__)
 CORS(app)
 
@@ -101,17 +120,231 @@ class RefreshToken(db.Model):
 
 # ------------------ Helper functions ------------------
 
-def generate_etag(data_dict):
-    """Tạo ETag dựa trên hash MD5 của dữ liệu JSON."""
-    data_str = json.dumps(data_dict, sort_keys=True)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+# Bộ đếm revision cho từng collection và từng document, tăng ở mọi thao tác ghi
+# (create/update/delete/borrow/return). ETag = revision + query key nên tính được
+# ngay (O(1)), không cần lấy và serialize cả danh sách rồi mới hash.
+ETAG_EPOCH = secrets.token_hex(4)  # đổi mỗi lần khởi động để ETag cũ không khớp nhầm
+_revision_lock = threading.Lock()
+_collection_revisions = {}
+_document_revisions = {}
+
+def _bump_local(collection, doc_id=None):
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        if doc_id is not None:
+            key = (collection, doc_id)
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def bump_revision(collection, doc_id=None):
+    """Tăng revision của collection (và của document nếu có) sau khi commit, rồi báo
+    cho các worker khác qua signal log (nếu bật). Trong batch atomic thì hoãn tới khi
+    transaction ngoài commit, để không worker nào đổi ETag trước khi dữ liệu hiện ra."""
+    deferred = g.get('deferred_revisions') if has_app_context() else None
+    if deferred is not None:
+        deferred.append((collection, doc_id))
+        return
+    _bump_local(collection, doc_id)
+    if signal_log:
+        signal_log.publish(collection, doc_id)
+
+def query_key():
+    """Chuẩn hoá query string (sắp xếp tham số) để dùng làm một phần của ETag."""
+    return "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+def generate_etag(collection, doc_id=None, key=""):
+    """Tạo ETag từ revision counter thay vì hash MD5 toàn bộ dữ liệu JSON."""
+    if doc_id is None:
+        revision = _collection_revisions.get(collection, 0)
+    else:
+        revision = _document_revisions.get((collection, doc_id), 0)
+    raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+    return representation_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+# Negative cache: ID sách vừa được xác nhận là không tồn tại được nhớ trong thời gian
+# ngắn, để các request lặp lại (scraper, link cũ) trả 404 mà không tốn một lần truy
+# vấn DB. Entry bị xoá ngay khi ID đó được tạo.
+NEGATIVE_CACHE_TTL = 30  # giây
+NEGATIVE_CACHE_SIZE = 10000
+_missing_books = OrderedDict()  # book_id -> thời điểm hết hạn (time.monotonic)
+
+def is_known_missing(book_id):
+    """True nếu book_id nằm trong negative cache và chưa hết hạn."""
+    with _revision_lock:
+        expires_at = _missing_books.get(book_id)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del _missing_books[book_id]
+            return False
+        return True
+
+def remember_missing(book_id, revision):
+    """Ghi nhớ ID không tồn tại, trừ khi đã có thao tác ghi sách kể từ lúc truy vấn
+    (revision thay đổi) - khi đó kết quả "không tìm thấy" có thể đã cũ."""
+    with _revision_lock:
+        if _collection_revisions.get("books", 0) != revision:
+            return
+        _missing_books[book_id] = time.monotonic() + NEGATIVE_CACHE_TTL
+        _missing_books.move_to_end(book_id)
+        while len(_missing_books) > NEGATIVE_CACHE_SIZE:
+            _missing_books.popitem(last=False)
+
+def forget_missing(book_id):
+    with _revision_lock:
+        _missing_books.pop(book_id, None)
+
+# ------------------ Tín hiệu ghi giữa các worker ------------------
+# Revision counter (ETag) và negative cache là state riêng của từng process. Khi chạy nhiều
+# worker (gunicorn -w N), đặt CACHE_SIGNAL_PATH (vd. /dev/shm/library-signals.sqlite3):
+# mỗi lần ghi thêm một dòng vào log SQLite dùng chung, và trước mỗi request worker phát
+# lại các dòng mới (tăng revision, bỏ ID khỏi negative cache). Để trống = tắt (một process).
+CACHE_SIGNAL_PATH = os.getenv('CACHE_SIGNAL_PATH', '')
+CACHE_SIGNAL_RETENTION = 300  # giây; worker tụt lại quá mức này thì đổi ETAG_EPOCH
+# Mỗi worker đọc log tối đa một lần mỗi CACHE_SIGNAL_POLL_MS, các request còn lại chỉ so
+# một mốc thời gian; đổi lại, ghi ở worker khác có thể trễ tối đa chừng đó mới thấy.
+CACHE_SIGNAL_POLL_MS = int(os.getenv('CACHE_SIGNAL_POLL_MS', 100))
+
+class SignalLog:
+    """Log các thao tác ghi (collection, id) dùng chung giữa các worker trên cùng host."""
+
+    def __init__(self, path, retention, poll_interval=0.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval  # giây giữa hai lần đọc log
+        self._next_poll = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._published = set()  # seq do chính process này ghi, không phát lại
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id INTEGER, created_at REAL NOT NULL)")
+        # process mới khởi động chưa có state gì để làm mới, bỏ qua các dòng cũ
+        self.last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    def _conn(self):
+        # Mỗi thread một connection, mở lại sau fork (server pre-fork import app trước)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def publish(self, collection, doc_id):
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                           (collection, doc_id, now)).lastrowid
+        with self._lock:
+            self._published.add(seq)
+        conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?", (now - self.retention, seq))
+
+    def sync(self, apply, reset):
+        """Phát lại các tín hiệu mới: apply(collection, doc_id) cho từng dòng, hoặc reset()
+        một lần nếu có dòng đã bị dọn trước khi process này kịp đọc. Bỏ qua nếu chưa hết
+        poll_interval kể từ lần đọc trước."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, collection, doc_id FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, collection, doc_id in rows:
+                    if seq not in self._published:
+                        apply(collection, doc_id)
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.last_seq = rows[-1][0]
+
+signal_log = SignalLog(CACHE_SIGNAL_PATH, CACHE_SIGNAL_RETENTION, CACHE_SIGNAL_POLL_MS / 1000) if CACHE_SIGNAL_PATH else None
+
+def apply_remote_write(collection, doc_id):
+    """Thao tác ghi của worker khác: tăng revision ở process này (không publish lại)."""
+    _bump_local(collection, doc_id)
+    if collection == "books" and doc_id is not None:
+        forget_missing(doc_id)
+
+def reset_revisions():
+    """Đã lỡ một số tín hiệu: đổi ETAG_EPOCH để không ETag nào phát ra trước đó còn khớp."""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+        _missing_books.clear()
+
+@app.before_request
+def sync_signals():
+    """Áp dụng các thao tác ghi của worker khác trước khi phục vụ request."""
+    if signal_log:
+        signal_log.sync(apply_remote_write, reset_revisions)
+
+# ------------------ Content negotiation ------------------
+# Cùng handler, chỉ khác bước encode cuối cùng theo header Accept: JSON là mặc định,
+# MessagePack/protobuf chỉ được chọn khi thư viện tương ứng có sẵn. Bytes mỗi biểu diễn
+# khác nhau nên ETag mang thêm hậu tố representation (xem representation_etag).
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+PROTOBUF_MIMETYPE = 'application/x-protobuf'
+
+def negotiate_mimetype():
+    offers = ['application/json']
+    if msgpack is not None:
+        offers.extend(MSGPACK_MIMETYPES)
+    if library_pb2 is not None:
+        offers.append(PROTOBUF_MIMETYPE)
+    return request.accept_mimetypes.best_match(offers, default='application/json')
+
+def representation_etag(etag):
+    """Gắn representation đã negotiate vào ETag (vd. "<hash>-msgpack"), để 304 không
+    bao giờ xác nhận một biểu diễn mà client chưa từng nhận."""
+    return f"{etag}-{negotiate_mimetype().split('/', 1)[1]}"
+
+def to_protobuf(payload):
+    """Map envelope sang library.Envelope theo hình dạng của data (sách, member hoặc
+    danh sách); các payload khác đi vào trường `other` (google.protobuf.Value)."""
+    envelope = library_pb2.Envelope(status=payload["status"], message=payload["message"] or "")
+    data = payload["data"]
+    if isinstance(data, dict) and "books" in data:
+        target = envelope.books
+    elif isinstance(data, dict) and "members" in data:
+        target = envelope.members
+    elif isinstance(data, dict) and "title" in data:
+        target = envelope.book
+    elif isinstance(data, dict) and "email" in data:
+        target = envelope.member
+    else:
+        json_format.ParseDict(data, envelope.other)
+        return envelope.SerializeToString()
+    target.SetInParent()
+    json_format.ParseDict(data, target, ignore_unknown_fields=True)
+    return envelope.SerializeToString()
+
+def negotiated_response(payload, status_code=200):
+    mimetype = negotiate_mimetype()
+    if mimetype in MSGPACK_MIMETYPES:
+        response = make_response(msgpack.packb(payload), status_code)
+        response.mimetype = mimetype
+    elif mimetype == PROTOBUF_MIMETYPE:
+        response = make_response(to_protobuf(payload), status_code)
+        response.mimetype = mimetype
+    else:
+        response = make_response(jsonify(payload), status_code)
+    response.vary.add('Accept')
+    return response
 
 def success_response(data=None, message=None, status_code=200, etag=None):
-    response = make_response(jsonify({
+    response = negotiated_response({
         "status": "success",
         "data": data,
         "message": message
-    }), status_code)
+    }, status_code)
     if etag:
         response.headers["ETag"] = etag
         response.headers["Cache-Control"] = "private, max-age=120"
@@ -127,27 +360,240 @@ def error_response(message, status_code=400):
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 1  # bạn chọn 1 day như yêu cầu
 
+# Sub-request của /api/v1/batch mang sẵn user đã xác thực trong environ (client không
+# thể tự đặt key này, header chỉ xuất hiện dưới dạng HTTP_*)
+BATCH_USER_KEY = 'library.batch_user'
+
+# Keyring trong process: public/private key đã parse sẵn, tra theo `kid` trong header
+# của token, nên verify không cần query KeyToken và parse PEM ở mỗi request. Keyring
+# được nạp lại định kỳ (thấy thay đổi từ worker khác) và khi gặp kid lạ (giới hạn tần
+# suất để token rác không biến thành một query DB mỗi request).
+KEYRING_REFRESH_SECONDS = 60
+KEYRING_MISS_RELOAD_SECONDS = 5
+
+def key_id(public_pem: str):
+    """kid = 16 ký tự đầu SHA-256 của public key PEM: đổi khoá thì kid đổi theo."""
+    return hashlib.sha256(public_pem.encode('utf-8')).hexdigest()[:16]
+
+class KeyRing:
+    def __init__(self):
+        self._keys = {}     # kid -> {"user", "public", "private_pem", "private"}
+        self._by_user = {}  # user_id -> kid
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()  # chỉ một thread query KeyToken mỗi lần nạp
+        self._loaded_at = None
+
+    def reload(self):
+        """Đọc lại bảng KeyToken; key có kid không đổi được giữ nguyên, không parse lại."""
+        rows = KeyToken.query.all()
+        with self._lock:
+            keys, by_user = {}, {}
+            for row in rows:
+                kid = key_id(row.public_key)
+                keys[kid] = self._keys.get(kid) or {
+                    "user": row.user_id,
+                    "public": serialization.load_pem_public_key(row.public_key.encode('utf-8')),
+                    "private_pem": row.private_key,
+                    "private": None
+                }
+                by_user[row.user_id] = kid
+            self._keys, self._by_user = keys, by_user
+            self._loaded_at = time.monotonic()
+
+    def _is_older(self, seconds):
+        return self._loaded_at is None or time.monotonic() - self._loaded_at >= seconds
+
+    def _reload_if_older(self, seconds):
+        if not self._is_older(seconds):
+            return
+        with self._reload_lock:
+            # các request cùng gặp kid lạ chờ ở đây; thread đầu đã nạp xong thì không query lại
+            if self._is_older(seconds):
+                self.reload()
+
+    def add(self, user_id, public_pem: str, private_pem: str, private_key):
+        """Thêm khoá vừa tạo (đã có sẵn object) sau khi commit KeyToken; trả về kid."""
+        kid = key_id(public_pem)
+        with self._lock:
+            old_kid = self._by_user.get(user_id)
+            if old_kid is not None:
+                self._keys.pop(old_kid, None)
+            self._keys[kid] = {"user": user_id, "public": private_key.public_key(),
+                               "private_pem": private_pem, "private": private_key}
+            self._by_user[user_id] = kid
+        return kid
+
+    def public_key(self, kid):
+        """(user_id, public key object) của kid, hoặc None."""
+        self._reload_if_older(KEYRING_REFRESH_SECONDS)
+        entry = self._keys.get(kid)
+        if entry is None:
+            self._reload_if_older(KEYRING_MISS_RELOAD_SECONDS)
+            entry = self._keys.get(kid)
+        return (entry["user"], entry["public"]) if entry else None
+
+    def current_kid(self, user_id):
+        """kid của khoá hiện tại của user, cho token ký trước khi header có kid."""
+        self._reload_if_older(KEYRING_REFRESH_SECONDS)
+        kid = self._by_user.get(user_id)
+        if kid is None:
+            self._reload_if_older(KEYRING_MISS_RELOAD_SECONDS)
+            kid = self._by_user.get(user_id)
+        return kid
+
+    def signing_key(self, user_id):
+        """(kid, private key object) để ký token cho user, hoặc None; PEM chỉ parse lần đầu."""
+        self._reload_if_older(KEYRING_REFRESH_SECONDS)
+        kid = self._by_user.get(user_id)
+        entry = self._keys.get(kid) if kid else None
+        if entry is None or not entry["private_pem"]:
+            return None
+        if entry["private"] is None:
+            entry["private"] = serialization.load_pem_private_key(
+                entry["private_pem"].encode('utf-8'), password=None)
+        return kid, entry["private"]
+
+keyring = KeyRing()
+
+# Pool cặp khóa RSA tạo sẵn: sinh khóa 2048-bit mất hàng chục đến hàng trăm ms, nên
+# được chạy nền trong process pool (không giữ GIL của worker web). Login lấy một cặp
+# từ pool, chỉ tự sinh inline khi pool rỗng.
+RSA_KEY_POOL_SIZE = 4
+RSA_KEY_POOL_WORKERS = 1
+
+def generate_rsa_keypair_pem():
+    """Chạy trong process con: trả về (private_pem, public_pem) dạng bytes vì object
+    khóa của cryptography không pickle được."""
+    private_key_obj = rsa.generate_private_key(
+        public_exponent=65537,
+        key_size=2048
+    )
+    private_pem = private_key_obj.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption()
+    )
+    public_pem = private_key_obj.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return private_pem, public_pem
+
+class RSAKeyPool:
+    def __init__(self, size, workers):
+        self.size = size
+        self.workers = workers
+        self._keys = []
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+        self._started_at = time.monotonic()
+        self.generated = 0
+        self.served = 0
+        self.inline = 0
+        self.errors = 0
+
+    def start(self):
+        """Tạo process pool lúc khởi động, trước khi server tạo thread nào, rồi nạp đầy.
+        Dùng "spawn" thay vì fork: fork một process đã có nhiều thread là không an toàn."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+        self.fill()
+
+    def fill(self):
+        """Đặt lịch sinh thêm khóa cho đủ `size` (tính cả các khóa đang được sinh)."""
+        with self._lock:
+            if self._executor is None:  # pool chưa start (vd. process cha của reloader)
+                return
+            missing = self.size - len(self._keys) - self._pending
+            if missing <= 0:
+                return
+            self._pending += missing
+        for _ in range(missing):
+            self._executor.submit(generate_rsa_keypair_pem).add_done_callback(self._collect)
+
+    def _collect(self, future):
+        with self._lock:
+            self._pending -= 1
+            if future.exception() is not None:
+                self.errors += 1
+                return
+            self._keys.append(future.result())
+            self.generated += 1
+
+    def pop(self):
+        """(private_pem, public_pem) lấy từ pool; pool rỗng thì sinh inline."""
+        with self._lock:
+            pair = self._keys.pop() if self._keys else None
+            if pair is not None:
+                self.served += 1
+            else:
+                self.inline += 1
+        try:
+            self.fill()
+        except Exception:  # không tạo được process pool: vẫn sinh inline như trước
+            with self._lock:
+                self.errors += 1
+        return pair or generate_rsa_keypair_pem()
+
+    def stats(self):
+        with self._lock:
+            minutes = (time.monotonic() - self._started_at) / 60
+            return {
+                "depth": len(self._keys),
+                "size": self.size,
+                "pending": self._pending,
+                "generated": self.generated,
+                "served_from_pool": self.served,
+                "generated_inline": self.inline,
+                "errors": self.errors,
+                "refill_per_minute": round(self.generated / minutes, 2) if minutes else 0.0
+            }
+
+rsa_key_pool = RSAKeyPool(RSA_KEY_POOL_SIZE, RSA_KEY_POOL_WORKERS)
+
+def should_start_rsa_key_pool():
+    """Không tạo pool trong các process con do chính pool spawn ra, và trong process cha
+    của debug reloader (chỉ theo dõi file; request do process con WERKZEUG_RUN_MAIN=true phục vụ)."""
+    if multiprocessing.parent_process() is not None:
+        return False
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        return True
+    # app.run(debug=True) bên dưới và `flask run --debug` đều chạy reloader
+    return not (__name__ == '__main__' or (os.environ.get('FLASK_RUN_FROM_CLI') == 'true' and get_debug_flag()))
+
+if should_start_rsa_key_pool():
+    rsa_key_pool.start()
+
 # Decorator xác thực JWT (lấy token từ cookie)
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        current_user = request.environ.get(BATCH_USER_KEY)
+        if current_user is not None:  # sub-request của /batch, token đã được xác thực
+            return f(current_user, *args, **kwargs)
         token = request.cookies.get('access_token')
         if not token:
             return error_response("Token missing", 401)
         try:
-            # Lấy payload không verify để biết user (cần username để lấy public_key)
-            unverified = jwt.decode(token, options={"verify_signature": False})
-            username = unverified.get('user')
-            if not username:
-                return error_response("Invalid token payload", 401)
-
-            key_record = KeyToken.query.filter_by(user_id=username).first()
-            if not key_record or not key_record.public_key:
+            # kid trong header chọn public key trong keyring (không query DB, không parse PEM)
+            kid = jwt.get_unverified_header(token).get('kid')
+            if kid is None:
+                # Token cũ (ký trước khi có kid): dùng khoá hiện tại của user như trước đây
+                username = jwt.decode(token, options={"verify_signature": False}).get('user')
+                kid = keyring.current_kid(username) if username else None
+            key = keyring.public_key(kid) if kid else None
+            if key is None:
                 return error_response("Public key not found", 401)
+            key_owner, public_key = key
 
-            # Verify bằng public key (RS256)
-            decoded = jwt.decode(token, key_record.public_key, algorithms=["RS256"])
+            # Verify bằng public key (RS256); token phải thuộc đúng user sở hữu khoá
+            decoded = jwt.decode(token, public_key, algorithms=["RS256"])
             current_user = decoded.get('user')
+            if current_user != key_owner:
+                return error_response("Invalid token payload", 401)
 
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -156,14 +602,14 @@ def token_required(f):
         return f(current_user, *args, **kwargs)
     return decorated
 
-def create_access_token_rs256(username: str, private_pem: bytes):
+def create_access_token_rs256(username: str, kid: str, private_key):
     payload = {
         'user': username,
         'iat': datetime.datetime.utcnow(),
         'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     }
-    # private_pem: bytes
-    token = jwt.encode(payload, private_pem, algorithm="RS256")
+    # private_key: object đã parse từ keyring; kid cho phía verify chọn public key
+    token = jwt.encode(payload, private_key, algorithm="RS256", headers={"kid": kid})
     return token
 
 def create_and_store_refresh_token(username: str):
@@ -198,28 +644,13 @@ def login():
 
     # Demo auth: thay thành logic DB thực tế khi cần
     if username == 'admin' and password == '123456':
-        # Nếu đã có key per-user, tái sử dụng; nếu chưa có thì tạo mới
-        key_record = KeyToken.query.filter_by(user_id=username).first()
-        if key_record and key_record.private_key and key_record.public_key:
-            public_pem = key_record.public_key.encode('utf-8')
-            private_pem = key_record.private_key.encode('utf-8')
-        else:
-            # Tạo cặp khóa RSA (2048)
-            private_key_obj = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048
-            )
-            public_key_obj = private_key_obj.public_key()
-
-            private_pem = private_key_obj.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            public_pem = public_key_obj.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
+        # Nếu đã có key per-user (trong keyring), tái sử dụng; nếu chưa có thì tạo mới
+        signing_key = keyring.signing_key(username)
+        if signing_key is None:
+            key_record = KeyToken.query.filter_by(user_id=username).first()
+            # Lấy cặp khóa RSA (2048) tạo sẵn từ pool
+            private_pem, public_pem = rsa_key_pool.pop()
+            private_key_obj = serialization.load_pem_private_key(private_pem, password=None)
 
             # Lưu vào DB (lưu private_key ở đây để tiện demo/refresh)
             if key_record:
@@ -234,9 +665,11 @@ def login():
                 )
                 db.session.add(key_record)
             db.session.commit()
+            kid = keyring.add(username, public_pem.decode('utf-8'), private_pem.decode('utf-8'), private_key_obj)
+            signing_key = (kid, private_key_obj)
 
-        # Tạo access token bằng RS256 (ký bằng private_pem)
-        access_token = create_access_token_rs256(username, private_pem)
+        # Tạo access token bằng RS256 (ký bằng private key, header mang kid)
+        access_token = create_access_token_rs256(username, *signing_key)
 
         # Tạo & lưu refresh token (DB)
         rt = create_and_store_refresh_token(username)
@@ -280,20 +713,18 @@ def refresh():
 
     username = rt.username
 
-    # Lấy private key để ký access token mới
-    key_record = KeyToken.query.filter_by(user_id=username).first()
-    if not key_record or not key_record.private_key:
+    # Lấy private key (đã parse sẵn trong keyring) để ký access token mới
+    signing_key = keyring.signing_key(username)
+    if signing_key is None:
         return error_response("Signing key not available for user", 500)
 
-    private_pem = key_record.private_key.encode('utf-8')
-
     # Revoke current refresh token (rotation)
     rt.revoked = True
     db.session.commit()
 
     # Tạo refresh token mới + access token mới
     new_rt = create_and_store_refresh_token(username)
-    new_access_token = create_access_token_rs256(username, private_pem)
+    new_access_token = create_access_token_rs256(username, *signing_key)
 
     resp = jsonify({"status": "success", "message": "Token refreshed"})
     resp.set_cookie(
@@ -328,9 +759,64 @@ def logout():
 
 # ------------------ Book API ------------------
 
+BOOK_FIELDS = ("id", "title", "author", "available")
+
+def requested_fields():
+    """Sparse fieldset từ ?fields=title,author (None = lấy đủ cột); id luôn được trả về."""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip() and f.strip() != 'id'))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def book_fields(book, fields):
+    """Chỉ đọc các cột đã chọn, không chạm vào cột bị load_only bỏ qua (tránh lazy load)."""
+    if fields is None:
+        return book.to_dict()
+    return {"id": book.id, **{f: getattr(book, f) for f in fields}}
+
+MULTI_GET_MAX_IDS = 100
+
+def multi_get_books(raw_ids):
+    """Lấy nhiều sách bằng một truy vấn IN thay vì gọi GET /books/<id> cho từng ID.
+    Kết quả giữ đúng thứ tự yêu cầu, ID không tồn tại nằm trong "missing". ETag gộp
+    revision của từng sách được yêu cầu nên 304 được trả trước khi truy vấn DB."""
+    try:
+        book_ids = list(dict.fromkeys(int(i) for i in raw_ids if str(i).strip()))
+    except (TypeError, ValueError):
+        return error_response("Invalid book ID", 400)
+    if not book_ids:
+        return error_response("No book ids given", 400)
+    if len(book_ids) > MULTI_GET_MAX_IDS:
+        return error_response(f"At most {MULTI_GET_MAX_IDS} ids per request", 400)
+
+    revisions = ",".join(f"{i}:{_document_revisions.get(('books', i), 0)}" for i in book_ids)
+    etag = representation_etag(hashlib.md5(f"{ETAG_EPOCH}:books:ids:{revisions}".encode('utf-8')).hexdigest())
+    client_etag = request.headers.get('If-None-Match')
+    if client_etag == etag:
+        return '', 304
+
+    found = {b.id: b for b in Book.query.filter(Book.id.in_(book_ids)).all()}
+    data = {
+        "books": [found[i].to_dict() for i in book_ids if i in found],
+        "missing": [i for i in book_ids if i not in found]
+    }
+    return success_response(data, "Books fetched successfully", etag=etag)
+
 @app.route('/api/v1/books', methods=['GET'])
 @token_required
 def get_books(current_user):
+    ids = request.args.get('ids')
+    if ids is not None:
+        return multi_get_books(ids.split(','))
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
     available = request.args.get('available')
     title = request.args.get('title')
     author = request.args.get('author')
@@ -338,6 +824,9 @@ def get_books(current_user):
     cursor = request.args.get('cursor', type=int)
 
     query = Book.query
+    if fields is not None:
+        # Projection đẩy xuống DB: chỉ SELECT các cột được yêu cầu
+        query = query.options(load_only(Book.id, *[getattr(Book, f) for f in fields]))
 
     if available is not None:
         query = query.filter_by(available=(available.lower() == 'true'))
@@ -354,26 +843,39 @@ def get_books(current_user):
     books_to_return = books[:limit]
 
     next_cursor = books_to_return[-1].id if has_next else None
-    book_list = [b.to_dict() for b in books_to_return]
+    book_list = [book_fields(b, fields) for b in books_to_return]
 
     pagination = {
         "limit": limit,
         "next_cursor": next_cursor
     }
 
-    etag = generate_etag(book_list)
+    etag = generate_etag("books", key=query_key())
     return success_response({"books": book_list, "pagination": pagination}, "Books fetched successfully", etag=etag)
 
 
+@app.route('/api/v1/books/lookup', methods=['POST'])
+@token_required
+def lookup_books(current_user):
+    """Multi-get cho danh sách ID quá dài để đặt trên query string: {"ids": [...]}"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('ids'), list):
+        return error_response("Missing ids list", 400)
+    return multi_get_books(data['ids'])
+
 @app.route('/api/v1/books/<int:book_id>', methods=['GET'])
 @token_required
 def get_book(current_user, book_id):
+    if is_known_missing(book_id):
+        return error_response("Book not found", 404)
+    revision = _collection_revisions.get("books", 0)
     book = db.session.get(Book, book_id)
     if not book:
+        remember_missing(book_id, revision)
         return error_response("Book not found", 404)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -389,8 +891,10 @@ def create_book(current_user):
     new_book = Book(title=data['title'], author=data['author'])
     db.session.add(new_book)
     db.session.commit()
+    bump_revision("books", new_book.id)
+    forget_missing(new_book.id)
     book_data = new_book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", new_book.id)
     return success_response(book_data, "Book created", 201, etag)
 
 @app.route('/api/v1/books/<int:book_id>', methods=['PUT'])
@@ -432,9 +936,10 @@ def update_book(current_user, book_id):
             action = "Book returned"
 
     db.session.commit()
+    bump_revision("books", book_id)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     return success_response(book_data, action, etag=etag)
 
 
@@ -446,6 +951,7 @@ def delete_book(current_user, book_id):
         return error_response("Book not found", 404)
     db.session.delete(book)
     db.session.commit()
+    bump_revision("books", book_id)
     return success_response(None, "Book deleted")
 
 # ------------------ Member API ------------------
@@ -487,7 +993,7 @@ def get_member(current_user, member_id):
         return error_response("Member not found", 404)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -509,9 +1015,10 @@ def create_member(current_user):
     new_member = Member(name=data['name'], email=data['email'])
     db.session.add(new_member)
     db.session.commit()
+    bump_revision("members", new_member.id)
 
     member_data = new_member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", new_member.id)
     return success_response(member_data, "Member created successfully", 201, etag)
 
 
@@ -536,12 +1043,63 @@ def update_member(current_user, member_id):
         member.email = data["email"]
 
     db.session.commit()
+    bump_revision("members", member_id)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     return success_response(member_data, "Member updated successfully", etag=etag)
 
 
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+
+def prefers_minimal():
+    return 'return=minimal' in request.headers.get('Prefer', '')
+
+@app.route('/api/v1/members/<int:member_id>', methods=['PATCH'])
+@token_required
+def patch_member(current_user, member_id):
+    """JSON Merge Patch: dịch thẳng thành một câu UPDATE, không đọc member trước khi ghi.
+    Email trùng do unique constraint phát hiện; DB hỗ trợ RETURNING thì không cần đọc lại."""
+    if request.mimetype != MERGE_PATCH_MIMETYPE:
+        return error_response(f"Content-Type must be {MERGE_PATCH_MIMETYPE}", 415)
+    patch = request.get_json(silent=True)
+    if not isinstance(patch, dict) or not patch:
+        return error_response("Merge patch must be a non-empty JSON object", 400)
+    unknown = [k for k in patch if k not in ("name", "email")]
+    if unknown:
+        return error_response(f"Unknown or read-only field(s): {', '.join(unknown)}", 400)
+    # name/email là NOT NULL nên null (xoá trường theo RFC 7396) không hợp lệ
+    if not all(isinstance(v, str) and v.strip() for v in patch.values()):
+        return error_response("name and email must be non-empty strings", 400)
+
+    stmt = update(Member).where(Member.id == member_id).values(**patch)
+    member_data = None
+    try:
+        if db.engine.dialect.update_returning:
+            member = db.session.scalars(stmt.returning(Member)).first()
+            found = member is not None
+            if found:
+                member_data = member.to_dict()  # trước commit, tránh refresh sau expire
+        else:
+            found = db.session.execute(stmt).rowcount > 0
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return error_response("Email already exists", 400)
+    if not found:
+        return error_response("Member not found", 404)
+    bump_revision("members", member_id)
+
+    etag = generate_etag("members", member_id)
+    if prefers_minimal():
+        response = make_response('', 204)
+        response.headers["ETag"] = etag
+        response.headers["Preference-Applied"] = "return=minimal"
+        return response
+    if member_data is None:  # MySQL không có UPDATE ... RETURNING: đọc lại một lần
+        member_data = db.session.get(Member, member_id).to_dict()
+    return success_response(member_data, "Member updated successfully", etag=etag)
+
 @app.route('/api/v1/members/<int:member_id>', methods=['DELETE'])
 @token_required
 def delete_member(current_user, member_id):
@@ -551,6 +1109,7 @@ def delete_member(current_user, member_id):
 
     db.session.delete(member)
     db.session.commit()
+    bump_revision("members", member_id)
     return success_response(None, "Member deleted successfully")
 
 
@@ -608,6 +1167,7 @@ def create_book_borrowed(current_user):
 
     db.session.add(new_borrow)
     db.session.commit()
+    bump_revision("books", book.id)
     return success_response(new_borrow.to_dict(), "Book borrowed successfully", 201)
 
 
@@ -624,6 +1184,7 @@ def return_book(current_user, borrow_id):
     record.return_date = datetime.datetime.utcnow()
     record.book.available = True
     db.session.commit()
+    bump_revision("books", record.book_id)
 
     return success_response(record.to_dict(), "Book returned successfully")
 
@@ -639,6 +1200,108 @@ def delete_borrow_record(current_user, borrow_id):
     db.session.commit()
     return success_response(None, "Borrow record deleted successfully")
 
+# ------------------ Batch API ------------------
+# Gom nhiều thao tác vào một round-trip: mỗi sub-request được dispatch nội bộ qua URL
+# map của app (không đi qua mạng), token chỉ được xác thực một lần cho cả batch.
+# Với "atomic": true, các commit bên trong handler chỉ là SAVEPOINT của một transaction
+# chung; sub-request đầu tiên bị lỗi sẽ rollback toàn bộ và các request sau không chạy.
+BATCH_MAX_REQUESTS = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Header của request cha không được chuyển sang sub-request (body, điều kiện, negotiation)
+BATCH_SKIP_HEADERS = {'host', 'content-type', 'content-length', 'accept', 'accept-encoding', 'prefer',
+                      'if-match', 'if-none-match', 'if-modified-since', 'if-unmodified-since'}
+
+def dispatch_subrequest(current_user, item):
+    """Chạy một sub-request {method, path, body, headers} và trả về (status, headers, body)."""
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if method not in BATCH_METHODS or not isinstance(path, str) or not path.startswith('/api/'):
+        return 400, {}, {"status": "error", "data": None, "message": "Invalid method or path"}
+    if path.split('?', 1)[0].rstrip('/') == '/api/v1/batch':
+        return 400, {}, {"status": "error", "data": None, "message": "Nested batch is not allowed"}
+
+    # Giữ Host/X-Forwarded-*/... của request cha để url_for trong sub-request trỏ đúng host
+    headers = {name: value for name, value in request.headers
+               if name.lower() not in BATCH_SKIP_HEADERS}
+    headers.update(item.get('headers') or {})
+    headers['Accept'] = 'application/json'
+    with app.test_request_context(path, base_url=request.url_root, method=method,
+                                  json=item.get('body'), headers=headers,
+                                  environ_overrides={BATCH_USER_KEY: current_user}):
+        response = app.full_dispatch_request()
+    body = response.get_json(silent=True)
+    if body is None and response.status_code != 304:
+        body = response.get_data(as_text=True) or None
+    # Trong batch atomic revision chỉ tăng sau khi transaction ngoài commit, nên ETag lúc
+    # này vẫn là của revision cũ: bỏ đi, client GET lại sau batch để lấy ETag mới.
+    names = ('Location',) if g.get('deferred_revisions') is not None else ('ETag', 'Location')
+    sub_headers = {name: response.headers[name] for name in names if name in response.headers}
+    return response.status_code, sub_headers, body
+
+def is_failed(status, body):
+    # Một số handler trả lỗi với HTTP 200, nên xét cả "status": "error" trong envelope
+    return status >= 400 or (isinstance(body, dict) and body.get('status') == 'error')
+
+@app.route('/api/v1/batch', methods=['POST'])
+@token_required
+def batch(current_user):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('requests'), list) or not data['requests']:
+        return error_response("Missing requests list", 400)
+    items = data['requests']
+    if len(items) > BATCH_MAX_REQUESTS:
+        return error_response(f"At most {BATCH_MAX_REQUESTS} requests per batch", 400)
+    if not all(isinstance(item, dict) for item in items):
+        return error_response("Each request must be an object", 400)
+    atomic = bool(data.get('atomic'))
+
+    connection = transaction = None
+    if atomic:
+        # Session gắn vào connection có transaction ngoài: commit() của handler chỉ
+        # release SAVEPOINT, dữ liệu chỉ được ghi thật khi transaction ngoài commit.
+        db.session.remove()
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        db.session.registry.set(Session(bind=connection, join_transaction_mode="create_savepoint"))
+        g.deferred_revisions = []
+
+    results = []
+    failed = False
+    try:
+        for item in items:
+            if failed:
+                results.append({"status": 424, "headers": {}, "body": None})
+                continue
+            try:
+                status, headers, body = dispatch_subrequest(current_user, item)
+            except Exception as e:
+                db.session.rollback()
+                status, headers, body = 500, {}, {"status": "error", "data": None, "message": str(e)}
+            results.append({"status": status, "headers": headers, "body": body})
+            failed = atomic and is_failed(status, body)
+    finally:
+        if atomic:
+            db.session.remove()
+            if failed:
+                transaction.rollback()
+            else:
+                transaction.commit()
+            connection.close()
+            deferred, g.deferred_revisions = g.deferred_revisions, None
+            if not failed:
+                for collection, doc_id in deferred:
+                    bump_revision(collection, doc_id)
+
+    result = {"atomic": atomic, "committed": not failed, "responses": results}
+    message = "Batch rolled back" if failed else "Batch executed"
+    return success_response(result, message)
+
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check kèm số liệu pool khóa RSA (độ sâu, tốc độ nạp lại)"""
+    return success_response({"status": "healthy", "rsa_key_pool": rsa_key_pool.stats()})
+
 # ------------------ Swagger UI ------------------
 
 SWAGGER_URL = '/docs'
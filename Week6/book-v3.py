@@ -1,8 +1,13 @@
 # app_cognito.py
 import os
-import json
+import sqlite3
+import secrets
+import threading
+import time
+from collections import OrderedDict
 import hashlib
 import datetime
+import json
 import base64
 import requests
 import urllib.parse
@@ -10,11 +15,24 @@ from dotenv import load_dotenv
 from functools import wraps
 
 from flask import (
-    Flask, request, jsonify, make_response, redirect, url_for, session, send_from_directory
+    Flask, request, jsonify, make_response, redirect, url_for, session, send_from_directory,
+    g, has_app_context
 )
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only
 from flask_cors import CORS
 from flask_swagger_ui import get_swaggerui_blueprint
+try:
+    import msgpack
+except ImportError:  # tùy chọn: không có thì chỉ phục vụ JSON
+    msgpack = None
+try:
+    import library_pb2  # sinh từ library.proto: protoc --python_out=. library.proto
+    from google.protobuf import json_format
+except ImportError:
+    library_pb2 = None
 
 from authlib.integrations.flask_client import OAuth
 from authlib.jose import JsonWebKey, jwt as auth_jwt
@@ -32,6 +50,19 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI', 'sq
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 db = SQLAlchemy(app)
+
+# pysqlite never emits BEGIN itself, so SAVEPOINTs (atomic batch) would commit on RELEASE.
+# SQLAlchemy's pysqlite recipe: turn off the driver's implicit transactions and emit BEGIN ourselves.
+with app.app_context():
+    if db.engine.dialect.name == 'sqlite':
+        @event.listens_for(db.engine, 'connect')
+        def sqlite_disable_implicit_begin(dbapi_connection, connection_record):
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(db.engine, 'begin')
+        def sqlite_emit_begin(conn):
+            conn.exec_driver_sql('BEGIN')
+
 # ---------- Cognito config ----------
 COGNITO_REGION = os.getenv('COGNITO_REGION')
 COGNITO_USER_POOL_ID = os.getenv('COGNITO_USER_POOL_ID')
@@ -59,19 +90,122 @@ oauth.register(
     client_kwargs={'scope': 'openid email profile'}
 )
 
+# ---------- Outbound HTTP ----------
+# One pooled session for every call to Cognito (JWKS, token endpoint): keeps
+# TLS connections alive, and every call has a (connect, read) timeout.
+HTTP_TIMEOUT = (3.05, 10)
+http_session = requests.Session()
+http_session.mount('https://', requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=10))
+
 # ---------- JWKS cache ----------
-_jwks_cache = {"jwks": None, "fetched_at": None}
-def get_jwks():
-    now = datetime.datetime.utcnow()
-    if _jwks_cache["jwks"] and _jwks_cache["fetched_at"]:
-        if (now - _jwks_cache["fetched_at"]).total_seconds() < 3600:
-            return _jwks_cache["jwks"]
-    resp = requests.get(COGNITO_JWKS_URL)
-    resp.raise_for_status()
-    jwks = resp.json()
-    _jwks_cache["jwks"] = jwks
-    _jwks_cache["fetched_at"] = now
-    return jwks
+JWKS_TTL_SECONDS = 3600
+JWKS_REFRESH_AHEAD_SECONDS = 300   # background refresh this long before the TTL runs out
+JWKS_RETRY_SECONDS = 30            # retry interval after a failed background fetch
+JWKS_MIN_REFETCH_SECONDS = 30      # unknown kid triggers at most one refetch per interval
+
+
+class JWKSCache:
+    """Parsed Cognito key set (kid -> key), refreshed by a background thread.
+
+    Keys are imported once per fetch, never per request, and no request ever
+    waits on the JWKS endpoint: until the first fetch succeeds callers get None
+    (503), an unknown kid schedules a single-flight refetch, and if a fetch
+    fails the last good key set keeps being served.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self._keys = {}
+        self._fetched_at = None  # time.monotonic() of the last successful fetch
+        self._fetch_lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._refresher = None
+        self._start_lock = threading.Lock()
+        self.fetches = 0
+        self.failures = 0
+
+    def _fetch(self):
+        resp = http_session.get(self.url, timeout=HTTP_TIMEOUT)
+        resp.raise_for_status()
+        key_set = JsonWebKey.import_key_set(resp.json())
+        keys = {}
+        for key in key_set.keys:
+            key.get_public_key()  # parse the RSA key once, here
+            keys[key.kid] = key
+        self._keys = keys  # swap the whole dict; in-flight requests keep the old one
+        self._fetched_at = time.monotonic()
+        self.fetches += 1
+        self._loaded.set()
+
+    def refresh(self, min_age=0):
+        """Fetch the JWKS unless another thread is already doing it (single-flight)
+        or the current set is younger than min_age seconds."""
+        with self._fetch_lock:
+            if self._fetched_at is not None and time.monotonic() - self._fetched_at < min_age:
+                return
+            try:
+                self._fetch()
+            except Exception:
+                self.failures += 1
+                raise
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+                delay = JWKS_TTL_SECONDS - JWKS_REFRESH_AHEAD_SECONDS
+            except Exception:
+                delay = JWKS_RETRY_SECONDS
+            time.sleep(delay)
+
+    def start(self):
+        """Start the background refresher (idempotent)."""
+        if self._refresher is not None:
+            return
+        with self._start_lock:
+            if self._refresher is None:
+                self._refresher = threading.Thread(target=self._run, name='jwks-refresh', daemon=True)
+                self._refresher.start()
+
+    def _refetch_async(self):
+        if self._fetch_lock.locked():
+            return  # a fetch is already in flight
+        if self._fetched_at is not None and time.monotonic() - self._fetched_at < JWKS_MIN_REFETCH_SECONDS:
+            return
+
+        def run():
+            try:
+                self.refresh(min_age=JWKS_MIN_REFETCH_SECONDS)
+            except Exception:
+                pass
+        threading.Thread(target=run, name='jwks-refetch', daemon=True).start()
+
+    def get_key(self, kid):
+        """Return the parsed key for kid, or None (unknown kid schedules a refetch)."""
+        key = self._keys.get(kid)
+        if key is None and self.loaded:
+            self._refetch_async()
+        return key
+
+    @property
+    def loaded(self):
+        return self._loaded.is_set()
+
+    def stats(self):
+        age = None if self._fetched_at is None else round(time.monotonic() - self._fetched_at, 1)
+        return {"keys": len(self._keys), "age_seconds": age,
+                "fetches": self.fetches, "failures": self.failures}
+
+
+jwks_cache = JWKSCache(COGNITO_JWKS_URL)
+jwks_cache.start()  # first fetch happens at startup, off the request path
+
+
+def token_kid(token):
+    """Read the kid from the JWT header without verifying anything."""
+    header_b64 = token.split('.', 1)[0]
+    header = json.loads(base64.urlsafe_b64decode(header_b64 + '=' * (-len(header_b64) % 4)))
+    return header.get('kid')
 
 # ---------- Models (kept minimal for your API) ----------
 class Book(db.Model):
@@ -110,12 +244,227 @@ class BookBorrowed(db.Model):
         }
 
 # ---------- Helpers ----------
-def generate_etag(data_dict):
-    data_str = json.dumps(data_dict, sort_keys=True)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
+# Bộ đếm revision cho từng collection và từng document, tăng ở mọi thao tác ghi
+# (create/update/delete/borrow/return). ETag = revision + query key nên tính được
+# ngay (O(1)), không cần lấy và serialize cả danh sách rồi mới hash.
+ETAG_EPOCH = secrets.token_hex(4)  # đổi mỗi lần khởi động để ETag cũ không khớp nhầm
+_revision_lock = threading.Lock()
+_collection_revisions = {}
+_document_revisions = {}
+
+def _bump_local(collection, doc_id=None):
+    with _revision_lock:
+        _collection_revisions[collection] = _collection_revisions.get(collection, 0) + 1
+        if doc_id is not None:
+            key = (collection, doc_id)
+            _document_revisions[key] = _document_revisions.get(key, 0) + 1
+
+def bump_revision(collection, doc_id=None):
+    """Tăng revision của collection (và của document nếu có) sau khi commit, rồi báo
+    cho các worker khác qua signal log (nếu bật). Trong batch atomic thì hoãn tới khi
+    transaction ngoài commit, để không worker nào đổi ETag trước khi dữ liệu hiện ra."""
+    deferred = g.get('deferred_revisions') if has_app_context() else None
+    if deferred is not None:
+        deferred.append((collection, doc_id))
+        return
+    _bump_local(collection, doc_id)
+    if signal_log:
+        signal_log.publish(collection, doc_id)
+
+def query_key():
+    """Chuẩn hoá query string (sắp xếp tham số) để dùng làm một phần của ETag."""
+    return "&".join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+
+def generate_etag(collection, doc_id=None, key=""):
+    """Tạo ETag từ revision counter thay vì hash MD5 toàn bộ dữ liệu JSON."""
+    if doc_id is None:
+        revision = _collection_revisions.get(collection, 0)
+    else:
+        revision = _document_revisions.get((collection, doc_id), 0)
+    raw = f"{ETAG_EPOCH}:{collection}:{doc_id}:{revision}:{key}"
+    return representation_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+# Negative cache: ID sách vừa được xác nhận là không tồn tại được nhớ trong thời gian
+# ngắn, để các request lặp lại (scraper, link cũ) trả 404 mà không tốn một lần truy
+# vấn DB. Entry bị xoá ngay khi ID đó được tạo.
+NEGATIVE_CACHE_TTL = 30  # giây
+NEGATIVE_CACHE_SIZE = 10000
+_missing_books = OrderedDict()  # book_id -> thời điểm hết hạn (time.monotonic)
+
+def is_known_missing(book_id):
+    """True nếu book_id nằm trong negative cache và chưa hết hạn."""
+    with _revision_lock:
+        expires_at = _missing_books.get(book_id)
+        if expires_at is None:
+            return False
+        if time.monotonic() >= expires_at:
+            del _missing_books[book_id]
+            return False
+        return True
+
+def remember_missing(book_id, revision):
+    """Ghi nhớ ID không tồn tại, trừ khi đã có thao tác ghi sách kể từ lúc truy vấn
+    (revision thay đổi) - khi đó kết quả "không tìm thấy" có thể đã cũ."""
+    with _revision_lock:
+        if _collection_revisions.get("books", 0) != revision:
+            return
+        _missing_books[book_id] = time.monotonic() + NEGATIVE_CACHE_TTL
+        _missing_books.move_to_end(book_id)
+        while len(_missing_books) > NEGATIVE_CACHE_SIZE:
+            _missing_books.popitem(last=False)
+
+def forget_missing(book_id):
+    with _revision_lock:
+        _missing_books.pop(book_id, None)
+
+# ------------------ Tín hiệu ghi giữa các worker ------------------
+# Revision counter (ETag) và negative cache là state riêng của từng process. Khi chạy nhiều
+# worker (gunicorn -w N), đặt CACHE_SIGNAL_PATH (vd. /dev/shm/library-signals.sqlite3):
+# mỗi lần ghi thêm một dòng vào log SQLite dùng chung, và trước mỗi request worker phát
+# lại các dòng mới (tăng revision, bỏ ID khỏi negative cache). Để trống = tắt (một process).
+CACHE_SIGNAL_PATH = os.getenv('CACHE_SIGNAL_PATH', '')
+CACHE_SIGNAL_RETENTION = 300  # giây; worker tụt lại quá mức này thì đổi ETAG_EPOCH
+# Mỗi worker đọc log tối đa một lần mỗi CACHE_SIGNAL_POLL_MS, các request còn lại chỉ so
+# một mốc thời gian; đổi lại, ghi ở worker khác có thể trễ tối đa chừng đó mới thấy.
+CACHE_SIGNAL_POLL_MS = int(os.getenv('CACHE_SIGNAL_POLL_MS', 100))
+
+class SignalLog:
+    """Log các thao tác ghi (collection, id) dùng chung giữa các worker trên cùng host."""
+
+    def __init__(self, path, retention, poll_interval=0.0):
+        self.path = path
+        self.retention = retention
+        self.poll_interval = poll_interval  # giây giữa hai lần đọc log
+        self._next_poll = 0.0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._published = set()  # seq do chính process này ghi, không phát lại
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS signals ("
+                     "seq INTEGER PRIMARY KEY AUTOINCREMENT, collection TEXT NOT NULL, "
+                     "doc_id INTEGER, created_at REAL NOT NULL)")
+        # process mới khởi động chưa có state gì để làm mới, bỏ qua các dòng cũ
+        self.last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM signals").fetchone()[0]
+
+    def _conn(self):
+        # Mỗi thread một connection, mở lại sau fork (server pre-fork import app trước)
+        pid, conn = getattr(self._local, 'conn', (None, None))
+        if pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def publish(self, collection, doc_id):
+        now = time.time()
+        conn = self._conn()
+        seq = conn.execute("INSERT INTO signals (collection, doc_id, created_at) VALUES (?, ?, ?)",
+                           (collection, doc_id, now)).lastrowid
+        with self._lock:
+            self._published.add(seq)
+        conn.execute("DELETE FROM signals WHERE created_at < ? AND seq < ?", (now - self.retention, seq))
+
+    def sync(self, apply, reset):
+        """Phát lại các tín hiệu mới: apply(collection, doc_id) cho từng dòng, hoặc reset()
+        một lần nếu có dòng đã bị dọn trước khi process này kịp đọc. Bỏ qua nếu chưa hết
+        poll_interval kể từ lần đọc trước."""
+        now = time.monotonic()
+        if now < self._next_poll:
+            return
+        with self._lock:
+            if now < self._next_poll:
+                return
+            self._next_poll = now + self.poll_interval
+            rows = self._conn().execute("SELECT seq, collection, doc_id FROM signals WHERE seq > ? ORDER BY seq",
+                                        (self.last_seq,)).fetchall()
+            if not rows:
+                return
+            if rows[0][0] > self.last_seq + 1:
+                reset()
+            else:
+                for seq, collection, doc_id in rows:
+                    if seq not in self._published:
+                        apply(collection, doc_id)
+            self._published.difference_update(seq for seq, _, _ in rows)
+            self.last_seq = rows[-1][0]
+
+signal_log = SignalLog(CACHE_SIGNAL_PATH, CACHE_SIGNAL_RETENTION, CACHE_SIGNAL_POLL_MS / 1000) if CACHE_SIGNAL_PATH else None
+
+def apply_remote_write(collection, doc_id):
+    """Thao tác ghi của worker khác: tăng revision ở process này (không publish lại)."""
+    _bump_local(collection, doc_id)
+    if collection == "books" and doc_id is not None:
+        forget_missing(doc_id)
+
+def reset_revisions():
+    """Đã lỡ một số tín hiệu: đổi ETAG_EPOCH để không ETag nào phát ra trước đó còn khớp."""
+    global ETAG_EPOCH
+    with _revision_lock:
+        ETAG_EPOCH = secrets.token_hex(4)
+        _missing_books.clear()
+
+@app.before_request
+def sync_signals():
+    """Áp dụng các thao tác ghi của worker khác trước khi phục vụ request."""
+    if signal_log:
+        signal_log.sync(apply_remote_write, reset_revisions)
+
+# ------------------ Content negotiation ------------------
+# Cùng handler, chỉ khác bước encode cuối cùng theo header Accept: JSON là mặc định,
+# MessagePack/protobuf chỉ được chọn khi thư viện tương ứng có sẵn. Bytes mỗi biểu diễn
+# khác nhau nên ETag mang thêm hậu tố representation (xem representation_etag).
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+PROTOBUF_MIMETYPE = 'application/x-protobuf'
+
+def negotiate_mimetype():
+    offers = ['application/json']
+    if msgpack is not None:
+        offers.extend(MSGPACK_MIMETYPES)
+    if library_pb2 is not None:
+        offers.append(PROTOBUF_MIMETYPE)
+    return request.accept_mimetypes.best_match(offers, default='application/json')
+
+def representation_etag(etag):
+    """Gắn representation đã negotiate vào ETag (vd. "<hash>-msgpack"), để 304 không
+    bao giờ xác nhận một biểu diễn mà client chưa từng nhận."""
+    return f"{etag}-{negotiate_mimetype().split('/', 1)[1]}"
+
+def to_protobuf(payload):
+    """Map envelope sang library.Envelope theo hình dạng của data (sách, member hoặc
+    danh sách); các payload khác đi vào trường `other` (google.protobuf.Value)."""
+    envelope = library_pb2.Envelope(status=payload["status"], message=payload["message"] or "")
+    data = payload["data"]
+    if isinstance(data, dict) and "books" in data:
+        target = envelope.books
+    elif isinstance(data, dict) and "members" in data:
+        target = envelope.members
+    elif isinstance(data, dict) and "title" in data:
+        target = envelope.book
+    elif isinstance(data, dict) and "email" in data:
+        target = envelope.member
+    else:
+        json_format.ParseDict(data, envelope.other)
+        return envelope.SerializeToString()
+    target.SetInParent()
+    json_format.ParseDict(data, target, ignore_unknown_fields=True)
+    return envelope.SerializeToString()
+
+def negotiated_response(payload, status_code=200):
+    mimetype = negotiate_mimetype()
+    if mimetype in MSGPACK_MIMETYPES:
+        response = make_response(msgpack.packb(payload), status_code)
+        response.mimetype = mimetype
+    elif mimetype == PROTOBUF_MIMETYPE:
+        response = make_response(to_protobuf(payload), status_code)
+        response.mimetype = mimetype
+    else:
+        response = make_response(jsonify(payload), status_code)
+    response.vary.add('Accept')
+    return response
 
 def success_response(data=None, message=None, status_code=200, etag=None):
-    response = make_response(jsonify({"status": "success", "data": data, "message": message}), status_code)
+    response = negotiated_response({"status": "success", "data": data, "message": message}, status_code)
     if etag:
         response.headers["ETag"] = etag
         response.headers["Cache-Control"] = "private, max-age=120"
@@ -126,18 +475,28 @@ def error_response(message, status_code=400):
     response.headers["Content-Type"] = "application/json"
     return response, status_code
 
+# Sub-request của /api/v1/batch mang sẵn user đã xác thực trong environ (client không
+# thể tự đặt key này, header chỉ xuất hiện dưới dạng HTTP_*)
+BATCH_USER_KEY = 'library.batch_user'
+
 # ---------- Auth: verify Cognito access token ----------
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        current_user = request.environ.get(BATCH_USER_KEY)
+        if current_user is not None:  # sub-request của /batch, token đã được xác thực
+            return f(current_user, *args, **kwargs)
         auth = request.headers.get('Authorization', None)
         if not auth or not auth.startswith('Bearer '):
             return error_response("Token is missing", 401)
         token = auth.split()[1]
         try:
-            jwks = get_jwks()
-            key_set = JsonWebKey.import_key_set(jwks)
-            claims = auth_jwt.decode(token, key_set)
+            key = jwks_cache.get_key(token_kid(token))
+            if key is None and not jwks_cache.loaded:
+                return error_response("Signing keys not loaded yet, retry shortly", 503)
+            if key is None:
+                return error_response("Unknown token signing key", 401)
+            claims = auth_jwt.decode(token, key)
             # Validate standard claims
             iss = claims.get('iss')
             if iss != COGNITO_ISSUER:
@@ -228,7 +587,7 @@ def refresh():
         b64 = base64.b64encode(creds.encode()).decode()
         headers['Authorization'] = f"Basic {b64}"
 
-    resp = requests.post(COGNITO_TOKEN_URL, data=data, headers=headers)
+    resp = http_session.post(COGNITO_TOKEN_URL, data=data, headers=headers, timeout=HTTP_TIMEOUT)
     if resp.status_code != 200:
         return error_response(f"Refresh failed: {resp.status_code} {resp.text}", 401)
 
@@ -264,9 +623,64 @@ def me_token():
     return jsonify(token)
 # ------------------ Book API ------------------
 
+BOOK_FIELDS = ("id", "title", "author", "available")
+
+def requested_fields():
+    """Sparse fieldset từ ?fields=title,author (None = lấy đủ cột); id luôn được trả về."""
+    raw = request.args.get('fields')
+    if raw is None:
+        return None
+    fields = list(dict.fromkeys(f.strip() for f in raw.split(',') if f.strip() and f.strip() != 'id'))
+    unknown = [f for f in fields if f not in BOOK_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def book_fields(book, fields):
+    """Chỉ đọc các cột đã chọn, không chạm vào cột bị load_only bỏ qua (tránh lazy load)."""
+    if fields is None:
+        return book.to_dict()
+    return {"id": book.id, **{f: getattr(book, f) for f in fields}}
+
+MULTI_GET_MAX_IDS = 100
+
+def multi_get_books(raw_ids):
+    """Lấy nhiều sách bằng một truy vấn IN thay vì gọi GET /books/<id> cho từng ID.
+    Kết quả giữ đúng thứ tự yêu cầu, ID không tồn tại nằm trong "missing". ETag gộp
+    revision của từng sách được yêu cầu nên 304 được trả trước khi truy vấn DB."""
+    try:
+        book_ids = list(dict.fromkeys(int(i) for i in raw_ids if str(i).strip()))
+    except (TypeError, ValueError):
+        return error_response("Invalid book ID", 400)
+    if not book_ids:
+        return error_response("No book ids given", 400)
+    if len(book_ids) > MULTI_GET_MAX_IDS:
+        return error_response(f"At most {MULTI_GET_MAX_IDS} ids per request", 400)
+
+    revisions = ",".join(f"{i}:{_document_revisions.get(('books', i), 0)}" for i in book_ids)
+    etag = representation_etag(hashlib.md5(f"{ETAG_EPOCH}:books:ids:{revisions}".encode('utf-8')).hexdigest())
+    client_etag = request.headers.get('If-None-Match')
+    if client_etag == etag:
+        return '', 304
+
+    found = {b.id: b for b in Book.query.filter(Book.id.in_(book_ids)).all()}
+    data = {
+        "books": [found[i].to_dict() for i in book_ids if i in found],
+        "missing": [i for i in book_ids if i not in found]
+    }
+    return success_response(data, "Books fetched successfully", etag=etag)
+
 @app.route('/api/v1/books', methods=['GET'])
 @token_required
 def get_books(current_user):
+    ids = request.args.get('ids')
+    if ids is not None:
+        return multi_get_books(ids.split(','))
+    try:
+        fields = requested_fields()
+    except ValueError as e:
+        return error_response(str(e), 400)
+
     available = request.args.get('available')
     title = request.args.get('title')
     author = request.args.get('author')
@@ -274,6 +688,9 @@ def get_books(current_user):
     cursor = request.args.get('cursor', type=int)
 
     query = Book.query
+    if fields is not None:
+        # Projection đẩy xuống DB: chỉ SELECT các cột được yêu cầu
+        query = query.options(load_only(Book.id, *[getattr(Book, f) for f in fields]))
 
     if available is not None:
         query = query.filter_by(available=(available.lower() == 'true'))
@@ -290,26 +707,39 @@ def get_books(current_user):
     books_to_return = books[:limit]
 
     next_cursor = books_to_return[-1].id if has_next else None
-    book_list = [b.to_dict() for b in books_to_return]
+    book_list = [book_fields(b, fields) for b in books_to_return]
 
     pagination = {
         "limit": limit,
         "next_cursor": next_cursor
     }
 
-    etag = generate_etag(book_list)
+    etag = generate_etag("books", key=query_key())
     return success_response({"books": book_list, "pagination": pagination}, "Books fetched successfully", etag=etag)
 
 
+@app.route('/api/v1/books/lookup', methods=['POST'])
+@token_required
+def lookup_books(current_user):
+    """Multi-get cho danh sách ID quá dài để đặt trên query string: {"ids": [...]}"""
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('ids'), list):
+        return error_response("Missing ids list", 400)
+    return multi_get_books(data['ids'])
+
 @app.route('/api/v1/books/<int:book_id>', methods=['GET'])
 @token_required
 def get_book(current_user, book_id):
+    if is_known_missing(book_id):
+        return error_response("Book not found", 404)
+    revision = _collection_revisions.get("books", 0)
     book = db.session.get(Book, book_id)
     if not book:
+        remember_missing(book_id, revision)
         return error_response("Book not found", 404)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -325,8 +755,10 @@ def create_book(current_user):
     new_book = Book(title=data['title'], author=data['author'])
     db.session.add(new_book)
     db.session.commit()
+    bump_revision("books", new_book.id)
+    forget_missing(new_book.id)
     book_data = new_book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", new_book.id)
     return success_response(book_data, "Book created", 201, etag)
 
 @app.route('/api/v1/books/<int:book_id>', methods=['PUT'])
@@ -368,9 +800,10 @@ def update_book(current_user, book_id):
             action = "Book returned"
 
     db.session.commit()
+    bump_revision("books", book_id)
 
     book_data = book.to_dict()
-    etag = generate_etag(book_data)
+    etag = generate_etag("books", book_id)
     return success_response(book_data, action, etag=etag)
 
 
@@ -382,6 +815,7 @@ def delete_book(current_user, book_id):
         return error_response("Book not found", 404)
     db.session.delete(book)
     db.session.commit()
+    bump_revision("books", book_id)
     return success_response(None, "Book deleted")
 
 # ------------------ Member API ------------------
@@ -423,7 +857,7 @@ def get_member(current_user, member_id):
         return error_response("Member not found", 404)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
@@ -445,9 +879,10 @@ def create_member(current_user):
     new_member = Member(name=data['name'], email=data['email'])
     db.session.add(new_member)
     db.session.commit()
+    bump_revision("members", new_member.id)
 
     member_data = new_member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", new_member.id)
     return success_response(member_data, "Member created successfully", 201, etag)
 
 
@@ -472,12 +907,63 @@ def update_member(current_user, member_id):
         member.email = data["email"]
 
     db.session.commit()
+    bump_revision("members", member_id)
 
     member_data = member.to_dict()
-    etag = generate_etag(member_data)
+    etag = generate_etag("members", member_id)
     return success_response(member_data, "Member updated successfully", etag=etag)
 
 
+MERGE_PATCH_MIMETYPE = 'application/merge-patch+json'
+
+def prefers_minimal():
+    return 'return=minimal' in request.headers.get('Prefer', '')
+
+@app.route('/api/v1/members/<int:member_id>', methods=['PATCH'])
+@token_required
+def patch_member(current_user, member_id):
+    """JSON Merge Patch: dịch thẳng thành một câu UPDATE, không đọc member trước khi ghi.
+    Email trùng do unique constraint phát hiện; DB hỗ trợ RETURNING thì không cần đọc lại."""
+    if request.mimetype != MERGE_PATCH_MIMETYPE:
+        return error_response(f"Content-Type must be {MERGE_PATCH_MIMETYPE}", 415)
+    patch = request.get_json(silent=True)
+    if not isinstance(patch, dict) or not patch:
+        return error_response("Merge patch must be a non-empty JSON object", 400)
+    unknown = [k for k in patch if k not in ("name", "email")]
+    if unknown:
+        return error_response(f"Unknown or read-only field(s): {', '.join(unknown)}", 400)
+    # name/email là NOT NULL nên null (xoá trường theo RFC 7396) không hợp lệ
+    if not all(isinstance(v, str) and v.strip() for v in patch.values()):
+        return error_response("name and email must be non-empty strings", 400)
+
+    stmt = update(Member).where(Member.id == member_id).values(**patch)
+    member_data = None
+    try:
+        if db.engine.dialect.update_returning:
+            member = db.session.scalars(stmt.returning(Member)).first()
+            found = member is not None
+            if found:
+                member_data = member.to_dict()  # trước commit, tránh refresh sau expire
+        else:
+            found = db.session.execute(stmt).rowcount > 0
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return error_response("Email already exists", 400)
+    if not found:
+        return error_response("Member not found", 404)
+    bump_revision("members", member_id)
+
+    etag = generate_etag("members", member_id)
+    if prefers_minimal():
+        response = make_response('', 204)
+        response.headers["ETag"] = etag
+        response.headers["Preference-Applied"] = "return=minimal"
+        return response
+    if member_data is None:  # MySQL không có UPDATE ... RETURNING: đọc lại một lần
+        member_data = db.session.get(Member, member_id).to_dict()
+    return success_response(member_data, "Member updated successfully", etag=etag)
+
 @app.route('/api/v1/members/<int:member_id>', methods=['DELETE'])
 @token_required
 def delete_member(current_user, member_id):
@@ -487,6 +973,7 @@ def delete_member(current_user, member_id):
 
     db.session.delete(member)
     db.session.commit()
+    bump_revision("members", member_id)
     return success_response(None, "Member deleted successfully")
 
 
@@ -544,6 +1031,7 @@ def create_book_borrowed(current_user):
 
     db.session.add(new_borrow)
     db.session.commit()
+    bump_revision("books", book.id)
     return success_response(new_borrow.to_dict(), "Book borrowed successfully", 201)
 
 
@@ -560,6 +1048,7 @@ def return_book(current_user, borrow_id):
     record.return_date = datetime.datetime.utcnow()
     record.book.available = True
     db.session.commit()
+    bump_revision("books", record.book_id)
 
     return success_response(record.to_dict(), "Book returned successfully")
 
@@ -575,6 +1064,107 @@ def delete_borrow_record(current_user, borrow_id):
     db.session.commit()
     return success_response(None, "Borrow record deleted successfully")
 
+# ---------- Batch API ----------
+# Gom nhiều thao tác vào một round-trip: mỗi sub-request được dispatch nội bộ qua URL
+# map của app (không đi qua mạng), token chỉ được xác thực một lần cho cả batch.
+# Với "atomic": true, các commit bên trong handler chỉ là SAVEPOINT của một transaction
+# chung; sub-request đầu tiên bị lỗi sẽ rollback toàn bộ và các request sau không chạy.
+BATCH_MAX_REQUESTS = 50
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Header của request cha không được chuyển sang sub-request (body, điều kiện, negotiation)
+BATCH_SKIP_HEADERS = {'host', 'content-type', 'content-length', 'accept', 'accept-encoding', 'prefer',
+                      'if-match', 'if-none-match', 'if-modified-since', 'if-unmodified-since'}
+
+def dispatch_subrequest(current_user, item):
+    """Chạy một sub-request {method, path, body, headers} và trả về (status, headers, body)."""
+    method = str(item.get('method', 'GET')).upper()
+    path = item.get('path')
+    if method not in BATCH_METHODS or not isinstance(path, str) or not path.startswith('/api/'):
+        return 400, {}, {"status": "error", "data": None, "message": "Invalid method or path"}
+    if path.split('?', 1)[0].rstrip('/') == '/api/v1/batch':
+        return 400, {}, {"status": "error", "data": None, "message": "Nested batch is not allowed"}
+
+    # Giữ Host/X-Forwarded-*/... của request cha để url_for trong sub-request trỏ đúng host
+    headers = {name: value for name, value in request.headers
+               if name.lower() not in BATCH_SKIP_HEADERS}
+    headers.update(item.get('headers') or {})
+    headers['Accept'] = 'application/json'
+    with app.test_request_context(path, base_url=request.url_root, method=method,
+                                  json=item.get('body'), headers=headers,
+                                  environ_overrides={BATCH_USER_KEY: current_user}):
+        response = app.full_dispatch_request()
+    body = response.get_json(silent=True)
+    if body is None and response.status_code != 304:
+        body = response.get_data(as_text=True) or None
+    # Trong batch atomic revision chỉ tăng sau khi transaction ngoài commit, nên ETag lúc
+    # này vẫn là của revision cũ: bỏ đi, client GET lại sau batch để lấy ETag mới.
+    names = ('Location',) if g.get('deferred_revisions') is not None else ('ETag', 'Location')
+    sub_headers = {name: response.headers[name] for name in names if name in response.headers}
+    return response.status_code, sub_headers, body
+
+def is_failed(status, body):
+    # Một số handler trả lỗi với HTTP 200, nên xét cả "status": "error" trong envelope
+    return status >= 400 or (isinstance(body, dict) and body.get('status') == 'error')
+
+@app.route('/api/v1/batch', methods=['POST'])
+@token_required
+def batch(current_user):
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('requests'), list) or not data['requests']:
+        return error_response("Missing requests list", 400)
+    items = data['requests']
+    if len(items) > BATCH_MAX_REQUESTS:
+        return error_response(f"At most {BATCH_MAX_REQUESTS} requests per batch", 400)
+    if not all(isinstance(item, dict) for item in items):
+        return error_response("Each request must be an object", 400)
+    atomic = bool(data.get('atomic'))
+
+    connection = transaction = None
+    if atomic:
+        # Session gắn vào connection có transaction ngoài: commit() của handler chỉ
+        # release SAVEPOINT, dữ liệu chỉ được ghi thật khi transaction ngoài commit.
+        db.session.remove()
+        connection = db.engine.connect()
+        transaction = connection.begin()
+        db.session.registry.set(Session(bind=connection, join_transaction_mode="create_savepoint"))
+        g.deferred_revisions = []
+
+    results = []
+    failed = False
+    try:
+        for item in items:
+            if failed:
+                results.append({"status": 424, "headers": {}, "body": None})
+                continue
+            try:
+                status, headers, body = dispatch_subrequest(current_user, item)
+            except Exception as e:
+                db.session.rollback()
+                status, headers, body = 500, {}, {"status": "error", "data": None, "message": str(e)}
+            results.append({"status": status, "headers": headers, "body": body})
+            failed = atomic and is_failed(status, body)
+    finally:
+        if atomic:
+            db.session.remove()
+            if failed:
+                transaction.rollback()
+            else:
+                transaction.commit()
+            connection.close()
+            deferred, g.deferred_revisions = g.deferred_revisions, None
+            if not failed:
+                for collection, doc_id in deferred:
+                    bump_revision(collection, doc_id)
+
+    result = {"atomic": atomic, "committed": not failed, "responses": results}
+    message = "Batch rolled back" if failed else "Batch executed"
+    return success_response(result, message)
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check with JWKS cache stats (key count, age, fetch failures)"""
+    return success_response({"status": "healthy", "jwks": jwks_cache.stats()})
+
 # ---------- Swagger UI ----------
 SWAGGER_URL = '/docs'
 API_URL = '/static/swagger.yaml'
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# Generated by the protocol buffer compiler.  DO NOT EDIT!
+# source: library.proto
+"""Generated protocol buffer code."""
+from google.protobuf.internal import builder as _builder
+from google.protobuf import descriptor as _descriptor
+from google.protobuf import descriptor_pool as _descriptor_pool
+from google.protobuf import symbol_database as _symbol_database
+# @@protoc_insertion_point(imports)
+
+_sym_db = _symbol_database.Default()
+
+
+from google.protobuf import struct_pb2 as google_dot_protobuf_dot_struct__pb2
+
+
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\rlibrary.proto\x12\x07library\x1a\x1cgoogle/protobuf/struct.proto\"D\n\x04\x42ook\x12\n\n\x02id\x18\x01 \x01(\x05\x12\r\n\x05title\x18\x02 \x01(\t\x12\x0e\n\x06\x61uthor\x18\x03 \x01(\t\x12\x11\n\tavailable\x18\x04 \x01(\x08\"D\n\x06Member\x12\n\n\x02id\x18\x01 \x01(\x05\x12\x0c\n\x04name\x18\x02 \x01(\t\x12\r\n\x05\x65mail\x18\x03 \x01(\t\x12\x11\n\tjoin_date\x18\x04 \x01(\t\"K\n\x10\x43ursorPagination\x12\r\n\x05limit\x18\x01 \x01(\x05\x12\x18\n\x0bnext_cursor\x18\x02 \x01(\x05H\x00\x88\x01\x01\x42\x0e\n\x0c_next_cursor\"h\n\x08\x42ookList\x12\x1c\n\x05\x62ooks\x18\x01 \x03(\x0b\x32\r.library.Book\x12-\n\npagination\x18\x02 \x01(\x0b\x32\x19.library.CursorPagination\x12\x0f\n\x07missing\x18\x03 \x03(\x05\"]\n\nMemberList\x12 \n\x07members\x18\x01 \x03(\x0b\x32\x0f.library.Member\x12-\n\npagination\x18\x02 \x01(\x0b\x32\x19.library.CursorPagination\"\xea\x01\n\x08\x45nvelope\x12\x0e\n\x06status\x18\x01 \x01(\t\x12\x0f\n\x07message\x18\x02 \x01(\t\x12\x1d\n\x04\x62ook\x18\x03 \x01(\x0b\x32\r.library.BookH\x00\x12\"\n\x05\x62ooks\x18\x04 \x01(\x0b\x32\x11.library.BookListH\x00\x12!\n\x06member\x18\x05 \x01(\x0b\x32\x0f.library.MemberH\x00\x12&\n\x07members\x18\x06 \x01(\x0b\x32\x13.library.MemberListH\x00\x12\'\n\x05other\x18\x0f \x01(\x0b\x32\x16.google.protobuf.ValueH\x00\x42\x06\n\x04\x64\x61tab\x06proto3')
+
+_builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, globals())
+_builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'library_pb2', globals())
+if _descriptor._USE_C_DESCRIPTORS == False:
+
+  DESCRIPTOR._options = None
+  _BOOK._serialized_start=56
+  _BOOK._serialized_end=124
+  _MEMBER._serialized_start=126
+  _MEMBER._serialized_end=194
+  _CURSORPAGINATION._serialized_start=196
+  _CURSORPAGINATION._serialized_end=271
+  _BOOKLIST._serialized_start=273
+  _BOOKLIST._serialized_end=377
+  _MEMBERLIST._serialized_start=379
+  _MEMBERLIST._serialized_end=472
+  _ENVELOPE._serialized_start=475
+  _ENVELOPE._serialized_end=709
+# @@protoc_insertion_point(module_scope)
@@ -0,0 +1,249 @@
+import importlib.util
+import os
+import time
+from unittest import mock
+
+import pytest
+from authlib.jose import JsonWebKey, jwt
+from sqlalchemy import event
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'book-v3.py')
+SIGNING_KEY = JsonWebKey.generate_key('RSA', 2048, is_private=True, options={'kid': 'test-kid'})
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+def fake_jwks_get(url, timeout=None):
+    return FakeResponse({'keys': [SIGNING_KEY.as_dict()]})
+
+
+# ==================== FIXTURES ====================
+@pytest.fixture(scope='module')
+def book_app(tmp_path_factory):
+    """Nạp book-v3.py (tên file không import được) với SQLite tạm và JWKS giả"""
+    env = {
+        'COGNITO_REGION': 'test-region', 'COGNITO_USER_POOL_ID': 'test-pool',
+        'COGNITO_CLIENT_ID': 'test-client', 'COGNITO_DOMAIN': 'test-domain',
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.db'}",
+        'CACHE_SIGNAL_PATH': '',
+    }
+    with mock.patch.dict(os.environ, env), mock.patch('requests.Session.get', side_effect=fake_jwks_get):
+        spec = importlib.util.spec_from_file_location('book_v3', APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        module.jwks_cache.refresh()
+        module.app.config['TESTING'] = True
+        with module.app.app_context():
+            module.db.create_all()
+        yield module
+
+
+@pytest.fixture
+def client(book_app):
+    with book_app.app.test_client() as client:
+        yield client
+    with book_app.app.app_context():
+        for model in (book_app.BookBorrowed, book_app.Member, book_app.Book):
+            book_app.db.session.query(model).delete()
+        book_app.db.session.commit()
+
+
+def make_token(book_app, key=SIGNING_KEY, kid='test-kid'):
+    claims = {'iss': book_app.COGNITO_ISSUER, 'client_id': 'test-client',
+              'email': 'admin@example.com', 'exp': int(time.time()) + 600}
+    return jwt.encode({'alg': 'RS256', 'kid': kid}, claims, key).decode('utf-8')
+
+
+@pytest.fixture
+def auth_headers(book_app):
+    return {'Authorization': f'Bearer {make_token(book_app)}'}
+
+
+@pytest.fixture
+def statements(book_app):
+    """Danh sách câu SQL chạy trong test (để kiểm tra request nào không chạm DB)"""
+    executed = []
+
+    def record(conn, cursor, statement, *args):
+        executed.append(statement)
+
+    with book_app.app.app_context():
+        engine = book_app.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', record)
+
+
+def count_books(book_app):
+    with book_app.app.app_context():
+        return book_app.db.session.query(book_app.Book).count()
+
+
+def create_book(client, headers, title='Clean Code', author='Robert C. Martin'):
+    return client.post('/api/v1/books', json={'title': title, 'author': author}, headers=headers).get_json()['data']['id']
+
+
+# ==================== BATCH ====================
+class TestBatch:
+    """POST /api/v1/batch: atomic thì tất cả hoặc không gì, không atomic thì chạy hết"""
+
+    def test_atomic_batch_rolls_back_on_first_failure(self, client, book_app, auth_headers):
+        response = client.post('/api/v1/batch', headers=auth_headers, json={'atomic': True, 'requests': [
+            {'method': 'POST', 'path': '/api/v1/books', 'body': {'title': 'A', 'author': 'X'}},
+            {'method': 'PUT', 'path': '/api/v1/books/999999', 'body': {'title': 'B'}},
+            {'method': 'POST', 'path': '/api/v1/books', 'body': {'title': 'C', 'author': 'Z'}},
+        ]})
+
+        data = response.get_json()['data']
+        assert data['committed'] is False
+        assert [r['status'] for r in data['responses']] == [201, 404, 424]
+        assert count_books(book_app) == 0
+
+    def test_non_atomic_batch_keeps_successful_requests(self, client, book_app, auth_headers):
+        response = client.post('/api/v1/batch', headers=auth_headers, json={'requests': [
+            {'method': 'POST', 'path': '/api/v1/books', 'body': {'title': 'A', 'author': 'X'}},
+            {'method': 'PUT', 'path': '/api/v1/books/999999', 'body': {'title': 'B'}},
+            {'method': 'POST', 'path': '/api/v1/books', 'body': {'title': 'C', 'author': 'Z'}},
+        ]})
+
+        data = response.get_json()['data']
+        assert data['committed'] is True
+        assert [r['status'] for r in data['responses']] == [201, 404, 201]
+        assert count_books(book_app) == 2
+
+    def test_atomic_batch_omits_pre_commit_etags(self, client, auth_headers):
+        request = {'method': 'POST', 'path': '/api/v1/books', 'body': {'title': 'A', 'author': 'X'}}
+        atomic = client.post('/api/v1/batch', headers=auth_headers, json={'atomic': True, 'requests': [request]})
+        plain = client.post('/api/v1/batch', headers=auth_headers, json={'requests': [request]})
+
+        assert 'ETag' not in atomic.get_json()['data']['responses'][0]['headers']
+        assert 'ETag' in plain.get_json()['data']['responses'][0]['headers']
+
+
+# ==================== JWKS CACHE ====================
+class TestJWKSCache:
+    """Khoá ký của Cognito được cache, request không bao giờ chờ JWKS endpoint"""
+
+    def test_503_until_key_set_is_loaded(self, book_app, client, auth_headers, monkeypatch):
+        monkeypatch.setattr(book_app, 'jwks_cache', book_app.JWKSCache('https://example.invalid/jwks.json'))
+
+        response = client.get('/api/v1/books', headers=auth_headers)
+
+        assert response.status_code == 503
+
+    def test_unknown_kid_is_rejected(self, book_app, client):
+        other_key = JsonWebKey.generate_key('RSA', 2048, is_private=True, options={'kid': 'other-kid'})
+        headers = {'Authorization': f"Bearer {make_token(book_app, other_key, 'other-kid')}"}
+
+        response = client.get('/api/v1/books', headers=headers)
+
+        assert response.status_code == 401
+        assert response.get_json()['message'] == 'Unknown token signing key'
+
+
+# ==================== NEGATIVE CACHE ====================
+class TestNegativeCache:
+    """ID vừa xác nhận không tồn tại trả 404 mà không query DB lần nữa"""
+
+    def test_repeated_miss_skips_database(self, client, auth_headers, statements):
+        assert client.get('/api/v1/books/424242', headers=auth_headers).status_code == 404
+        queried = len(statements)
+        assert queried > 0
+        assert client.get('/api/v1/books/424242', headers=auth_headers).status_code == 404
+        assert len(statements) == queried
+
+
+# ==================== MULTI-GET & SPARSE FIELDSETS ====================
+class TestMultiGet:
+    """?ids= trả sách theo đúng thứ tự yêu cầu, ID không tồn tại nằm trong missing"""
+
+    def test_books_keep_requested_order_and_report_missing(self, client, auth_headers):
+        first, second = create_book(client, auth_headers, 'A'), create_book(client, auth_headers, 'B')
+
+        data = client.get(f'/api/v1/books?ids={second},424242,{first}', headers=auth_headers).get_json()['data']
+
+        assert [book['id'] for book in data['books']] == [second, first]
+        assert data['missing'] == [424242]
+
+    def test_lookup_rejects_non_numeric_ids(self, client, auth_headers):
+        response = client.post('/api/v1/books/lookup', json={'ids': ['abc']}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestSparseFieldsets:
+    """?fields= chỉ SELECT các cột được yêu cầu"""
+
+    def test_only_requested_fields_are_returned(self, client, auth_headers):
+        create_book(client, auth_headers)
+
+        books = client.get('/api/v1/books?fields=title', headers=auth_headers).get_json()['data']['books']
+
+        assert set(books[0]) == {'id', 'title'}
+
+    def test_unknown_field_is_rejected(self, client, auth_headers):
+        response = client.get('/api/v1/books?fields=title,password', headers=auth_headers)
+        assert response.status_code == 400
+
+
+# ==================== CONTENT NEGOTIATION ====================
+@pytest.mark.skipif(importlib.util.find_spec('msgpack') is None, reason="msgpack not installed")
+class TestContentNegotiation:
+    """Accept chọn JSON hoặc MessagePack, mỗi biểu diễn một ETag riêng"""
+
+    def test_msgpack_representation_has_its_own_etag(self, client, auth_headers):
+        import msgpack
+        book_id = create_book(client, auth_headers)
+        as_json = client.get(f'/api/v1/books/{book_id}', headers=auth_headers)
+
+        as_msgpack = client.get(f'/api/v1/books/{book_id}',
+                                headers={**auth_headers, 'Accept': 'application/msgpack',
+                                         'If-None-Match': as_json.headers['ETag']})
+
+        assert as_msgpack.status_code == 200
+        assert as_msgpack.mimetype == 'application/msgpack'
+        assert msgpack.unpackb(as_msgpack.data)['data']['id'] == book_id
+        assert as_msgpack.headers['ETag'] != as_json.headers['ETag']
+        assert 'Accept' in as_msgpack.headers['Vary']
+
+
+# ==================== MERGE PATCH ====================
+class TestMergePatch:
+    """PATCH /members/<id> với application/merge-patch+json"""
+
+    def create_member(self, client, headers):
+        response = client.post('/api/v1/members', json={'name': 'An', 'email': 'an@example.com'}, headers=headers)
+        return response.get_json()['data']['id']
+
+    def test_return_minimal_sends_only_the_new_validator(self, client, auth_headers):
+        member_id = self.create_member(client, auth_headers)
+        before = client.get(f'/api/v1/members/{member_id}', headers=auth_headers).headers['ETag']
+
+        response = client.patch(f'/api/v1/members/{member_id}', data='{"name": "Binh"}',
+                                headers={**auth_headers, 'Content-Type': 'application/merge-patch+json',
+                                         'Prefer': 'return=minimal'})
+
+        assert response.status_code == 204
+        assert response.data == b''
+        assert response.headers['Preference-Applied'] == 'return=minimal'
+        after = client.get(f'/api/v1/members/{member_id}', headers=auth_headers)
+        assert response.headers['ETag'] == after.headers['ETag'] != before
+        assert after.get_json()['data']['name'] == 'Binh'
+
+    def test_unknown_field_and_plain_json_are_rejected(self, client, auth_headers):
+        member_id = self.create_member(client, auth_headers)
+
+        unknown = client.patch(f'/api/v1/members/{member_id}', data='{"join_date": "2020-01-01"}',
+                               headers={**auth_headers, 'Content-Type': 'application/merge-patch+json'})
+        plain = client.patch(f'/api/v1/members/{member_id}', json={'name': 'X'}, headers=auth_headers)
+
+        assert unknown.status_code == 400
+        assert plain.status_code == 415
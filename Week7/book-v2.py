@@ -1,6 +1,9 @@
 from flask import Flask, request, jsonify, make_response, send_from_directory
 from flask_cors import CORS
 import hashlib
+import threading
+import time
+from collections import OrderedDict
 import json
 import jwt
 import datetime
@@ -63,6 +66,54 @@ def error_response(message, status_code=400):
     }), status_code)
 
 # ------------------ AUTH ------------------
+TOKEN_CACHE_SIZE = 1024
+
+class TokenCache:
+    """Bounded LRU of already verified token claims, keyed by sha256(secret, token).
+    An entry lives until the token's own exp, so a repeated token skips signature
+    verification and base64/JSON parsing; failed verifications are never cached."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # injectable so tests can move time without patching the time module
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # tokens without exp are not cached
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(TOKEN_CACHE_SIZE)
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -74,7 +125,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -167,6 +218,12 @@ def delete_book(current_user, book_id):
     book.delete()
     return success_response(None, "Book deleted")
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check with token cache metrics (entries, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger ------------------
 SWAGGER_URL = '/docs'
 API_URL = '/static/swagger.yaml'
@@ -1,15 +1,22 @@
-from flask import Flask, request, jsonify, make_response, send_from_directory
+from flask import Flask, request, send_from_directory
 from flask_cors import CORS
 import hashlib
-import json
 import jwt
 import datetime
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 from flask_swagger_ui import get_swaggerui_blueprint
 from dotenv import load_dotenv
 from mongoengine import Document, StringField, BooleanField, connect
 import os
 
+try:
+    import orjson
+except ImportError:  # optional fast path; Flask's stdlib encoder is used instead
+    orjson = None
+
 # ------------------ Setup ------------------
 load_dotenv()
 app = Flask(__name__)
@@ -17,6 +24,8 @@ CORS(app)
 app.config['SECRET_KEY'] = os.getenv("SECRET_KEY", "defaultsecret")
 app.config['MONGO_URI'] = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
 app.config['MONGO_DB_NAME'] = os.getenv("MONGO_DB_NAME", "library_db")
+app.config['JSON_ENCODER'] = os.getenv("JSON_ENCODER", "orjson" if orjson else "stdlib")
+app.config['TOKEN_CACHE_SIZE'] = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
 
 # ------------------ MongoDB ORM setup ------------------
 connect(
@@ -40,29 +49,121 @@ class Book(Document):
         }
 
 # ------------------ Helper functions ------------------
-def generate_etag(data_dict):
-    data_str = json.dumps(data_dict, sort_keys=True, default=str)
-    return hashlib.md5(data_str.encode('utf-8')).hexdigest()
-
-def success_response(data=None, message=None, status_code=200, etag=None):
-    response = make_response(jsonify({
-        "status": "success",
-        "data": data,
-        "message": message
-    }), status_code)
+def encode_json(payload):
+    """Encode payload to bytes with the configured encoder (JSON_ENCODER=orjson|stdlib)"""
+    if app.config['JSON_ENCODER'] == 'orjson' and orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)  # same key order as the stdlib provider
+    return app.json.dumps(payload, separators=(",", ":")).encode('utf-8')
+
+def encode_envelope(data_bytes, message=None, status="success"):
+    """Wrap already-encoded data in the response envelope without encoding it again"""
+    return (b'{"status":' + encode_json(status) + b',"data":' + data_bytes
+            + b',"message":' + encode_json(message) + b'}')
+
+def generate_etag(data_bytes):
+    """ETag over the encoded data, i.e. the same bytes that are sent in the body"""
+    return hashlib.md5(data_bytes).hexdigest()
+
+def success_response(data=None, message=None, status_code=200, etag=None, data_bytes=None):
+    if data_bytes is None:
+        data_bytes = encode_json(data)
+    response = app.response_class(encode_envelope(data_bytes, message), status=status_code,
+                                  mimetype='application/json')
     if etag:
         response.headers["ETag"] = etag
         response.headers["Cache-Control"] = "private, max-age=120"
     return response
 
 def error_response(message, status_code=400):
-    return make_response(jsonify({
-        "status": "error",
-        "data": None,
-        "message": message
-    }), status_code)
+    return app.response_class(encode_envelope(b'null', message, "error"), status=status_code,
+                              mimetype='application/json')
+
+# ------------------ Request coalescing ------------------
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight execution"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+# Identical concurrent list queries share one DB call and one serialized result
+book_flights = SingleFlight()
 
 # ------------------ AUTH ------------------
+class TokenCache:
+    """Bounded LRU of already verified token claims, keyed by sha256(secret, token).
+    An entry lives until the token's own exp, so a repeated token skips signature
+    verification and base64/JSON parsing; failed verifications are never cached."""
+
+    def __init__(self, max_entries, clock=time.time):
+        self.max_entries = max_entries
+        self.clock = clock  # injectable so tests can move time without patching the time module
+        self._entries = OrderedDict()  # sha256 -> (claims, exp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def decode(self, token, secret):
+        key = hashlib.sha256(f"{secret}:{token}".encode('utf-8')).digest()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self.clock() < entry[1]:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+        claims = jwt.decode(token, secret, algorithms=["HS256"])
+        exp = claims.get('exp')
+        if isinstance(exp, (int, float)):  # tokens without exp are not cached
+            with self._lock:
+                self._entries[key] = (claims, exp)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return claims
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+token_cache = TokenCache(app.config['TOKEN_CACHE_SIZE'])
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -74,7 +175,7 @@ def token_required(f):
         if not token:
             return error_response("Token is missing", 401)
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'], algorithms=["HS256"])
+            data = token_cache.decode(token, app.config['SECRET_KEY'])
             current_user = data['user']
         except jwt.ExpiredSignatureError:
             return error_response("Token expired", 401)
@@ -112,10 +213,14 @@ def get_books(current_user):
     if author:
         query['author__icontains'] = author
 
-    books = Book.objects(**query)[:20]
-    books_list = [b.to_dict() for b in books]
-    etag = generate_etag(books_list)
-    return success_response({"books": books_list}, "Books fetched successfully", etag=etag)
+    def load_books():
+        books = Book.objects(**query)[:20]
+        data_bytes = encode_json({"books": [b.to_dict() for b in books]})
+        return data_bytes, generate_etag(data_bytes)
+
+    flight_key = tuple(sorted(query.items()))
+    data_bytes, etag = book_flights.do(flight_key, load_books)
+    return success_response(message="Books fetched successfully", etag=etag, data_bytes=data_bytes)
 
 @app.route('/api/v1/books', methods=['POST'])
 @token_required
@@ -125,8 +230,9 @@ def create_book(current_user):
         return error_response("Missing title or author", 400)
     book = Book(title=data['title'], author=data['author'], available=True)
     book.save()
-    book_dict = book.to_dict()
-    return success_response(book_dict, "Book created", 201, generate_etag(book_dict))
+    data_bytes = encode_json(book.to_dict())
+    return success_response(message="Book created", status_code=201, etag=generate_etag(data_bytes),
+                            data_bytes=data_bytes)
 
 @app.route('/api/v1/books/<book_id>', methods=['GET'])
 @token_required
@@ -135,12 +241,12 @@ def get_book(current_user, book_id):
         book = Book.objects.get(id=book_id)
     except Book.DoesNotExist:
         return error_response("Book not found", 404)
-    book_dict = book.to_dict()
-    etag = generate_etag(book_dict)
+    data_bytes = encode_json(book.to_dict())
+    etag = generate_etag(data_bytes)
     client_etag = request.headers.get('If-None-Match')
     if client_etag == etag:
         return '', 304
-    return success_response(book_dict, etag=etag)
+    return success_response(etag=etag, data_bytes=data_bytes)
 
 @app.route('/api/v1/books/<book_id>', methods=['PUT'])
 @token_required
@@ -154,8 +260,8 @@ def update_book(current_user, book_id):
         if key in data:
             setattr(book, key, data[key])
     book.save()
-    book_dict = book.to_dict()
-    return success_response(book_dict, "Book updated", etag=generate_etag(book_dict))
+    data_bytes = encode_json(book.to_dict())
+    return success_response(message="Book updated", etag=generate_etag(data_bytes), data_bytes=data_bytes)
 
 @app.route('/api/v1/books/<book_id>', methods=['DELETE'])
 @token_required
@@ -167,6 +273,12 @@ def delete_book(current_user, book_id):
     book.delete()
     return success_response(None, "Book deleted")
 
+# ------------------ Health Check ------------------
+@app.route('/health', methods=['GET'])
+def health_check():
+    """Health check with token cache metrics (entries, hit ratio)"""
+    return success_response({"status": "healthy", "token_cache": token_cache.stats()})
+
 # ------------------ Swagger ------------------
 SWAGGER_URL = '/docs'
 API_URL = '/static/swagger.yaml'
@@ -2,7 +2,11 @@ import pytest
 import json
 from datetime import datetime, timedelta
 import jwt
-from app import app, Book
+import hashlib
+import threading
+import time
+import app as app_module
+from app import app, Book, SingleFlight, TokenCache, token_cache
 from mongoengine import connect, disconnect
 from mongomock import MongoClient
 
@@ -316,6 +320,161 @@ class TestCompleteWorkflow:
         assert final_response.status_code == 404
 
 
+# ==================== UNIT TESTS - REQUEST COALESCING ====================
+class TestRequestCoalescing:
+    """Test gộp các truy vấn giống nhau đang chạy đồng thời (singleflight)"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Test nhiều thread cùng key chỉ gọi hàm tải dữ liệu một lần"""
+        flights = SingleFlight()
+        calls = []
+
+        def load():
+            calls.append(1)
+            time.sleep(0.2)
+            return ['book']
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flights.do('books', load)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert results == [['book']] * 5
+
+    def test_error_is_shared_and_key_released(self):
+        """Test lỗi được trả cho mọi caller và key được giải phóng sau đó"""
+        flights = SingleFlight()
+
+        def fail():
+            raise ValueError('db down')
+
+        with pytest.raises(ValueError):
+            flights.do('books', fail)
+        assert flights.do('books', lambda: 'ok') == 'ok'
+
+    def test_list_endpoint_coalesces_concurrent_requests(self, client, auth_headers, sample_books, monkeypatch):
+        """Test các GET /books đồng thời chỉ chạy loader một lần và cùng nhận một ETag"""
+        calls = []
+        generate_etag = app_module.generate_etag
+
+        def slow_generate_etag(data_bytes):
+            calls.append(1)
+            time.sleep(0.3)  # giữ flight mở để các request còn lại nhập vào
+            return generate_etag(data_bytes)
+
+        monkeypatch.setattr(app_module, 'generate_etag', slow_generate_etag)
+
+        barrier = threading.Barrier(5)
+        responses = []
+
+        def fetch():
+            with app.test_client() as c:
+                barrier.wait()
+                responses.append(c.get('/api/v1/books?available=true', headers=auth_headers))
+
+        threads = [threading.Thread(target=fetch) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert len(calls) == 1
+        assert len(responses) == 5
+        assert len({r.headers['ETag'] for r in responses}) == 1
+        assert all(len(json.loads(r.data)['data']['books']) == 2 for r in responses)
+
+
+# ==================== UNIT TESTS - JSON ENCODING ====================
+class TestJSONEncoding:
+    """Test encoder orjson/stdlib và ETag tính trên bytes đã encode"""
+
+    @pytest.mark.parametrize('encoder', ['orjson', 'stdlib'])
+    def test_encoders_produce_same_envelope(self, client, auth_headers, sample_books, encoder):
+        """Test cả hai encoder trả về cùng nội dung JSON"""
+        previous = app.config['JSON_ENCODER']
+        app.config['JSON_ENCODER'] = encoder
+        try:
+            response = client.get('/api/v1/books?available=false', headers=auth_headers)
+        finally:
+            app.config['JSON_ENCODER'] = previous
+
+        data = json.loads(response.data)
+        assert response.mimetype == 'application/json'
+        assert data['status'] == 'success'
+        assert data['message'] == 'Books fetched successfully'
+        assert data['data']['books'][0]['title'] == 'Refactoring'
+
+    def test_etag_is_hash_of_encoded_data(self, client, auth_headers, sample_books):
+        """Test ETag là MD5 của phần data trong body (không serialize lần hai)"""
+        book_id = str(sample_books[0].id)
+        response = client.get(f'/api/v1/books/{book_id}', headers=auth_headers)
+
+        body = response.data
+        data_bytes = body[body.index(b'"data":') + len(b'"data":'):body.rindex(b',"message":')]
+        assert response.headers['ETag'] == hashlib.md5(data_bytes).hexdigest()
+
+    def test_error_envelope(self, client):
+        """Test error_response vẫn trả về đúng cấu trúc"""
+        response = client.get('/api/v1/books')
+
+        data = json.loads(response.data)
+        assert data == {'status': 'error', 'data': None, 'message': 'Token is missing'}
+
+
+# ==================== UNIT TESTS - TOKEN CACHE ====================
+class TestTokenCache:
+    """Test cache claims của token đã verify trong token_required"""
+
+    def test_repeated_token_is_served_from_cache(self, client, auth_headers):
+        """Test token lặp lại không phải verify lại và số liệu hiện trên /health"""
+        before = token_cache.stats()
+        client.get('/api/v1/books', headers=auth_headers)
+        client.get('/api/v1/books', headers=auth_headers)
+        after = token_cache.stats()
+
+        assert after['hits'] - before['hits'] >= 1
+        response = client.get('/health')
+        stats = json.loads(response.data)['data']['token_cache']
+        assert stats['entries'] >= 1
+        assert 0 < stats['hit_ratio'] <= 1
+
+    def test_entry_expires_with_token(self):
+        """Test entry không được dùng sau exp của token"""
+        now = [time.time()]
+        cache = TokenCache(10, clock=lambda: now[0])
+        exp = int(now[0]) + 60
+        token = jwt.encode({'user': 'admin', 'exp': exp}, 'test_secret', algorithm="HS256")
+        cache.decode(token, 'test_secret')
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 1)
+
+        now[0] = exp + 1
+        cache.decode(token, 'test_secret')
+        assert (cache.hits, cache.misses) == (1, 2)
+
+    def test_cached_token_is_not_valid_for_other_secret(self):
+        """Test key của cache gồm cả secret: đổi SECRET_KEY thì phải verify lại"""
+        cache = TokenCache(10)
+        token = jwt.encode({'user': 'admin', 'exp': datetime.utcnow() + timedelta(minutes=5)},
+                           'test_secret', algorithm="HS256")
+        cache.decode(token, 'test_secret')
+        with pytest.raises(jwt.InvalidSignatureError):
+            cache.decode(token, 'other_secret')
+
+    def test_cache_is_bounded(self):
+        """Test LRU bỏ entry cũ nhất khi vượt max_entries"""
+        cache = TokenCache(2)
+        for user in ('a', 'b', 'c'):
+            token = jwt.encode({'user': user, 'exp': datetime.utcnow() + timedelta(minutes=5)},
+                               'test_secret', algorithm="HS256")
+            cache.decode(token, 'test_secret')
+        assert cache.stats()['entries'] == 2
+
+
 # ==================== RUN TESTS ====================
 if __name__ == '__main__':
-    pytest.main([__file__, '-v', '--cov=app', '--cov-report=html'])
\ No newline at end of file
+    pytest.main([__file__, '-v', '--cov=app', '--cov-report=html'])